@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Benchmarks deriving a new version of a wide schema with
+`AvroSchemaBuilder.begin_with_schema_json` against deep copying the schema
+json first, which is what the builder used to do.
+
+Usage::
+
+    python benchmarks/avro_builder_copy_benchmark.py [field count]
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import copy
+import sys
+import timeit
+
+from data_pipeline_avro_util.avro_builder import AvroSchemaBuilder
+
+
+def make_wide_schema_json(field_count):
+    fields = []
+    for i in range(field_count):
+        fields.append({
+            'name': 'col_{0}'.format(i),
+            'type': ['null', {
+                'type': 'record',
+                'name': 'nested_{0}'.format(i),
+                'fields': [
+                    {'name': 'value', 'type': 'long', 'pkey': 1},
+                    {'name': 'tags', 'type': {'type': 'array',
+                                              'items': 'string'}},
+                ]
+            }],
+            'default': None,
+            'doc': 'column {0}'.format(i),
+            'maxlen': 64,
+        })
+    return {'type': 'record', 'name': 'wide', 'fields': fields}
+
+
+def derive(schema_json, deep_copy):
+    builder = AvroSchemaBuilder()
+    if deep_copy:
+        schema_json = copy.deepcopy(schema_json)
+    builder.begin_with_schema_json(schema_json)
+    builder.add_field('new_col', builder.create_int())
+    builder.get_field('col_0')['doc'] = 'changed'
+    builder.remove_field('col_1')
+    return builder._schema_json
+
+
+def count_containers(obj, exclude_ids=frozenset()):
+    """Counts the dicts and lists reachable from `obj`, skipping the ones
+    whose id is in `exclude_ids`, i.e. the ones shared with the source.
+    """
+    count = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, (dict, list)) and id(item) not in exclude_ids:
+            count += 1
+            stack.extend(item.values() if isinstance(item, dict) else item)
+    return count
+
+
+def container_ids(obj):
+    ids = set()
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, (dict, list)):
+            ids.add(id(item))
+            stack.extend(item.values() if isinstance(item, dict) else item)
+    return ids
+
+
+def main():
+    field_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    schema_json = make_wide_schema_json(field_count)
+    source_ids = container_ids(schema_json)
+    print('{0} fields, {1} dicts and lists in the source schema json'.format(
+        field_count,
+        len(source_ids)
+    ))
+    for label, deep_copy in (('deepcopy', True), ('copy-on-write', False)):
+        runs = 5
+        seconds = timeit.timeit(
+            lambda: derive(schema_json, deep_copy),
+            number=runs
+        ) / runs
+        derived = derive(schema_json, deep_copy)
+        print('{0:>14}: {1:8.2f} ms per derived schema, {2} new {3}'.format(
+            label,
+            seconds * 1000,
+            count_containers(derived, exclude_ids=source_ids),
+            'dicts and lists'
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Benchmarks the time it takes a fresh interpreter to import the package
+modules, and to construct an `AvroStringWriter` and `AvroStringReader`,
+which don't parse their schemas until they encode or decode.
+
+Usage::
+
+    python benchmarks/import_time_benchmark.py [runs]
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import subprocess
+import sys
+
+
+MODULES = [
+    'avro.schema',
+    'avro.io',
+    'data_pipeline_avro_util.util',
+    'data_pipeline_avro_util.avro_binary_util',
+    'data_pipeline_avro_util.avro_string_writer',
+    'data_pipeline_avro_util.avro_string_reader',
+    'data_pipeline_avro_util.avro_builder',
+]
+
+IMPORT_SCRIPT = """
+import sys
+import time
+start = time.time()
+import {module}
+sys.stdout.write('{{0}} {{1}} {{2}}'.format(
+    time.time() - start,
+    len(sys.modules),
+    'avro.io' in sys.modules
+))
+"""
+
+CONSTRUCT_SCRIPT = """
+import sys
+import time
+start = time.time()
+from data_pipeline_avro_util.avro_string_reader import AvroStringReader
+from data_pipeline_avro_util.avro_string_writer import AvroStringWriter
+schema = '{"type": "record", "name": "r", "fields": [' \\
+    '{"name": "a", "type": "int"}]}'
+AvroStringWriter(schema)
+AvroStringReader(schema, schema)
+sys.stdout.write('{0} {1} {2}'.format(
+    time.time() - start,
+    len(sys.modules),
+    'avro.io' in sys.modules
+))
+"""
+
+
+def measure(script, runs):
+    timings = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', script])
+        seconds, module_count, imports_avro_io = output.split()
+        timings.append(float(seconds))
+    timings.sort()
+    return timings[0], timings[len(timings) // 2], module_count, imports_avro_io
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print('{0:<44} {1:>8} {2:>8} {3:>8} {4:>8}'.format(
+        'import',
+        'min ms',
+        'p50 ms',
+        'modules',
+        'avro.io'
+    ))
+    scripts = [
+        (module, IMPORT_SCRIPT.format(module=module)) for module in MODULES
+    ]
+    scripts.append(('construct writer and reader', CONSTRUCT_SCRIPT))
+    for label, script in scripts:
+        best, median, module_count, imports_avro_io = measure(script, runs)
+        print('{0:<44} {1:8.2f} {2:8.2f} {3:>8} {4:>8}'.format(
+            label,
+            best * 1000,
+            median * 1000,
+            module_count,
+            imports_avro_io
+        ))
+
+
+if __name__ == '__main__':
+    main()
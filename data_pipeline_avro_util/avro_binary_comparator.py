@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from avro.schema import AvroException
+from cached_property import cached_property
+
+from data_pipeline_avro_util.avro_binary_util import compile_record_once
+from data_pipeline_avro_util.avro_binary_util import compile_skipper
+from data_pipeline_avro_util.avro_binary_util import read_double
+from data_pipeline_avro_util.avro_binary_util import read_float
+from data_pipeline_avro_util.avro_binary_util import read_long
+from data_pipeline_avro_util.util import get_avro_schema_object
+
+
+class AvroBinaryComparator(object):
+    def __init__(self, schema):
+        """ Utility class for ordering Avro encoded messages directly on their
+        bytes, following the sort order defined by the Avro specification.
+        Record fields are compared in schema order, honoring the `order`
+        attribute of each field (`ascending`, `descending` or `ignore`).
+
+        Args:
+            schema (string|dict|:class:`avro.schema.Schema`): The avro schema
+                the messages were encoded with.
+
+        Notes:
+            Comparing data containing maps raises an
+            :class:`avro.schema.AvroException` unless the maps are in a record
+            field with `ignore` order.
+
+        **Examples**:
+          sort a list of encoded messages::
+
+              comparator = AvroBinaryComparator(schema)
+              sorted_messages = sorted(messages, key=comparator.sort_key)
+        """
+        self.schema = get_avro_schema_object(schema)
+
+    @cached_property
+    def _compare_func(self):
+        return _compile_comparator(self.schema, {})
+
+    @cached_property
+    def _key_func(self):
+        return _compile_key_extractor(self.schema, {})
+
+    def compare(self, encoded_message_a, encoded_message_b):
+        """ Compares two messages encoded with `self.schema`.
+
+        Returns (int):
+            A negative number, zero or a positive number if the first message
+            sorts before, equal to or after the second message respectively.
+        """
+        return self._compare_func(
+            encoded_message_a,
+            0,
+            encoded_message_b,
+            0
+        )[0]
+
+    def sort_key(self, encoded_message):
+        """ Extracts a key from a message encoded with `self.schema` whose
+        natural Python ordering matches the Avro sort order of the message,
+        making it usable as the `key` argument of `sorted`, `min`, `heapq`
+        functions and so on.
+        """
+        return self._key_func(encoded_message, 0)[0]
+
+
+class _Descending(object):
+    """Wraps a sort key to reverse its ordering."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __ne__(self, other):
+        return self.value != other.value
+
+    def __lt__(self, other):
+        return self.value > other.value
+
+    def __le__(self, other):
+        return self.value >= other.value
+
+    def __gt__(self, other):
+        return self.value < other.value
+
+    def __ge__(self, other):
+        return self.value <= other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+    def __repr__(self):
+        return '_Descending({0!r})'.format(self.value)
+
+
+def _compare_null(data_a, pos_a, data_b, pos_b):
+    return 0, pos_a, pos_b
+
+
+def _compare_boolean(data_a, pos_a, data_b, pos_b):
+    return cmp(data_a[pos_a], data_b[pos_b]), pos_a + 1, pos_b + 1
+
+
+def _compile_value_comparator(read):
+    def compare_values(data_a, pos_a, data_b, pos_b):
+        value_a, pos_a = read(data_a, pos_a)
+        value_b, pos_b = read(data_b, pos_b)
+        return cmp(value_a, value_b), pos_a, pos_b
+    return compare_values
+
+
+def _compare_bytes(data_a, pos_a, data_b, pos_b):
+    size_a, pos_a = read_long(data_a, pos_a)
+    size_b, pos_b = read_long(data_b, pos_b)
+    end_a = pos_a + size_a
+    end_b = pos_b + size_b
+    return cmp(data_a[pos_a:end_a], data_b[pos_b:end_b]), end_a, end_b
+
+
+def _compile_comparator(schema, compiled):
+    """ Builds a `compare(data_a, pos_a, data_b, pos_b)` function returning
+    a tuple of the comparison result and the positions after both values.
+    The returned positions are only meaningful when the values are equal.
+    """
+    schema_type = schema.type
+    if schema_type == 'null':
+        return _compare_null
+    if schema_type == 'boolean':
+        return _compare_boolean
+    if schema_type in ('int', 'long', 'enum'):
+        return _compile_value_comparator(read_long)
+    if schema_type == 'float':
+        return _compile_value_comparator(read_float)
+    if schema_type == 'double':
+        return _compile_value_comparator(read_double)
+    if schema_type in ('bytes', 'string'):
+        return _compare_bytes
+    if schema_type == 'fixed':
+        size = schema.size
+
+        def compare_fixed(data_a, pos_a, data_b, pos_b):
+            end_a = pos_a + size
+            end_b = pos_b + size
+            return cmp(data_a[pos_a:end_a], data_b[pos_b:end_b]), end_a, end_b
+        return compare_fixed
+    if schema_type == 'array':
+        return _compile_array_comparator(
+            _compile_comparator(schema.items, compiled)
+        )
+    if schema_type in ('union', 'error_union'):
+        branch_comparators = [
+            _compile_comparator(s, compiled) for s in schema.schemas
+        ]
+
+        def compare_union(data_a, pos_a, data_b, pos_b):
+            index_a, pos_a = read_long(data_a, pos_a)
+            index_b, pos_b = read_long(data_b, pos_b)
+            if index_a != index_b:
+                return cmp(index_a, index_b), pos_a, pos_b
+            return branch_comparators[index_a](data_a, pos_a, data_b, pos_b)
+        return compare_union
+    if schema_type in ('record', 'error'):
+        return compile_record_once(
+            schema,
+            compiled,
+            lambda: _compile_record_comparator(schema, compiled)
+        )
+    return _compile_failure(schema)
+
+
+def _compile_failure(schema):
+    def fail(*args):
+        raise AvroException(
+            "Cannot compare data of schema type: {0}".format(schema.type)
+        )
+    return fail
+
+
+def _compile_array_comparator(compare_item):
+    def compare_array(data_a, pos_a, data_b, pos_b):
+        # Items are compared one at a time, so block boundaries may differ
+        # between the two arrays.
+        remaining_a, pos_a = _read_block_count(data_a, pos_a)
+        remaining_b, pos_b = _read_block_count(data_b, pos_b)
+        while remaining_a and remaining_b:
+            result, pos_a, pos_b = compare_item(data_a, pos_a, data_b, pos_b)
+            if result:
+                return result, pos_a, pos_b
+            remaining_a -= 1
+            remaining_b -= 1
+            if not remaining_a:
+                remaining_a, pos_a = _read_block_count(data_a, pos_a)
+            if not remaining_b:
+                remaining_b, pos_b = _read_block_count(data_b, pos_b)
+        return cmp(bool(remaining_a), bool(remaining_b)), pos_a, pos_b
+    return compare_array
+
+
+def _read_block_count(data, pos):
+    block_count, pos = read_long(data, pos)
+    if block_count < 0:
+        block_count = -block_count
+        _, pos = read_long(data, pos)
+    return block_count, pos
+
+
+def _compile_record_comparator(schema, compiled):
+    steps = []
+    for field in schema.fields:
+        order = field.order or 'ascending'
+        if order == 'ignore':
+            steps.append((None, compile_skipper(field.type)))
+        else:
+            steps.append((
+                order == 'descending',
+                _compile_comparator(field.type, compiled)
+            ))
+
+    def compare_record(data_a, pos_a, data_b, pos_b):
+        for is_descending, func in steps:
+            if is_descending is None:
+                pos_a = func(data_a, pos_a)
+                pos_b = func(data_b, pos_b)
+                continue
+            result, pos_a, pos_b = func(data_a, pos_a, data_b, pos_b)
+            if result:
+                return -result if is_descending else result, pos_a, pos_b
+        return 0, pos_a, pos_b
+    return compare_record
+
+
+def _key_null(data, pos):
+    return None, pos
+
+
+def _key_boolean(data, pos):
+    return data[pos], pos + 1
+
+
+def _key_bytes(data, pos):
+    size, pos = read_long(data, pos)
+    end = pos + size
+    return data[pos:end], end
+
+
+def _compile_key_extractor(schema, compiled):
+    """ Builds a `key(data, pos)` function returning a tuple of the sort key
+    of the value at `pos` and the position after the value.
+    """
+    schema_type = schema.type
+    if schema_type == 'null':
+        return _key_null
+    if schema_type == 'boolean':
+        return _key_boolean
+    if schema_type in ('int', 'long', 'enum'):
+        return read_long
+    if schema_type == 'float':
+        return read_float
+    if schema_type == 'double':
+        return read_double
+    if schema_type in ('bytes', 'string'):
+        return _key_bytes
+    if schema_type == 'fixed':
+        size = schema.size
+
+        def key_fixed(data, pos):
+            end = pos + size
+            return data[pos:end], end
+        return key_fixed
+    if schema_type == 'array':
+        item_key = _compile_key_extractor(schema.items, compiled)
+
+        def key_array(data, pos):
+            keys = []
+            block_count, pos = _read_block_count(data, pos)
+            while block_count:
+                for _ in xrange(block_count):
+                    key, pos = item_key(data, pos)
+                    keys.append(key)
+                block_count, pos = _read_block_count(data, pos)
+            return tuple(keys), pos
+        return key_array
+    if schema_type in ('union', 'error_union'):
+        branch_keys = [
+            _compile_key_extractor(s, compiled) for s in schema.schemas
+        ]
+
+        def key_union(data, pos):
+            index, pos = read_long(data, pos)
+            key, pos = branch_keys[index](data, pos)
+            return (index, key), pos
+        return key_union
+    if schema_type in ('record', 'error'):
+        return compile_record_once(
+            schema,
+            compiled,
+            lambda: _compile_record_key_extractor(schema, compiled)
+        )
+    return _compile_failure(schema)
+
+
+def _compile_record_key_extractor(schema, compiled):
+    steps = []
+    for field in schema.fields:
+        order = field.order or 'ascending'
+        if order == 'ignore':
+            steps.append((None, compile_skipper(field.type)))
+        else:
+            steps.append((
+                order == 'descending',
+                _compile_key_extractor(field.type, compiled)
+            ))
+
+    def key_record(data, pos):
+        keys = []
+        for is_descending, func in steps:
+            if is_descending is None:
+                pos = func(data, pos)
+                continue
+            key, pos = func(data, pos)
+            keys.append(_Descending(key) if is_descending else key)
+        return tuple(keys), pos
+    return key_record
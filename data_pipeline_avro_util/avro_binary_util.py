@@ -0,0 +1,603 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+Low level helpers for working directly on Avro binary encoded strings.
+
+All the `read_*` and `skip_*` functions take the encoded string and a start
+position, and return the new position (`read_*` functions return a tuple of
+the value read and the new position).  This lets callers walk an encoded
+message without wrapping it in a file-like object or decoding it into Python
+objects.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import datetime
+import struct
+
+from avro import constants
+from avro import timezones
+
+
+STRUCT_FLOAT = struct.Struct(str('<f'))
+STRUCT_DOUBLE = struct.Struct(str('<d'))
+STRUCT_SIGNED_LONG = struct.Struct(str('>q'))
+
+
+def read_long(data, pos):
+    """ Reads a zig-zag encoded variable-length int or long.
+
+    Returns (tuple): the value read and the position after it
+    """
+    b = ord(data[pos])
+    pos += 1
+    n = b & 0x7F
+    shift = 7
+    while b & 0x80:
+        b = ord(data[pos])
+        pos += 1
+        n |= (b & 0x7F) << shift
+        shift += 7
+    return (n >> 1) ^ -(n & 1), pos
+
+
+def read_float(data, pos):
+    return STRUCT_FLOAT.unpack_from(data, pos)[0], pos + 4
+
+
+def read_double(data, pos):
+    return STRUCT_DOUBLE.unpack_from(data, pos)[0], pos + 8
+
+
+def read_bytes(data, pos):
+    size, pos = read_long(data, pos)
+    end = pos + size
+    return data[pos:end], end
+
+
+def skip_null(data, pos):
+    return pos
+
+
+def skip_boolean(data, pos):
+    return pos + 1
+
+
+def skip_long(data, pos):
+    while ord(data[pos]) & 0x80:
+        pos += 1
+    return pos + 1
+
+
+def skip_float(data, pos):
+    return pos + 4
+
+
+def skip_double(data, pos):
+    return pos + 8
+
+
+def skip_bytes(data, pos):
+    size, pos = read_long(data, pos)
+    return pos + size
+
+
+def encode_long(datum):
+    """ Encodes an int or long using variable-length, zig-zag coding. """
+    datum = (datum << 1) ^ (datum >> 63)
+    if not datum & ~0x7F:
+        return chr(datum)
+    encoded = []
+    while datum & ~0x7F:
+        encoded.append(chr((datum & 0x7F) | 0x80))
+        datum >>= 7
+    encoded.append(chr(datum))
+    return b''.join(encoded)
+
+
+def encode_float(datum):
+    return STRUCT_FLOAT.pack(datum)
+
+
+def encode_double(datum):
+    return STRUCT_DOUBLE.pack(datum)
+
+
+def encode_bytes(datum):
+    return encode_long(len(datum)) + datum
+
+
+_primitive_skippers = {
+    'null': skip_null,
+    'boolean': skip_boolean,
+    'int': skip_long,
+    'long': skip_long,
+    'float': skip_float,
+    'double': skip_double,
+    'bytes': skip_bytes,
+    'string': skip_bytes,
+}
+
+
+def compile_skipper(schema, _compiled=None):
+    """ Builds a function which skips over one value encoded with the given
+    `schema`.
+
+    Args:
+        schema (:class:`avro.schema.Schema`): The schema the value was encoded
+            with.
+
+    Returns (function):
+        A `skip(data, pos)` function returning the position right after the
+        encoded value which starts at `pos`.
+    """
+    if _compiled is None:
+        _compiled = {}
+    schema_type = schema.type
+    if schema_type in _primitive_skippers:
+        return _primitive_skippers[schema_type]
+    if schema_type == 'fixed':
+        size = schema.size
+        return lambda data, pos: pos + size
+    if schema_type == 'enum':
+        return skip_long
+    if schema_type == 'array':
+        return _compile_block_skipper(
+            compile_skipper(schema.items, _compiled)
+        )
+    if schema_type == 'map':
+        skip_value = compile_skipper(schema.values, _compiled)
+
+        def skip_entry(data, pos):
+            return skip_value(data, skip_bytes(data, pos))
+        return _compile_block_skipper(skip_entry)
+    if schema_type in ('union', 'error_union'):
+        branch_skippers = [
+            compile_skipper(s, _compiled) for s in schema.schemas
+        ]
+
+        def skip_union(data, pos):
+            index, pos = read_long(data, pos)
+            return branch_skippers[index](data, pos)
+        return skip_union
+    if schema_type in ('record', 'error', 'request'):
+        return compile_record_once(
+            schema,
+            _compiled,
+            lambda: _compile_record_skipper(schema, _compiled)
+        )
+    raise _schema_resolution_exception(
+        "Cannot skip unknown schema type: {0}".format(schema_type),
+        schema
+    )
+
+
+def _compile_record_skipper(schema, compiled):
+    field_skippers = [
+        compile_skipper(field.type, compiled) for field in schema.fields
+    ]
+
+    def skip_record(data, pos):
+        for skip_field in field_skippers:
+            pos = skip_field(data, pos)
+        return pos
+    return skip_record
+
+
+def _compile_block_skipper(skip_item):
+    def skip_blocks(data, pos):
+        block_count, pos = read_long(data, pos)
+        while block_count:
+            if block_count < 0:
+                block_size, pos = read_long(data, pos)
+                pos += block_size
+            else:
+                for _ in xrange(block_count):
+                    pos = skip_item(data, pos)
+            block_count, pos = read_long(data, pos)
+        return pos
+    return skip_blocks
+
+
+def compile_record_once(key, compiled, compile_func):
+    """ Compiles a record level function at most once per `key`, allowing
+    recursive record schemas to refer to the function while it is still being
+    compiled.
+    """
+    memo_key = tuple(id(k) for k in key) if isinstance(key, tuple) else id(key)
+    if memo_key in compiled:
+        return compiled[memo_key]
+    compiled_func = []
+    compiled[memo_key] = lambda *args: compiled_func[0](*args)
+    compiled_func.append(compile_func())
+    compiled[memo_key] = compiled_func[0]
+    return compiled_func[0]
+
+
+def _schema_resolution_exception(fail_msg, schema):
+    # avro.io is only imported when needed since it is slow to import
+    from avro.io import SchemaResolutionException
+    return SchemaResolutionException(fail_msg, schema)
+
+
+def _read_null(data, pos):
+    return None, pos
+
+
+def _read_boolean(data, pos):
+    return data[pos] == b'\x01', pos + 1
+
+
+def _read_utf8(data, pos):
+    size, pos = read_long(data, pos)
+    end = pos + size
+    return data[pos:end].decode('utf-8'), end
+
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+EPOCH_DATETIME = datetime.datetime(1970, 1, 1, tzinfo=timezones.utc)
+NAIVE_EPOCH_DATETIME = datetime.datetime(1970, 1, 1)
+
+
+def get_epoch_microseconds(timestamp):
+    """ Returns the number of microseconds between the Unix epoch and the
+    given datetime, naive datetimes being taken as UTC.
+    """
+    if timestamp.tzinfo is None:
+        delta = timestamp - NAIVE_EPOCH_DATETIME
+    else:
+        delta = timestamp - EPOCH_DATETIME
+    return (
+        (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    )
+
+
+def build_time(microseconds, _time=datetime.time):
+    """ Builds the `datetime.time` of the given microseconds after
+    midnight.
+    """
+    seconds, microsecond = divmod(microseconds, 1000000)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    return _time(hour, minute, second, microsecond)
+
+
+def _read_date(data, pos, _fromordinal=datetime.date.fromordinal):
+    days, pos = read_long(data, pos)
+    return _fromordinal(EPOCH_ORDINAL + days), pos
+
+
+def _read_time_millis(data, pos):
+    millis, pos = read_long(data, pos)
+    return build_time(millis * 1000), pos
+
+
+def _read_time_micros(data, pos):
+    micros, pos = read_long(data, pos)
+    return build_time(micros), pos
+
+
+def _read_timestamp_millis(data, pos):
+    millis, pos = read_long(data, pos)
+    return EPOCH_DATETIME + datetime.timedelta(microseconds=millis * 1000), pos
+
+
+def _read_timestamp_micros(data, pos):
+    micros, pos = read_long(data, pos)
+    return EPOCH_DATETIME + datetime.timedelta(microseconds=micros), pos
+
+
+def decode_twos_complement(datum):
+    """ Decodes a big-endian two's-complement signed integer. """
+    size = len(datum)
+    if size == 8:
+        return STRUCT_SIGNED_LONG.unpack(datum)[0]
+    if 0 < size < 8:
+        sign_bytes = b'\xff' if ord(datum[0]) & 0x80 else b'\x00'
+        return STRUCT_SIGNED_LONG.unpack(sign_bytes * (8 - size) + datum)[0]
+    if not datum:
+        return 0
+    unscaled = int(datum.encode('hex'), 16)
+    if ord(datum[0]) & 0x80:
+        unscaled -= 1 << (size * 8)
+    return unscaled
+
+
+def encode_twos_complement(value, size=None):
+    """ Encodes an integer as a big-endian two's-complement signed integer of
+    the given size in bytes, or of the minimal size if no size is given.
+
+    Raises:
+        ValueError: This exception is thrown if the value doesn't fit in the
+            given size.
+    """
+    byte_count = (value if value >= 0 else ~value).bit_length() // 8 + 1
+    if size is None:
+        size = byte_count
+    elif byte_count > size:
+        raise ValueError(
+            "{0} does not fit in {1} bytes".format(value, size)
+        )
+    if size <= 8:
+        return STRUCT_SIGNED_LONG.pack(value)[8 - size:]
+    hex_digits = '{0:x}'.format(value % (1 << (size * 8)))
+    return hex_digits.rjust(size * 2, str('0')).decode('hex')
+
+
+def get_decimal_exponent_suffix(scale):
+    """ Returns the suffix turning the string of an unscaled integer into the
+    string of the decimal with the given scale, e.g. `'E-2'` for `'-1050'` to
+    be read as `-10.50`.  Building a :class:`decimal.Decimal` from a string is
+    several times faster than scaling one built from an integer.
+    """
+    return 'E-{0}'.format(scale) if scale else ''
+
+
+def _compile_decimal_reader(schema, read_datum):
+    # decimal is only imported when needed since it is slow to import
+    from decimal import Decimal
+    exponent_suffix = get_decimal_exponent_suffix(
+        schema.get_prop('scale') or 0
+    )
+
+    def read_decimal(data, pos):
+        datum, pos = read_datum(data, pos)
+        unscaled = decode_twos_complement(datum)
+        return Decimal(str(unscaled) + exponent_suffix), pos
+    return read_decimal
+
+
+_primitive_readers = {
+    'null': _read_null,
+    'boolean': _read_boolean,
+    'int': read_long,
+    'long': read_long,
+    'float': read_float,
+    'double': read_double,
+    'bytes': read_bytes,
+    'string': _read_utf8,
+}
+
+_logical_type_readers = {
+    constants.DATE: _read_date,
+    constants.TIME_MILLIS: _read_time_millis,
+    constants.TIME_MICROS: _read_time_micros,
+    constants.TIMESTAMP_MILLIS: _read_timestamp_millis,
+    constants.TIMESTAMP_MICROS: _read_timestamp_micros,
+}
+
+
+def compile_decoder(schema, _compiled=None):
+    """ Builds a function which decodes one value encoded with `schema` into
+    the same Python representation :class:`avro.io.DatumReader` returns when
+    reading with identical writer and reader schemas, without doing any
+    schema resolution.
+
+    Args:
+        schema (:class:`avro.schema.Schema`): The schema the value was encoded
+            with.
+
+    Returns (function):
+        A `decode(data, pos)` function returning a tuple of the decoded value
+        and the position right after the encoded value.
+    """
+    if _compiled is None:
+        _compiled = {}
+    schema_type = schema.type
+    logical_type = getattr(schema, 'logical_type', None)
+    if logical_type == constants.DECIMAL:
+        if schema_type == 'fixed':
+            size = schema.size
+            return _compile_decimal_reader(
+                schema,
+                lambda data, pos: (data[pos:pos + size], pos + size)
+            )
+        return _compile_decimal_reader(schema, read_bytes)
+    if logical_type in _logical_type_readers:
+        return _logical_type_readers[logical_type]
+    if schema_type in _primitive_readers:
+        return _primitive_readers[schema_type]
+    if schema_type == 'fixed':
+        size = schema.size
+
+        def read_fixed(data, pos):
+            end = pos + size
+            return data[pos:end], end
+        return read_fixed
+    if schema_type == 'enum':
+        symbols = schema.symbols
+
+        def read_enum(data, pos):
+            index, pos = read_long(data, pos)
+            return symbols[index], pos
+        return read_enum
+    if schema_type == 'array':
+        read_item = compile_decoder(schema.items, _compiled)
+
+        def read_array(data, pos):
+            items = []
+            block_count, pos = read_long(data, pos)
+            while block_count:
+                if block_count < 0:
+                    block_count = -block_count
+                    _, pos = read_long(data, pos)
+                for _ in xrange(block_count):
+                    item, pos = read_item(data, pos)
+                    items.append(item)
+                block_count, pos = read_long(data, pos)
+            return items, pos
+        return read_array
+    if schema_type == 'map':
+        read_value = compile_decoder(schema.values, _compiled)
+
+        def read_map(data, pos):
+            entries = {}
+            block_count, pos = read_long(data, pos)
+            while block_count:
+                if block_count < 0:
+                    block_count = -block_count
+                    _, pos = read_long(data, pos)
+                for _ in xrange(block_count):
+                    key, pos = _read_utf8(data, pos)
+                    entries[key], pos = read_value(data, pos)
+                block_count, pos = read_long(data, pos)
+            return entries, pos
+        return read_map
+    if schema_type in ('union', 'error_union'):
+        branch_readers = [
+            compile_decoder(s, _compiled) for s in schema.schemas
+        ]
+
+        def read_union(data, pos):
+            index, pos = read_long(data, pos)
+            return branch_readers[index](data, pos)
+        return read_union
+    if schema_type in ('record', 'error', 'request'):
+        return compile_record_once(
+            schema,
+            _compiled,
+            lambda: _compile_record_decoder(schema, _compiled)
+        )
+    raise _schema_resolution_exception(
+        "Cannot read unknown schema type: {0}".format(schema_type),
+        schema
+    )
+
+
+def _compile_record_decoder(schema, compiled):
+    field_readers = [
+        (field.name, compile_decoder(field.type, compiled))
+        for field in schema.fields
+    ]
+
+    def read_record(data, pos):
+        record = {}
+        for name, read_field in field_readers:
+            record[name], pos = read_field(data, pos)
+        return record, pos
+    return read_record
+
+
+# Longest possible zig-zag varint encoding of a long.
+_max_long_size = 10
+
+
+def write_length_prefixed(file_obj, message):
+    """ Writes `message` to `file_obj` prefixed by its length, so it can be
+    read back with :func:`read_length_prefixed`.
+    """
+    file_obj.write(encode_long(len(message)) + message)
+
+
+def read_length_prefixed(file_obj, chunk_size=1024 * 1024):
+    """ Reads back the messages written with :func:`write_length_prefixed`,
+    reading `file_obj` from its current position in chunks of `chunk_size`
+    bytes.
+
+    Returns (generator of string):
+        The messages, in the order they were written.
+    """
+    data = b''
+    pos = 0
+    while True:
+        if len(data) - pos < _max_long_size:
+            data = data[pos:] + file_obj.read(chunk_size)
+            pos = 0
+            if not data:
+                return
+        size, message_pos = read_long(data, pos)
+        end = message_pos + size
+        if end > len(data):
+            more_data = file_obj.read(max(chunk_size, end - len(data)))
+            if not more_data:
+                raise EOFError("Truncated length prefixed message")
+            data = data[pos:] + more_data
+            pos = 0
+            continue
+        yield data[message_pos:end]
+        pos = end
+
+
+def encode_default_value(schema, default_value):
+    """ Encodes the json `default_value` of a field according to `schema`,
+    following the Avro specification for field defaults.
+
+    Returns (string):
+        The binary encoded default value.
+    """
+    schema_type = schema.type
+    if schema_type == 'null':
+        return b''
+    if schema_type == 'boolean':
+        return b'\x01' if default_value else b'\x00'
+    if schema_type in ('int', 'long'):
+        return encode_long(int(default_value))
+    if schema_type == 'float':
+        return encode_float(float(default_value))
+    if schema_type == 'double':
+        return encode_double(float(default_value))
+    if schema_type == 'string':
+        return encode_bytes(_to_bytes(default_value, 'utf-8'))
+    if schema_type == 'bytes':
+        return encode_bytes(_to_bytes(default_value, 'iso-8859-1'))
+    if schema_type == 'fixed':
+        return _to_bytes(default_value, 'iso-8859-1')
+    if schema_type == 'enum':
+        return encode_long(schema.symbols.index(default_value))
+    if schema_type == 'array':
+        items = [encode_default_value(schema.items, v) for v in default_value]
+        return _encode_block(items)
+    if schema_type == 'map':
+        entries = [
+            encode_bytes(_to_bytes(k, 'utf-8')) +
+            encode_default_value(schema.values, v)
+            for k, v in default_value.items()
+        ]
+        return _encode_block(entries)
+    if schema_type in ('union', 'error_union'):
+        return encode_long(0) + encode_default_value(
+            schema.schemas[0],
+            default_value
+        )
+    if schema_type in ('record', 'error'):
+        encoded_fields = []
+        for field in schema.fields:
+            field_value = default_value.get(field.name)
+            if field_value is None:
+                field_value = field.default
+            encoded_fields.append(
+                encode_default_value(field.type, field_value)
+            )
+        return b''.join(encoded_fields)
+    raise _schema_resolution_exception(
+        "Cannot encode default value for unknown schema type: {0}".format(
+            schema_type
+        ),
+        schema
+    )
+
+
+def _encode_block(encoded_items):
+    if not encoded_items:
+        return encode_long(0)
+    return encode_long(len(encoded_items)) + b''.join(encoded_items) + \
+        encode_long(0)
+
+
+def _to_bytes(value, encoding):
+    if isinstance(value, unicode):
+        return value.encode(encoding)
+    return value
@@ -17,9 +17,14 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 
 import copy
+from collections import defaultdict
+from collections import namedtuple
 
 from avro import schema
 
+from data_pipeline_avro_util.incremental_schema_validator import \
+    IncrementalSchemaValidator
+
 
 class AvroSchemaBuilder(object):
     """
@@ -66,11 +71,34 @@ class AvroSchemaBuilder(object):
               has_default=False,
               default_value=None
           )
+
+    With `validate_incrementally` set, each step is also validated as it is
+    made: the names of the named types, the field names, the field types and
+    their named type references, and the field default values.  An invalid
+    step raises :class:`avro.schema.SchemaParseException` right away and
+    leaves the schema in build unchanged.
     """
 
-    def __init__(self):
+    def __init__(self, validate_incrementally=False):
         self._schema_json = None  # current avro schema in build
         self._schema_tracker = []
+        # (fields list, {field name: index}) of the current schema, built on
+        # the first field lookup and kept in sync by the field mutations.
+        self._field_index = None
+        self._field_index_tracker = []
+        # id(fields list) -> (fields list, {id(field): field}) of the fields
+        # still shared with the schema json passed to `begin_with_schema_json`
+        self._shared_fields = {}
+        self._schema_object = None
+        self._validate_incrementally = validate_incrementally
+        self._validator = None  # validator of the schema in build
+
+    @property
+    def schema_object(self):
+        """The parsed :class:`avro.schema.Schema` of the last top level
+        schema built by :func:`end`, or None if there is none.
+        """
+        return self._schema_object
 
     @classmethod
     def create_null(cls):
@@ -171,8 +199,7 @@ class AvroSchemaBuilder(object):
             self._set_doc(enum_schema, doc)
         enum_schema.update(metadata)
 
-        self._save_current_schema()
-        self._set_current_schema(enum_schema)
+        self._begin_named_schema(enum_schema)
         return self
 
     def begin_fixed(self, name, size, namespace=None, aliases=None,
@@ -188,8 +215,7 @@ class AvroSchemaBuilder(object):
             self._set_aliases(fixed_schema, aliases)
         fixed_schema.update(metadata)
 
-        self._save_current_schema()
-        self._set_current_schema(fixed_schema)
+        self._begin_named_schema(fixed_schema)
         return self
 
     def begin_decimal_fixed(self, precision, scale, size, name,
@@ -206,8 +232,7 @@ class AvroSchemaBuilder(object):
             self._set_namespace(fixed_decimal_schema, namespace)
         fixed_decimal_schema.update(metadata)
 
-        self._save_current_schema()
-        self._set_current_schema(fixed_decimal_schema)
+        self._begin_named_schema(fixed_decimal_schema)
         return self
 
     def begin_decimal_bytes(self, precision, scale, **metadata):
@@ -248,8 +273,7 @@ class AvroSchemaBuilder(object):
             self._set_doc(record_schema, doc)
         record_schema.update(metadata)
 
-        self._save_current_schema()
-        self._set_current_schema(record_schema)
+        self._begin_named_schema(record_schema)
         return self
 
     def add_field(self, name, typ, has_default=False, default_value=None,
@@ -264,7 +288,12 @@ class AvroSchemaBuilder(object):
             doc=doc,
             **metadata
         )
-        self._schema_json['fields'].append(field)
+        self._validate_field_changes([], [field])
+        fields = self._schema_json['fields']
+        fields.append(field)
+        field_index = self._get_synced_field_index()
+        if field_index is not None:
+            field_index.setdefault(field['name'], len(fields) - 1)
         return self
 
     @classmethod
@@ -287,26 +316,110 @@ class AvroSchemaBuilder(object):
         self._set_current_schema(union_schema)
         return self
 
-    def end(self):
+    def end(self, return_schema_object=False):
+        """End building the current schema and return it.  The top level
+        schema is validated by parsing it into an :class:`avro.schema.Schema`
+        object, which is also kept in :attr:`schema_object`.
+
+        Args:
+            return_schema_object (bool): Whether to return the parsed schema
+                object of the top level schema instead of its json.  The
+                object can be given to :class:`AvroStringWriter` and
+                :class:`AvroStringReader` directly, so the schema is parsed
+                only once and the json is never regenerated.
+
+        Raises:
+            ValueError: This exception is thrown if `return_schema_object` is
+                set for a nested schema, which cannot be parsed on its own.
+        """
         if not self._schema_tracker:
             # this is the top level schema; do the schema validation
             schema_obj = schema.make_avsc_object(self._schema_json)
             self._schema_json = None
-            return schema_obj.to_json()
-
+            self._field_index = None
+            self._shared_fields = {}
+            self._schema_object = schema_obj
+            self._validator = None
+            return schema_obj if return_schema_object else schema_obj.to_json()
+
+        if return_schema_object:
+            raise ValueError(
+                "Only the top level schema can be returned as a schema object."
+            )
         current_schema_json = self._schema_json
+        if (self._validator is not None and
+                isinstance(current_schema_json, dict) and
+                current_schema_json.get('type') in ('record', 'error')):
+            self._validator.end_record(current_schema_json)
         self._restore_current_schema()
         return current_schema_json
 
+    def _begin_named_schema(self, named_schema):
+        validator = self._get_validator()
+        if validator is not None:
+            validator.begin_named_schema(
+                named_schema,
+                self._get_default_namespace()
+            )
+        self._save_current_schema()
+        self._set_current_schema(named_schema)
+
+    def _get_validator(self):
+        if self._validator is None and self._validate_incrementally:
+            self._validator = IncrementalSchemaValidator()
+        return self._validator
+
+    def _get_default_namespace(self):
+        """Returns the namespace of the innermost record in build."""
+        namespace = None
+        for avro_schema in self._schema_tracker + [self._schema_json]:
+            if (isinstance(avro_schema, dict) and
+                    avro_schema.get('type') in ('record', 'error')):
+                namespace = schema.Name(
+                    avro_schema.get('name'),
+                    avro_schema.get('namespace', namespace),
+                    namespace
+                ).get_space()
+        return namespace
+
+    def _validate_field_changes(self, removed_fields, added_fields):
+        """Validates the fields about to be added to and removed from the
+        current record if the schema is validated incrementally.
+        """
+        if self._validator is None:
+            return
+        field_index = self._get_synced_field_index()
+        if field_index is None:
+            field_index = self._build_field_index(self._get_fields())
+        removed_names = {field['name'] for field in removed_fields}
+        added_names = set()
+        for field in added_fields:
+            name = isinstance(field, dict) and field.get('name')
+            if name in added_names or (
+                name in field_index and name not in removed_names
+            ):
+                raise schema.SchemaParseException(
+                    'Field name {0} already in use.'.format(name)
+                )
+            added_names.add(name)
+        self._validator.replace_fields(
+            removed_fields,
+            added_fields,
+            self._get_default_namespace()
+        )
+
     def _save_current_schema(self):
         if self._schema_json:
             self._schema_tracker.append(self._schema_json)
+            self._field_index_tracker.append(self._field_index)
 
     def _set_current_schema(self, avro_schema):
         self._schema_json = avro_schema
+        self._field_index = None
 
     def _restore_current_schema(self):
         self._schema_json = self._schema_tracker.pop()
+        self._field_index = self._field_index_tracker.pop()
 
     @classmethod
     def _set_namespace(cls, avro_schema, namespace):
@@ -325,10 +438,20 @@ class AvroSchemaBuilder(object):
         The nullable type is a union schema type with `null` primitive type.
         The given default value is used to determine whether the `null` type
         should be the first item in the union type.
+
+        Notes:
+            Unlike :func:`begin_with_schema_json`, the given type is not
+            shared until modified.  The returned union is handed out to be
+            changed in place, so the given type is deep copied, except the
+            named schemas begun by this builder, which keep their identity.
         """
         null_type = self.create_null()
 
-        src_type = copy.deepcopy(schema_type)
+        # Type names are immutable; only nested schemas need to be copied.
+        src_type = (
+            schema_type if isinstance(schema_type, basestring)
+            else self._copy_schema(schema_type)
+        )
         if self.is_nullable_type(schema_type):
             nullable_schema = src_type
         else:
@@ -343,6 +466,17 @@ class AvroSchemaBuilder(object):
         self._set_current_schema(nullable_schema)
         return self
 
+    def _copy_schema(self, schema_json):
+        """Deep copies the schema json, except the named schemas begun by
+        this builder, which keep their identity so that the incremental
+        validator still recognizes them.
+        """
+        memo = {}
+        if self._validator is not None:
+            for begun_schema in self._validator.get_begun_schemas():
+                memo[id(begun_schema)] = begun_schema
+        return copy.deepcopy(schema_json, memo)
+
     @classmethod
     def is_nullable_type(cls, schema_type):
         """Whether the given type is a nullable type, either it is `null` or
@@ -360,10 +494,37 @@ class AvroSchemaBuilder(object):
     def begin_with_schema_json(self, schema_json):
         """Begin building the given schema json object.  Similar to other
         `begin_*` functions, it doesn't validate the input schema json until
-        the end of schema.
+        the end of schema, unless the schema is validated incrementally.
+
+        Notes:
+            The given schema json is not copied as a whole.  The top level
+            dict and its field list are copied, so the builder functions
+            never change the given schema json, while the field dicts and
+            all the nested schemas are shared with it until they are
+            modified.  A field returned by :func:`get_field` is deep copied
+            first, so it and its nested schemas can be modified in place.
         """
-        self._save_current_schema()
-        self._set_current_schema(copy.deepcopy(schema_json))
+        shared_fields = None
+        if isinstance(schema_json, dict):
+            schema_json = dict(schema_json)
+            if isinstance(schema_json.get('fields'), list):
+                shared_fields = schema_json['fields'] = list(
+                    schema_json['fields']
+                )
+        elif isinstance(schema_json, list):
+            schema_json = list(schema_json)
+
+        if (isinstance(schema_json, dict) and
+                schema_json.get('type') in schema.NAMED_TYPES):
+            self._begin_named_schema(schema_json)
+        else:
+            self._save_current_schema()
+            self._set_current_schema(schema_json)
+        if shared_fields is not None:
+            self._shared_fields[id(shared_fields)] = (
+                shared_fields,
+                {id(field): field for field in shared_fields}
+            )
         return self
 
     def remove_field(self, field_name):
@@ -373,7 +534,9 @@ class AvroSchemaBuilder(object):
             ValueError: This exception is thrown if given field cannot be found.
         """
         index, field = self._get_index_and_field(field_name)
+        self._validate_field_changes([field], [])
         del self._schema_json['fields'][index]
+        self._reindex_fields(index)
         return self
 
     def insert_field(self, field, index):
@@ -383,8 +546,7 @@ class AvroSchemaBuilder(object):
             field (dict): Python json representation of an Avro field.
             index (int): position index of the field to be inserted.
         """
-        self._schema_json['fields'].insert(index, field)
-        return self
+        return self.insert_fields([field], index)
 
     def insert_fields(self, fields, index):
         """Insert the given field list at specified field list index.
@@ -394,10 +556,11 @@ class AvroSchemaBuilder(object):
                 fields.
             index (int): start position index to insert the given fields.
         """
+        self._validate_field_changes([], fields)
         record_fields = self._schema_json['fields']
-        self._schema_json['fields'] = (record_fields[:index] +
-                                       fields +
-                                       record_fields[index:])
+        start = self._get_insert_position(index, len(record_fields))
+        record_fields[start:start] = fields
+        self._reindex_fields(start)
         return self
 
     def get_field_index(self, field_name):
@@ -421,15 +584,68 @@ class AvroSchemaBuilder(object):
         Raises:
             ValueError: This exception is thrown if given field cannot be found.
         """
-        _, field = self._get_index_and_field(field_name)
-        return field
+        index, field = self._get_index_and_field(field_name)
+        return self._get_own_field(index, field)
+
+    def _get_own_field(self, index, field):
+        """Replaces the field with a deep copy if it is still shared with the
+        schema json given to `begin_with_schema_json`, and returns it.
+        """
+        fields = self._get_fields()
+        shared_fields = self._shared_fields.get(id(fields))
+        if (shared_fields is None or shared_fields[0] is not fields or
+                shared_fields[1].pop(id(field), None) is not field):
+            return field
+        own_field = copy.deepcopy(field)
+        fields[index] = own_field
+        if self._validator is not None:
+            self._validator.rekey_field(field, own_field)
+        return own_field
 
     def _get_index_and_field(self, field_name):
         fields = self._get_fields()
+        field_index = self._get_synced_field_index()
+        if field_index is not None:
+            index = field_index.get(field_name)
+            if (index is not None and index < len(fields) and
+                    fields[index]['name'] == field_name):
+                return index, fields[index]
+        # The index is missing or the fields were modified outside of the
+        # builder, e.g. through a field dict returned by `get_field`.
+        field_index = self._build_field_index(fields)
+        index = field_index.get(field_name)
+        if index is None:
+            raise ValueError("Cannot find field named {0}".format(field_name))
+        return index, fields[index]
+
+    def _get_synced_field_index(self):
+        """Returns the field name index of the current schema, or None if it
+        has not been built yet or the fields list has been replaced.
+        """
+        if (self._field_index is None or
+                self._field_index[0] is not self._get_fields()):
+            return None
+        return self._field_index[1]
+
+    def _build_field_index(self, fields):
+        field_index = {}
         for i, field in enumerate(fields):
-            if field['name'] == field_name:
-                return i, field
-        raise ValueError("Cannot find field named {0}".format(field_name))
+            field_index.setdefault(field['name'], i)
+        self._field_index = (fields, field_index)
+        return field_index
+
+    def _reindex_fields(self, start):
+        """Updates the field name index after the fields starting at `start`
+        have been inserted, removed or shifted.
+        """
+        field_index = self._get_synced_field_index()
+        if field_index is None:
+            return
+        fields = self._get_fields()
+        for name in [n for n, i in field_index.items() if i >= start]:
+            del field_index[name]
+        for i in range(start, len(fields)):
+            field_index.setdefault(fields[i]['name'], i)
 
     def _get_fields(self):
         return self._schema_json.get('fields', [])
@@ -460,12 +676,118 @@ class AvroSchemaBuilder(object):
                 )
         """
         index, field = self._get_index_and_field(old_field_name)
+        self._validate_field_changes([field], new_fields)
         self._schema_json['fields'][index:index + 1] = new_fields
+        self._reindex_fields(index)
+
+    def apply_field_operations(self, operations):
+        """Apply a batch of field operations to the fields in the current
+        schema in a single pass over the field list.
+
+        All the field names and indices in the operations refer to the field
+        list as it is before the batch is applied, so the operations do not
+        affect each other.  Fields inserted at the same index keep the order
+        of their operations.  The operations are validated before any change
+        is made, so either all of them are applied or none of them is.
+
+        Args:
+            operations (list of :class:`FieldOperation`): The operations to
+                apply.
+
+        Raises:
+            ValueError: This exception is thrown if a field cannot be found,
+                a removed or replaced field is also targeted by another
+                operation, or a field is renamed more than once.
+
+        Notes:
+            Renamed fields and fields with new metadata are copied, so the
+            field dicts passed into the builder are not modified.
+        """
+        fields = self._schema_json['fields']
+        field_count = len(fields)
+        inserts = defaultdict(list)
+        replacements = {}
+        updates = {}
+        renamed = set()
+        for operation in operations:
+            action = operation.action
+            if action == FieldOperation.INSERT:
+                inserts[self._get_insert_position(
+                    operation.index,
+                    field_count
+                )].extend(operation.fields)
+                continue
+            if action not in FieldOperation.FIELD_ACTIONS:
+                raise ValueError(
+                    "Unknown field operation {0}".format(action)
+                )
+
+            index, field = self._get_index_and_field(operation.field_name)
+            if index in replacements or (
+                index in updates and action in FieldOperation.REMOVE_ACTIONS
+            ):
+                raise ValueError(
+                    "Field {0} is removed or replaced by another "
+                    "operation".format(operation.field_name)
+                )
+            if action in FieldOperation.REMOVE_ACTIONS:
+                replacements[index] = operation.fields
+                continue
+
+            updated_field = updates.get(index)
+            if updated_field is None:
+                updated_field = updates[index] = dict(field)
+            if action == FieldOperation.RENAME:
+                if index in renamed:
+                    raise ValueError(
+                        "Field {0} is renamed more than once".format(
+                            operation.field_name
+                        )
+                    )
+                renamed.add(index)
+                updated_field['name'] = operation.new_name
+            else:
+                updated_field.update(operation.metadata)
+
+        new_fields = []
+        kept_ids = set()
+        for index, field in enumerate(fields):
+            new_fields.extend(inserts.get(index, ()))
+            if index in replacements:
+                new_fields.extend(replacements[index])
+            elif index in updates:
+                new_fields.append(updates[index])
+            else:
+                new_fields.append(field)
+                kept_ids.add(id(field))
+        new_fields.extend(inserts.get(field_count, ()))
+
+        if self._validator is not None:
+            changed_indices = set(replacements) | set(updates)
+            self._validate_field_changes(
+                [fields[index] for index in changed_indices],
+                [field for field in new_fields if id(field) not in kept_ids]
+            )
+        fields[:] = new_fields
+        self._build_field_index(fields)
+        return self
+
+    @classmethod
+    def _get_insert_position(cls, index, field_count):
+        # same position as `list.insert`, including negative indices
+        if index < 0:
+            return max(index + field_count, 0)
+        return min(index, field_count)
 
     def clear(self):
         """Clear the schemas that are built so far."""
         self._schema_json = None
         self._schema_tracker = []
+        self._field_index = None
+        self._field_index_tracker = []
+        self._shared_fields = {}
+        self._schema_object = None
+        self._validator = None
 
 
 class AvroField(object):
@@ -561,3 +883,47 @@ class AvroField(object):
 
     def set_metadata(self, **metadata):
         self._field_json.update(metadata)
+
+
+class FieldOperation(namedtuple(
+    'FieldOperation',
+    ['action', 'field_name', 'index', 'fields', 'new_name', 'metadata']
+)):
+    """A single field edit for :func:`AvroSchemaBuilder.apply_field_operations`.
+    Use the `insert`, `remove`, `replace`, `rename` and `set_metadata`
+    functions to construct the operations instead of the constructor.
+    """
+
+    INSERT = 'insert'
+    REMOVE = 'remove'
+    REPLACE = 'replace'
+    RENAME = 'rename'
+    SET_METADATA = 'set_metadata'
+
+    REMOVE_ACTIONS = {REMOVE, REPLACE}
+    FIELD_ACTIONS = {REMOVE, REPLACE, RENAME, SET_METADATA}
+
+    @classmethod
+    def insert(cls, index, fields):
+        """Insert the given field list at specified field list index."""
+        return cls(cls.INSERT, None, index, list(fields), None, None)
+
+    @classmethod
+    def remove(cls, field_name):
+        """Remove the specified field."""
+        return cls(cls.REMOVE, field_name, None, [], None, None)
+
+    @classmethod
+    def replace(cls, field_name, new_fields):
+        """Replace the specified field with 0 or more new fields."""
+        return cls(cls.REPLACE, field_name, None, list(new_fields), None, None)
+
+    @classmethod
+    def rename(cls, field_name, new_name):
+        """Rename the specified field."""
+        return cls(cls.RENAME, field_name, None, None, new_name, None)
+
+    @classmethod
+    def set_metadata(cls, field_name, **metadata):
+        """Add or update the metadata of the specified field."""
+        return cls(cls.SET_METADATA, field_name, None, None, None, metadata)
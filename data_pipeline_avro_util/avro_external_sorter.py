@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import heapq
+import tempfile
+
+from data_pipeline_avro_util.avro_binary_comparator import \
+    AvroBinaryComparator
+from data_pipeline_avro_util.avro_binary_util import read_length_prefixed
+from data_pipeline_avro_util.avro_binary_util import write_length_prefixed
+
+
+class AvroExternalSorter(object):
+
+    def __init__(self, schema, max_buffer_size=64 * 1024 * 1024,
+                 max_merge_width=64, temp_dir=None, key=None,
+                 read_chunk_size=1024 * 1024):
+        """ Utility class for sorting an arbitrarily large stream of Avro
+        encoded messages under a memory budget.  Messages are buffered until
+        `max_buffer_size` bytes, then each buffer is sorted and spilled as a
+        run to a local temp file.  The runs are k-way merged into the final
+        sorted output.  The sort is stable.
+
+        Args:
+            schema (string|dict|:class:`avro.schema.Schema`): The avro schema
+                the messages were encoded with.
+            max_buffer_size (int): Maximum total size in bytes of the encoded
+                messages held in memory for a single run.  The sort keys of
+                the buffered messages take additional memory roughly
+                proportional to this size.
+            max_merge_width (int): Maximum number of runs merged at once,
+                which bounds the number of open temp files.  Larger numbers
+                of runs are merged over multiple passes.
+            temp_dir (string): Directory the runs are spilled to; defaults to
+                the platform temp directory.
+            key (function): Optional function extracting the sort key of an
+                encoded message; defaults to the Avro sort order of `schema`
+                as defined by :class:`AvroBinaryComparator`.
+            read_chunk_size (int): Size in bytes of the reads from the runs
+                during merging.
+        """
+        self.key = key or AvroBinaryComparator(schema).sort_key
+        self.max_buffer_size = max_buffer_size
+        self.max_merge_width = max(max_merge_width, 2)
+        self.temp_dir = temp_dir
+        self.read_chunk_size = read_chunk_size
+
+    def sort(self, encoded_messages):
+        """ Sorts the given encoded messages.
+
+        Args:
+            encoded_messages (iterable of string): Encoded messages in any
+                order.
+
+        Returns (generator of string):
+            The encoded messages in sorted order.
+        """
+        runs = []
+        try:
+            buffered = []
+            buffered_size = 0
+            for message in encoded_messages:
+                buffered.append(message)
+                buffered_size += len(message)
+                if buffered_size >= self.max_buffer_size:
+                    runs.append(self._spill(self._sorted(buffered)))
+                    buffered = []
+                    buffered_size = 0
+
+            if not runs:
+                for message in self._sorted(buffered):
+                    yield message
+                return
+
+            if buffered:
+                runs.append(self._spill(self._sorted(buffered)))
+            del buffered
+
+            while len(runs) > self.max_merge_width:
+                runs = self._merge_pass(runs)
+
+            for message in self._merge(runs):
+                yield message
+        finally:
+            for run in runs:
+                run.close()
+
+    def _sorted(self, messages):
+        messages.sort(key=self.key)
+        return messages
+
+    def _spill(self, sorted_messages):
+        run = tempfile.TemporaryFile(dir=self.temp_dir)
+        for message in sorted_messages:
+            write_length_prefixed(run, message)
+        run.seek(0)
+        return run
+
+    def _merge_pass(self, runs):
+        """ Merges consecutive groups of runs into longer runs, keeping the
+        runs in input order so the sort stays stable.
+        """
+        merged_runs = []
+        try:
+            for start in xrange(0, len(runs), self.max_merge_width):
+                group = runs[start:start + self.max_merge_width]
+                if len(group) == 1:
+                    merged_runs.append(group[0])
+                    continue
+                merged_runs.append(self._spill(self._merge(group)))
+                for run in group:
+                    run.close()
+        except Exception:
+            for run in merged_runs:
+                run.close()
+            raise
+        return merged_runs
+
+    def _merge(self, runs):
+        keyed_runs = [
+            self._read_keyed_run(run, run_index)
+            for run_index, run in enumerate(runs)
+        ]
+        # Ties are broken by the run index, as earlier runs hold earlier
+        # messages, which keeps the merge stable.
+        for _, _, message in heapq.merge(*keyed_runs):
+            yield message
+
+    def _read_keyed_run(self, run, run_index):
+        key = self.key
+        for message in read_length_prefixed(run, self.read_chunk_size):
+            yield key(message), run_index, message
@@ -0,0 +1,505 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+Conversions between the raw values of Avro logical types, i.e. the ints,
+longs and bytes they are encoded as, and their Python representations:
+`datetime.date` for `date`, `datetime.time` for `time-millis` and
+`time-micros`, timezone aware `datetime.datetime` for `timestamp-millis` and
+`timestamp-micros`, and `decimal.Decimal` for `decimal`.
+
+:class:`avro.io.DatumReader` and :class:`avro.io.DatumWriter` convert every
+logical type value one by one while decoding and encoding.  Readers and
+writers created with `convert_logical_types=False` skip that and work with
+the raw values instead, which the converters compiled here turn into Python
+values, and back, for whole records or whole columns at once, and only for
+the fields the application actually uses.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import datetime
+import struct
+
+from avro import constants
+
+from data_pipeline_avro_util.avro_binary_util import build_time
+from data_pipeline_avro_util.avro_binary_util import decode_twos_complement
+from data_pipeline_avro_util.avro_binary_util import encode_twos_complement
+from data_pipeline_avro_util.avro_binary_util import EPOCH_DATETIME
+from data_pipeline_avro_util.avro_binary_util import EPOCH_ORDINAL
+from data_pipeline_avro_util.avro_binary_util import \
+    get_decimal_exponent_suffix
+from data_pipeline_avro_util.avro_binary_util import get_epoch_microseconds
+from data_pipeline_avro_util.util import get_avro_schema_object
+from data_pipeline_avro_util.util import get_nullable_value_schema
+
+
+def strip_logical_types(schema):
+    """ Removes the logical types from the given schema, so that the values
+    of its logical types are read and written as their raw ints, longs or
+    bytes.  The encoding of the values is the same with both schemas.
+
+    Args:
+        schema (string|dict|:class:`avro.schema.Schema`): The avro schema.
+
+    Returns (:class:`avro.schema.Schema`):
+        The schema without logical types; it is the given schema object if
+        it has none.
+    """
+    schema = get_avro_schema_object(schema)
+    schema_json = schema.to_json()
+    stripped_json = _strip_logical_types(schema_json)
+    if stripped_json is schema_json:
+        return schema
+    return get_avro_schema_object(stripped_json)
+
+
+def _strip_logical_types(schema_json):
+    """Returns the json without logical types, or the same json if it has
+    none.
+    """
+    if isinstance(schema_json, list):
+        items = [_strip_logical_types(item) for item in schema_json]
+        if all(a is b for a, b in zip(items, schema_json)):
+            return schema_json
+        return items
+    if not isinstance(schema_json, dict):
+        return schema_json
+    stripped_json = {
+        key: _strip_logical_types(value)
+        if key in ('type', 'items', 'values', 'fields') else value
+        for key, value in schema_json.items()
+        if key != 'logicalType'
+    }
+    if len(stripped_json) == len(schema_json) and all(
+        stripped_json[key] is value for key, value in schema_json.items()
+    ):
+        return schema_json
+    return stripped_json
+
+
+def compile_logical_type_converter(schema, to_python=True, _compiled=None):
+    """ Builds a function converting a value of the given schema between its
+    raw logical type values and their Python representations.
+
+    Args:
+        schema (:class:`avro.schema.Schema`): The schema of the values, with
+            logical types.
+        to_python (bool): Whether the function converts raw values into
+            Python values, or Python values into raw values.
+
+    Returns (function):
+        A `convert(value)` function returning the converted value, or None
+        if the schema doesn't contain any logical type.  Records are
+        converted in place and returned; arrays and maps are converted into
+        new lists and dicts.
+
+    Notes:
+        Python values of `decimal` logical types may not have more decimal
+        places than the schema scale.  Naive datetimes are taken as UTC.
+    """
+    if _compiled is None:
+        _compiled = {}
+    logical_type = getattr(schema, 'logical_type', None)
+    if logical_type is not None:
+        return _compile_logical_type_converter(schema, to_python)
+    schema_type = schema.type
+    if schema_type == 'array':
+        convert_item = compile_logical_type_converter(
+            schema.items,
+            to_python,
+            _compiled
+        )
+        if convert_item is None:
+            return None
+        return lambda items: [convert_item(item) for item in items]
+    if schema_type == 'map':
+        convert_value = compile_logical_type_converter(
+            schema.values,
+            to_python,
+            _compiled
+        )
+        if convert_value is None:
+            return None
+        return lambda values: {
+            key: convert_value(value) for key, value in values.iteritems()
+        }
+    if schema_type in ('union', 'error_union'):
+        return _compile_union_converter(schema, to_python, _compiled)
+    if schema_type in ('record', 'error', 'request'):
+        return _compile_record_converter(schema, to_python, _compiled)
+    return None
+
+
+def compile_column_converter(schema, to_python=True):
+    """ Builds a function converting a whole column of values of the given
+    schema, such as the values of one field in many records, between their
+    raw logical type values and their Python representations.
+
+    Args:
+        schema (:class:`avro.schema.Schema`): The schema of the values, with
+            logical types.
+        to_python (bool): Whether the function converts raw values into
+            Python values, or Python values into raw values.
+
+    Returns (function):
+        A `convert(values)` function returning the list of converted values.
+        Values which don't contain logical types are returned unchanged.
+    """
+    null_allowed, value_schema = get_nullable_value_schema(schema)
+    logical_type = getattr(value_schema, 'logical_type', None)
+    column_converters = (
+        _raw_to_python_columns if to_python else _python_to_raw_columns
+    )
+    if logical_type == constants.DECIMAL:
+        codec = DecimalCodec(value_schema)
+        convert_column = codec.decode_many if to_python else codec.encode_many
+    elif logical_type in column_converters:
+        convert_column = column_converters[logical_type]
+    else:
+        convert_column = None
+    if convert_column is not None:
+        if not null_allowed:
+            return convert_column
+        return lambda values: _convert_nullable_column(convert_column, values)
+
+    convert = compile_logical_type_converter(schema, to_python)
+    if convert is None:
+        return list
+    return lambda values: [convert(value) for value in values]
+
+
+def compile_record_batch_converter(schema, field_names=None, to_python=True):
+    """ Builds a function converting many records of the given record schema
+    in place, one field column at a time.
+
+    Args:
+        schema (:class:`avro.schema.Schema`): The record schema, with logical
+            types.
+        field_names (list of str): Names of the fields to convert; all the
+            fields are converted if not given.
+        to_python (bool): Whether the function converts raw values into
+            Python values, or Python values into raw values.
+
+    Returns (function):
+        A `convert(records)` function converting the list of records in
+        place and returning it.
+    """
+    fields = [
+        field for field in schema.fields
+        if field_names is None or field.name in field_names
+    ]
+    column_converters = []
+    for field in fields:
+        if compile_logical_type_converter(field.type, to_python) is not None:
+            column_converters.append(
+                (field.name, compile_column_converter(field.type, to_python))
+            )
+
+    def convert_records(records):
+        for name, convert_column in column_converters:
+            values = convert_column([record[name] for record in records])
+            for record, value in zip(records, values):
+                record[name] = value
+        return records
+    return convert_records
+
+
+def _convert_nullable_column(convert_column, values):
+    indices = [i for i, value in enumerate(values) if value is not None]
+    if len(indices) == len(values):
+        return convert_column(values)
+    converted = [None] * len(values)
+    for i, value in zip(indices, convert_column([values[i] for i in indices])):
+        converted[i] = value
+    return converted
+
+
+def _compile_union_converter(schema, to_python, compiled):
+    null_allowed, value_schema = get_nullable_value_schema(schema)
+    if null_allowed:
+        convert = compile_logical_type_converter(
+            value_schema,
+            to_python,
+            compiled
+        )
+        if convert is None:
+            return None
+        return lambda value: None if value is None else convert(value)
+    if any(
+        compile_logical_type_converter(branch, to_python, compiled)
+        is not None for branch in schema.schemas
+    ):
+        raise ValueError(
+            "Logical types are only converted in unions with null: "
+            "{0}".format(schema)
+        )
+    return None
+
+
+def _compile_record_converter(schema, to_python, compiled):
+    key = id(schema)
+    if key in compiled:
+        return compiled[key]
+    # recursive records refer to the converter while it is compiled
+    field_converters = []
+    compiled_converter = []
+    compiled[key] = lambda record: compiled_converter[0](record)
+    for field in schema.fields:
+        convert = compile_logical_type_converter(
+            field.type,
+            to_python,
+            compiled
+        )
+        if convert is not None:
+            field_converters.append((field.name, convert))
+    if not field_converters:
+        compiled[key] = None
+        return None
+
+    def convert_record(record):
+        for name, convert in field_converters:
+            record[name] = convert(record[name])
+        return record
+    compiled_converter.append(convert_record)
+    compiled[key] = convert_record
+    return convert_record
+
+
+def _days_to_date(days, _fromordinal=datetime.date.fromordinal):
+    return _fromordinal(EPOCH_ORDINAL + days)
+
+
+def _date_to_days(date):
+    return date.toordinal() - EPOCH_ORDINAL
+
+
+def _millis_to_time(millis):
+    return build_time(millis * 1000)
+
+
+def _time_to_micros(time):
+    return (
+        (time.hour * 3600 + time.minute * 60 + time.second) * 1000000 +
+        time.microsecond
+    )
+
+
+def _time_to_millis(time):
+    return _time_to_micros(time) // 1000
+
+
+def _micros_to_timestamp(micros, _timedelta=datetime.timedelta):
+    return EPOCH_DATETIME + _timedelta(microseconds=micros)
+
+
+def _millis_to_timestamp(millis, _timedelta=datetime.timedelta):
+    return EPOCH_DATETIME + _timedelta(microseconds=millis * 1000)
+
+
+def _timestamp_to_millis(timestamp):
+    return get_epoch_microseconds(timestamp) // 1000
+
+
+class DecimalCodec(object):
+    """ Converts the values of a `decimal` logical type between
+    :class:`decimal.Decimal` values, unscaled integers (the decimal values
+    multiplied by 10 ** scale) and their big-endian two's-complement bytes.
+
+    The scale, precision and size of the schema are looked up once when the
+    codec is created, and :class:`decimal.Decimal` values are built from and
+    turned into strings, which is several times faster than scaling them.
+
+    Args:
+        schema (string|dict|:class:`avro.schema.Schema`): A `bytes` or
+            `fixed` schema with the `decimal` logical type.
+
+    Raises:
+        ValueError: This exception is thrown if the schema isn't a `decimal`
+            logical type schema.
+    """
+
+    _struct_formats = {1: 'b', 2: 'h', 4: 'i', 8: 'q'}
+
+    def __init__(self, schema):
+        # decimal is only imported when needed since it is slow to import
+        from decimal import Decimal
+        schema = get_avro_schema_object(schema)
+        if getattr(schema, 'logical_type', None) != constants.DECIMAL:
+            raise ValueError(
+                "{0} is not a decimal logical type schema".format(schema)
+            )
+        self.precision = schema.get_prop('precision')
+        self.scale = schema.get_prop('scale') or 0
+        self.size = schema.size if schema.type == 'fixed' else None
+        self._decimal_class = Decimal
+        self._exponent_suffix = get_decimal_exponent_suffix(self.scale)
+        self._max_unscaled = 10 ** self.precision
+        self._struct_format = self._struct_formats.get(self.size)
+
+    def decode(self, datum):
+        """ Decodes the bytes of a decimal into a :class:`decimal.Decimal`. """
+        return self._decimal_class(
+            str(decode_twos_complement(datum)) + self._exponent_suffix
+        )
+
+    def decode_many(self, data):
+        """ Decodes a list of decimal bytes into a list of
+        :class:`decimal.Decimal`.
+        """
+        decimal_class = self._decimal_class
+        exponent_suffix = self._exponent_suffix
+        return [
+            decimal_class(str(unscaled) + exponent_suffix)
+            for unscaled in self.decode_unscaled_many(data)
+        ]
+
+    def decode_unscaled(self, datum):
+        """ Decodes the bytes of a decimal into its unscaled integer. """
+        return decode_twos_complement(datum)
+
+    def decode_unscaled_many(self, data):
+        """ Decodes a list of decimal bytes into a list of unscaled integers.
+        Fixed decimals of 1, 2, 4 or 8 bytes are all unpacked at once.
+        """
+        if self._struct_format is None or not data:
+            return [decode_twos_complement(datum) for datum in data]
+        return list(struct.unpack(
+            str('>{0}{1}').format(len(data), self._struct_format),
+            b''.join(data)
+        ))
+
+    def encode(self, value):
+        """ Encodes a :class:`decimal.Decimal` into the bytes of a decimal.
+
+        Raises:
+            ValueError: This exception is thrown if the value has more
+                decimal places than the schema scale, more digits than the
+                schema precision, or doesn't fit in the fixed size.
+        """
+        return self.encode_unscaled(self.to_unscaled(value))
+
+    def encode_many(self, values):
+        """ Encodes a list of :class:`decimal.Decimal` into a list of decimal
+        bytes.
+        """
+        to_unscaled = self.to_unscaled
+        return self.encode_unscaled_many(
+            [to_unscaled(value) for value in values]
+        )
+
+    def encode_unscaled(self, unscaled):
+        """ Encodes an unscaled integer into the bytes of a decimal. """
+        if not -self._max_unscaled < unscaled < self._max_unscaled:
+            raise ValueError("{0} has more than {1} digits".format(
+                unscaled,
+                self.precision
+            ))
+        return encode_twos_complement(unscaled, self.size)
+
+    def encode_unscaled_many(self, unscaled_values):
+        """ Encodes a list of unscaled integers into a list of decimal bytes.
+        """
+        encode_unscaled = self.encode_unscaled
+        return [encode_unscaled(unscaled) for unscaled in unscaled_values]
+
+    def to_unscaled(self, value):
+        """ Returns the unscaled integer of a :class:`decimal.Decimal`, i.e.
+        the value multiplied by 10 ** scale.
+
+        Raises:
+            ValueError: This exception is thrown if the value has more
+                decimal places than the schema scale, or isn't finite.
+        """
+        digits = str(value)
+        if 'E' in digits:
+            digits = '{0:f}'.format(value)
+        whole, _, fraction = digits.partition('.')
+        scale = self.scale
+        if len(fraction) > scale:
+            if fraction[scale:].strip(str('0')):
+                raise ValueError("{0} has more than {1} decimal places".format(
+                    value,
+                    scale
+                ))
+            fraction = fraction[:scale]
+        try:
+            return int(whole + fraction.ljust(scale, str('0')))
+        except ValueError:
+            raise ValueError("{0} is not a finite decimal".format(value))
+
+    def from_unscaled(self, unscaled):
+        """ Returns the :class:`decimal.Decimal` of an unscaled integer. """
+        return self._decimal_class(str(unscaled) + self._exponent_suffix)
+
+
+_raw_to_python = {
+    constants.DATE: _days_to_date,
+    constants.TIME_MILLIS: _millis_to_time,
+    constants.TIME_MICROS: build_time,
+    constants.TIMESTAMP_MILLIS: _millis_to_timestamp,
+    constants.TIMESTAMP_MICROS: _micros_to_timestamp,
+}
+
+_python_to_raw = {
+    constants.DATE: _date_to_days,
+    constants.TIME_MILLIS: _time_to_millis,
+    constants.TIME_MICROS: _time_to_micros,
+    constants.TIMESTAMP_MILLIS: _timestamp_to_millis,
+    constants.TIMESTAMP_MICROS: get_epoch_microseconds,
+}
+
+
+def _compile_logical_type_converter(schema, to_python):
+    logical_type = schema.logical_type
+    if logical_type == constants.DECIMAL:
+        codec = DecimalCodec(schema)
+        return codec.decode if to_python else codec.encode
+    converters = _raw_to_python if to_python else _python_to_raw
+    if logical_type not in converters:
+        return None
+    return converters[logical_type]
+
+
+def _days_to_date_column(values, _fromordinal=datetime.date.fromordinal):
+    epoch_ordinal = EPOCH_ORDINAL
+    return [_fromordinal(epoch_ordinal + days) for days in values]
+
+
+def _date_to_days_column(values):
+    epoch_ordinal = EPOCH_ORDINAL
+    return [date.toordinal() - epoch_ordinal for date in values]
+
+
+def _micros_to_timestamp_column(values, _timedelta=datetime.timedelta):
+    epoch = EPOCH_DATETIME
+    return [epoch + _timedelta(0, 0, micros) for micros in values]
+
+
+def _millis_to_timestamp_column(values, _timedelta=datetime.timedelta):
+    epoch = EPOCH_DATETIME
+    return [epoch + _timedelta(0, 0, 0, millis) for millis in values]
+
+
+_raw_to_python_columns = {
+    constants.DATE: _days_to_date_column,
+    constants.TIMESTAMP_MILLIS: _millis_to_timestamp_column,
+    constants.TIMESTAMP_MICROS: _micros_to_timestamp_column,
+}
+
+_python_to_raw_columns = {
+    constants.DATE: _date_to_days_column,
+}
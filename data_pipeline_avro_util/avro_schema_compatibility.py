@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import hashlib
+import json
+from collections import OrderedDict
+
+import avro.schema
+from avro import constants
+
+from data_pipeline_avro_util.incremental_schema_validator import \
+    is_valid_default_value
+from data_pipeline_avro_util.util import get_avro_schema_object
+
+
+class Compatibility(object):
+    """Types of compatibility between a new schema and an old one."""
+
+    BACKWARD = 'backward'  # the new schema can read data of the old one
+    FORWARD = 'forward'    # the old schema can read data of the new one
+    FULL = 'full'          # both backward and forward
+
+
+class SchemaCompatibilityChecker(object):
+    def __init__(self):
+        """ Utility class for checking whether data written with one avro
+        schema can be read with another, following the schema resolution
+        rules of the Avro specification: reader fields missing from the
+        writer need a valid default, numeric types may be promoted, every
+        writer enum symbol and union branch must be readable, and named
+        types and fields may be matched through the reader's aliases.
+
+        Verdicts are memoized by the pair of schema fingerprints, where the
+        fingerprints ignore docs and other attributes which do not affect
+        schema resolution.  The checker also keeps a history of schema
+        versions, indexed by fingerprint, so checking a schema against all
+        past versions only checks each distinct version once, and checking
+        it again costs a lookup per distinct version.
+
+        Notes:
+            Schemas may be given in any of these forms:
+                - An avro json string
+                - An avro dict representation (parsed json string)
+                - An :class:`avro.schema.Schema` object
+
+            :class:`avro.io.DatumReader` does not support aliases; data
+            written with a schema which is only compatible through aliases
+            cannot be read with it.  Like the reader, and unlike the Avro
+            specification, the checker doesn't promote array items and map
+            values, e.g. an array of ints can't be read as an array of
+            longs.
+        """
+        self._verdicts = {}
+        self._schemas_by_fingerprint = {}
+        self._fingerprints_by_key = {}
+        self._versions_by_fingerprint = OrderedDict()
+        self._num_versions = 0
+
+    def can_read(self, reader_schema, writer_schema):
+        """ Checks whether data written with `writer_schema` can be read with
+        `reader_schema`.
+
+        Args:
+            reader_schema (string|dict|:class:`avro.schema.Schema`): The
+                schema the data is read with.
+            writer_schema (string|dict|:class:`avro.schema.Schema`): The
+                schema the data was written with.
+
+        Returns (bool):
+            Whether the schemas can be resolved.
+        """
+        return self._can_read(
+            self._get_fingerprint(reader_schema),
+            self._get_fingerprint(writer_schema)
+        )
+
+    def is_compatible(
+        self,
+        new_schema,
+        old_schema,
+        compatibility=Compatibility.FULL
+    ):
+        """ Checks whether `new_schema` has the given compatibility with
+        `old_schema`.
+
+        Args:
+            new_schema (string|dict|:class:`avro.schema.Schema`): The new
+                schema.
+            old_schema (string|dict|:class:`avro.schema.Schema`): The old
+                schema.
+            compatibility (str): One of the :class:`Compatibility` types.
+
+        Returns (bool):
+            Whether the schemas are compatible.
+        """
+        return self._is_compatible(
+            self._get_fingerprint(new_schema),
+            self._get_fingerprint(old_schema),
+            compatibility
+        )
+
+    def add_version(self, schema):
+        """ Adds the given schema as the next version to the history of
+        schemas checked by :func:`find_incompatible_versions`.
+
+        Args:
+            schema (string|dict|:class:`avro.schema.Schema`): The schema of
+                the version.
+
+        Returns (int):
+            The 0-based index of the version in the history.
+        """
+        fingerprint = self._get_fingerprint(schema)
+        version = self._num_versions
+        self._versions_by_fingerprint.setdefault(fingerprint, []).append(
+            version
+        )
+        self._num_versions += 1
+        return version
+
+    def find_incompatible_versions(
+        self,
+        schema,
+        compatibility=Compatibility.FULL
+    ):
+        """ Finds the versions in the history which the given schema does not
+        have the given compatibility with.  Versions which do not differ in
+        anything that affects schema resolution are checked only once.
+
+        Args:
+            schema (string|dict|:class:`avro.schema.Schema`): The schema to
+                check.
+            compatibility (str): One of the :class:`Compatibility` types.
+
+        Returns (list of int):
+            The sorted indices of the incompatible versions.
+        """
+        fingerprint = self._get_fingerprint(schema)
+        incompatible_versions = []
+        for old_fingerprint, versions in self._versions_by_fingerprint.items():
+            if not self._is_compatible(
+                fingerprint,
+                old_fingerprint,
+                compatibility
+            ):
+                incompatible_versions.extend(versions)
+        return sorted(incompatible_versions)
+
+    def _is_compatible(self, new_fingerprint, old_fingerprint, compatibility):
+        if compatibility == Compatibility.BACKWARD:
+            return self._can_read(new_fingerprint, old_fingerprint)
+        if compatibility == Compatibility.FORWARD:
+            return self._can_read(old_fingerprint, new_fingerprint)
+        if compatibility == Compatibility.FULL:
+            return (
+                self._can_read(new_fingerprint, old_fingerprint) and
+                self._can_read(old_fingerprint, new_fingerprint)
+            )
+        raise ValueError("Unknown compatibility {0}".format(compatibility))
+
+    def _can_read(self, reader_fingerprint, writer_fingerprint):
+        if reader_fingerprint == writer_fingerprint:
+            return True
+        key = (reader_fingerprint, writer_fingerprint)
+        verdict = self._verdicts.get(key)
+        if verdict is None:
+            verdict = _can_read(
+                self._schemas_by_fingerprint[reader_fingerprint],
+                self._schemas_by_fingerprint[writer_fingerprint],
+                {}
+            )
+            self._verdicts[key] = verdict
+        return verdict
+
+    def _get_fingerprint(self, schema):
+        # json strings and schema objects are memoized so known schemas are
+        # neither parsed nor serialized again; the schema object is kept in
+        # the key so its id is not reused.
+        if isinstance(schema, avro.schema.Schema):
+            key = (id(schema), schema)
+        elif isinstance(schema, basestring):
+            key = schema
+        else:
+            key = None
+        fingerprint = self._fingerprints_by_key.get(key)
+        if fingerprint is None:
+            schema = get_avro_schema_object(schema)
+            fingerprint = get_resolution_fingerprint(schema)
+            self._schemas_by_fingerprint.setdefault(fingerprint, schema)
+            if key is not None:
+                self._fingerprints_by_key[key] = fingerprint
+        return fingerprint
+
+
+def get_resolution_fingerprint(schema):
+    """ Computes a fingerprint of the given avro schema which only covers what
+    affects schema resolution, so that, unlike
+    :func:`data_pipeline_avro_util.util.get_avro_schema_fingerprint`, it does
+    not change with docs or metadata.
+
+    Args:
+        schema (string|dict|:class:`avro.schema.Schema`): The avro schema.
+
+    Returns (string):
+        The hex digest of the fingerprint.
+    """
+    schema_json = _get_resolution_json(
+        get_avro_schema_object(schema).to_json()
+    )
+    return hashlib.md5(
+        json.dumps(schema_json, sort_keys=True, separators=(',', ':'))
+    ).hexdigest()
+
+
+_RESOLUTION_KEYS = {
+    'type',
+    'name',
+    'namespace',
+    'aliases',
+    'fields',
+    'symbols',
+    'size',
+    'items',
+    'values',
+    'default',
+    'logicalType',
+    'precision',
+    'scale',
+}
+
+
+def _get_resolution_json(schema_json):
+    if isinstance(schema_json, list):
+        return [_get_resolution_json(item) for item in schema_json]
+    if not isinstance(schema_json, dict):
+        return schema_json
+    return {
+        key: value if key in ('default', 'symbols', 'aliases')
+        else _get_resolution_json(value)
+        for key, value in schema_json.items()
+        if key in _RESOLUTION_KEYS
+    }
+
+
+_UNION_TYPES = ('union', 'error_union')
+_RECORD_TYPES = ('record', 'error', 'request')
+
+_PROMOTIONS = {
+    'int': ('long', 'float', 'double'),
+    'long': ('float', 'double'),
+    'float': ('double',),
+}
+
+
+def _can_read(reader, writer, checked):
+    """ Checks whether data written with `writer` can be read with `reader`.
+    Record pairs are recorded in `checked` before their fields are checked,
+    so recursive records assume they match while being checked; since every
+    check is a conjunction, any mismatch still fails the whole check.
+    """
+    writer_type = writer.type
+    reader_type = reader.type
+    if writer_type in _UNION_TYPES:
+        return all(
+            _can_read(reader, branch, checked) for branch in writer.schemas
+        )
+    if reader_type in _UNION_TYPES:
+        # like avro.io.DatumReader, resolve with the first matching branch
+        for branch in reader.schemas:
+            if _matches(branch, writer):
+                return _can_read(branch, writer, checked)
+        return False
+    if not _matches(reader, writer):
+        return False
+    if _is_decimal(reader) and _is_decimal(writer):
+        if (reader.get_prop('precision') != writer.get_prop('precision') or
+                (reader.get_prop('scale') or 0) !=
+                (writer.get_prop('scale') or 0)):
+            return False
+    if reader_type == 'enum':
+        return set(writer.symbols).issubset(reader.symbols)
+    if reader_type == 'array':
+        return _can_read(reader.items, writer.items, checked)
+    if reader_type == 'map':
+        return _can_read(reader.values, writer.values, checked)
+    if reader_type in _RECORD_TYPES:
+        key = (id(reader), id(writer))
+        if key not in checked:
+            checked[key] = True
+            checked[key] = _can_read_record(reader, writer, checked)
+        return checked[key]
+    return True
+
+
+def _can_read_record(reader, writer, checked):
+    writer_fields = writer.fields_dict
+    for field in reader.fields:
+        writer_field = writer_fields.get(field.name)
+        for alias in field.get_prop('aliases') or ():
+            if writer_field is not None:
+                break
+            writer_field = writer_fields.get(alias)
+        if writer_field is not None:
+            if not _can_read(field.type, writer_field.type, checked):
+                return False
+        elif not (
+            field.has_default and
+            is_valid_default_value(field.type, field.default)
+        ):
+            return False
+    return True
+
+
+def _matches(reader, writer):
+    writer_type = writer.type
+    reader_type = reader.type
+    if reader_type != writer_type:
+        return reader_type in _PROMOTIONS.get(writer_type, ())
+    # like avro.io.DatumReader, array items and map values are not promoted
+    if reader_type == 'array':
+        return reader.items.type == writer.items.type
+    if reader_type == 'map':
+        return reader.values.type == writer.values.type
+    if reader_type in avro.schema.NAMED_TYPES:
+        if not _names_match(reader, writer):
+            return False
+        return reader_type != 'fixed' or reader.size == writer.size
+    return True
+
+
+def _names_match(reader, writer):
+    if reader.fullname == writer.fullname:
+        return True
+    namespace = reader.namespace
+    return any(
+        avro.schema.Name(alias, namespace, None).fullname == writer.fullname
+        for alias in reader.get_prop('aliases') or ()
+    )
+
+
+def _is_decimal(schema):
+    return getattr(schema, 'logical_type', None) == constants.DECIMAL
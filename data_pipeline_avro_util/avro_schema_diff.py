@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import bisect
+import json
+
+import avro.schema
+
+from data_pipeline_avro_util.avro_builder import AvroField
+from data_pipeline_avro_util.avro_builder import FieldOperation
+
+
+def diff_record_fields(old_schema, new_schema):
+    """ Computes the field operations which transform the fields of the old
+    record schema into the fields of the new one, so that applying them with
+    :func:`AvroSchemaBuilder.apply_field_operations` to the old schema gives
+    the fields of the new schema.
+
+    Fields are aligned by name.  The largest set of fields which are in both
+    schemas in the same relative order is kept in place; they are left as is
+    if unchanged, get a `set_metadata` operation if only metadata was added
+    or changed, and are replaced otherwise.  All the other fields are
+    removed, inserted or replaced.  This takes O(n log n) time in the number
+    of fields.
+
+    Args:
+        old_schema (string|dict|:class:`avro.schema.Schema`): The old avro
+            record schema.
+        new_schema (string|dict|:class:`avro.schema.Schema`): The new avro
+            record schema.
+
+    Returns (list of :class:`FieldOperation`):
+        The operations, referring to the fields of the old schema.
+
+    Raises:
+        ValueError: This exception is thrown if either schema is not a record.
+
+    Notes:
+        Only the fields are compared; record level attributes such as the
+        name, doc or metadata are not.  Renamed fields are reported as
+        removed and inserted fields.
+    """
+    old_fields = _get_record_fields(old_schema)
+    new_fields = _get_record_fields(new_schema)
+
+    old_index = {field['name']: i for i, field in enumerate(old_fields)}
+    common = [
+        (new_pos, old_index[field['name']])
+        for new_pos, field in enumerate(new_fields)
+        if field['name'] in old_index
+    ]
+    kept = _longest_increasing_subsequence(common)
+
+    operations = []
+    # (old position, new position) of the kept fields, plus a sentinel
+    anchors = kept + [(len(old_fields), len(new_fields))]
+    old_start = new_start = 0
+    for old_pos, new_pos in anchors:
+        removed = old_fields[old_start:old_pos]
+        inserted = new_fields[new_start:new_pos]
+        if removed and inserted:
+            operations.append(
+                FieldOperation.replace(removed[0]['name'], inserted)
+            )
+            removed = removed[1:]
+        elif inserted:
+            operations.append(FieldOperation.insert(old_pos, inserted))
+        operations.extend(
+            FieldOperation.remove(field['name']) for field in removed
+        )
+        if old_pos < len(old_fields):
+            operation = _diff_field(old_fields[old_pos], new_fields[new_pos])
+            if operation is not None:
+                operations.append(operation)
+        old_start = old_pos + 1
+        new_start = new_pos + 1
+    return operations
+
+
+def _get_record_fields(schema):
+    if isinstance(schema, avro.schema.Schema):
+        schema_json = schema.to_json()
+    elif isinstance(schema, basestring):
+        schema_json = json.loads(schema)
+    else:
+        schema_json = schema
+    if (not isinstance(schema_json, dict) or
+            schema_json.get('type') not in ('record', 'error')):
+        raise ValueError("Only record schemas can be diffed.")
+    return schema_json['fields']
+
+
+def _longest_increasing_subsequence(pairs):
+    """Returns the longest subsequence of the given (new position, old
+    position) pairs, which are sorted by new position, whose old positions
+    are increasing too, as (old position, new position) pairs.
+    """
+    tail_old_positions = []  # smallest tail old position of each length
+    tail_indices = []
+    previous = [None] * len(pairs)
+    for i, (_, old_pos) in enumerate(pairs):
+        length = bisect.bisect_left(tail_old_positions, old_pos)
+        if length == len(tail_old_positions):
+            tail_old_positions.append(old_pos)
+            tail_indices.append(i)
+        else:
+            tail_old_positions[length] = old_pos
+            tail_indices[length] = i
+        previous[i] = tail_indices[length - 1] if length else None
+
+    subsequence = []
+    i = tail_indices[-1] if tail_indices else None
+    while i is not None:
+        new_pos, old_pos = pairs[i]
+        subsequence.append((old_pos, new_pos))
+        i = previous[i]
+    subsequence.reverse()
+    return subsequence
+
+
+def _diff_field(old_field, new_field):
+    if old_field == new_field:
+        return None
+    reserved_keys = AvroField._reserved_keys
+    changed_metadata = {}
+    for key, value in new_field.items():
+        if key not in old_field or old_field[key] != value:
+            if key in reserved_keys:
+                return FieldOperation.replace(old_field['name'], [new_field])
+            changed_metadata[key] = value
+    if any(key not in new_field for key in old_field):
+        return FieldOperation.replace(old_field['name'], [new_field])
+    return FieldOperation.set_metadata(old_field['name'], **changed_metadata)
@@ -0,0 +1,511 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import cPickle as pickle
+import errno
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+import avro.schema
+
+from data_pipeline_avro_util import __version__
+from data_pipeline_avro_util.avro_binary_util import compile_decoder
+from data_pipeline_avro_util.avro_binary_util import compile_skipper
+from data_pipeline_avro_util.avro_string_reader import AvroStringReader
+from data_pipeline_avro_util.util import get_avro_schema_fingerprint
+
+
+# Cache entries are only read by the library and python versions which wrote
+# them, since they hold pickled avro schema objects.
+_CACHE_VERSION = 'data_pipeline_avro_util-{0}-py{1}.{2}'.format(
+    __version__,
+    *sys.version_info[:2]
+)
+
+
+class AvroSchemaStore(object):
+    def __init__(self, cache_dir=None):
+        """ Utility class for loading many avro schemas which share named
+        types, such as all the versions of the schemas of many topics.
+
+        Schemas loaded through the store are parsed once per distinct json,
+        where schema objects are compared by their `to_json()` form.
+        Named schemas are interned: structurally identical named records,
+        enums and fixed types, defined in the same namespace, are parsed
+        once and the same :class:`avro.schema.Schema` object is shared by
+        all the schemas which define them.  Decoders and skippers compiled
+        through the store are shared the same way, so the codecs of an
+        interned record are compiled once for all the schemas using it.
+
+        Args:
+            cache_dir (str): Optional directory where the parsed schemas and
+                their fingerprints are cached across processes.  Schemas
+                found in the cache are unpickled instead of parsed, which is
+                several times faster; interned named schemas are cached
+                separately so they are still shared.  Compiled codecs are
+                functions, which cannot be cached, so they are compiled
+                again from the cached schemas.
+
+        Notes:
+            Only named schemas which don't reference named types defined
+            outside of them are interned; the other ones are parsed as part
+            of their enclosing schema as usual.
+
+            The store keeps every schema and codec it loads for its whole
+            lifetime.  Since the schema objects are shared, they must not be
+            modified.
+
+            The cache directory should only be writable by trusted users,
+            since the cached schemas are unpickled.  Unreadable cache entries
+            are ignored and written again.
+        """
+        self.cache_dir = cache_dir
+        self._schemas = {}
+        self._fingerprints = {}
+        # digest -> (schema object, defined names) of the interned named
+        # schemas, and id(schema object) -> digest
+        self._named_schemas = {}
+        self._named_schema_digests = {}
+        self._compiled_decoders = {}
+        self._compiled_skippers = {}
+        self._decoders = {}
+        self._skippers = {}
+        self._readers = {}
+
+    def get_schema(self, schema):
+        """ Gets the interned schema object of the given schema.
+
+        Args:
+            schema (string|dict|:class:`avro.schema.Schema`): The avro
+                schema.
+
+        Returns (:class:`avro.schema.Schema`):
+            The schema object, which is the same for every equal schema
+            loaded through the store.
+
+        Raises:
+            :class:`avro.schema.SchemaParseException`: This exception is
+                thrown if the schema is not valid.
+        """
+        if isinstance(schema, basestring):
+            schema_obj = self._schemas.get(schema)
+            if schema_obj is not None:
+                return schema_obj
+            try:
+                schema_json = json.loads(schema)
+            except ValueError as e:
+                raise avro.schema.SchemaParseException(
+                    'Error parsing JSON: %s, error = %s' % (schema, e)
+                )
+        elif isinstance(schema, avro.schema.Schema):
+            schema_json = schema.to_json()
+        else:
+            schema_json = schema
+
+        # sort_keys would make json use its much slower pure Python encoder;
+        # equal dicts with a different key order are only parsed twice.
+        key = json.dumps(schema_json)
+        schema_obj = self._schemas.get(key)
+        if schema_obj is None:
+            schema_obj = self._load_schema(key, schema_json)
+            self._schemas[key] = schema_obj
+        if isinstance(schema, basestring):
+            self._schemas[schema] = schema_obj
+        return schema_obj
+
+    def get_fingerprint(self, schema):
+        """ Gets the fingerprint of the given schema, as computed by
+        :func:`data_pipeline_avro_util.util.get_avro_schema_fingerprint`.
+
+        Args:
+            schema (string|dict|:class:`avro.schema.Schema`): The avro
+                schema.
+
+        Returns (string):
+            The hex digest of the schema fingerprint.
+        """
+        schema_obj = self.get_schema(schema)
+        fingerprint = self._fingerprints.get(id(schema_obj))
+        if fingerprint is None:
+            fingerprint = get_avro_schema_fingerprint(schema_obj)
+            self._fingerprints[id(schema_obj)] = fingerprint
+        return fingerprint
+
+    def get_decoder(self, schema):
+        """ Gets the decoder of the given schema, as built by
+        :func:`data_pipeline_avro_util.avro_binary_util.compile_decoder`.
+
+        Args:
+            schema (string|dict|:class:`avro.schema.Schema`): The avro
+                schema.
+
+        Returns (function):
+            A `decode(data, pos)` function returning a tuple of the decoded
+            value and the position right after the encoded value.
+        """
+        schema_obj = self.get_schema(schema)
+        decoder = self._decoders.get(id(schema_obj))
+        if decoder is None:
+            decoder = compile_decoder(schema_obj, self._compiled_decoders)
+            self._decoders[id(schema_obj)] = decoder
+        return decoder
+
+    def get_skipper(self, schema):
+        """ Gets the skipper of the given schema, as built by
+        :func:`data_pipeline_avro_util.avro_binary_util.compile_skipper`.
+
+        Args:
+            schema (string|dict|:class:`avro.schema.Schema`): The avro
+                schema.
+
+        Returns (function):
+            A `skip(data, pos)` function returning the position right after
+            the encoded value which starts at `pos`.
+        """
+        schema_obj = self.get_schema(schema)
+        skipper = self._skippers.get(id(schema_obj))
+        if skipper is None:
+            skipper = compile_skipper(schema_obj, self._compiled_skippers)
+            self._skippers[id(schema_obj)] = skipper
+        return skipper
+
+    def get_reader(self, reader_schema, writer_schema):
+        """ Gets an :class:`AvroStringReader` of the given schemas, which is
+        the same for every equal pair of schemas loaded through the store.
+
+        Args:
+            reader_schema (string|dict|:class:`avro.schema.Schema`): The
+                schema to decode into.
+            writer_schema (string|dict|:class:`avro.schema.Schema`): The
+                schema the messages were encoded with.
+
+        Returns (:class:`AvroStringReader`):
+            The reader of the interned schema objects.
+        """
+        reader_schema_obj = self.get_schema(reader_schema)
+        writer_schema_obj = self.get_schema(writer_schema)
+        key = (id(reader_schema_obj), id(writer_schema_obj))
+        reader = self._readers.get(key)
+        if reader is None:
+            reader = AvroStringReader(reader_schema_obj, writer_schema_obj)
+            self._readers[key] = reader
+        return reader
+
+    def warm_up(self, schemas, pool=None, chunksize=16):
+        """ Loads the given schemas with their fingerprints and codecs ahead
+        of time, so the first message of each schema isn't slowed down by
+        parsing and compiling.
+
+        Only the parsing and fingerprinting can be done in a pool.  The
+        codecs are compiled into this store afterwards, one schema at a
+        time, since compiled codecs are functions which can't be sent back
+        from worker processes, and compiling them in threads of this process
+        would hold the GIL anyway.
+
+        Args:
+            schemas (list): The schemas to load, as json strings, dicts or
+                :class:`avro.schema.Schema` objects, whose decoders and
+                skippers are compiled, or `(reader schema, writer schema)`
+                tuples, whose readers are built as by :func:`get_reader`.
+            pool (:class:`multiprocessing.pool.Pool`): Optional process or
+                thread pool used to parse the schemas in parallel.  Each
+                worker parses its share of the schemas into the cache
+                directory with a store of its own, and this store then loads
+                them all from the cache; this requires `cache_dir`.  Parsing
+                holds the GIL, so only process pools parse in parallel.
+            chunksize (int): Number of schemas sent to a pool worker at a
+                time.
+
+        Raises:
+            ValueError: This exception is thrown if a pool is given to a
+                store without a cache directory.
+        """
+        if pool is not None:
+            if self.cache_dir is None:
+                raise ValueError(
+                    "Warming up with a pool requires a cache directory."
+                )
+            schema_jsons = self._get_unloaded_schema_jsons(schemas)
+            pool.map(_fill_cache, [
+                (self.cache_dir, schema_jsons[i:i + chunksize])
+                for i in xrange(0, len(schema_jsons), chunksize)
+            ])
+
+        for schema in schemas:
+            if isinstance(schema, tuple):
+                self.get_reader(*schema).warm_up()
+            else:
+                self.get_fingerprint(schema)
+                self.get_decoder(schema)
+                self.get_skipper(schema)
+
+    def _get_unloaded_schema_jsons(self, schemas):
+        schema_jsons = []
+        for schema in schemas:
+            for item in schema if isinstance(schema, tuple) else [schema]:
+                if isinstance(item, avro.schema.Schema):
+                    item = item.to_json()
+                if isinstance(item, basestring) and item in self._schemas:
+                    continue
+                schema_jsons.append(item)
+        return schema_jsons
+
+    def _load_schema(self, key, schema_json):
+        if self.cache_dir is None:
+            return self._parse(schema_json)
+        path = self._get_cache_path(_get_digest('schema', key))
+        cached = self._read_cache(path)
+        if cached is not None:
+            schema_obj, fingerprint = cached
+        else:
+            schema_obj = self._parse(schema_json)
+            fingerprint = get_avro_schema_fingerprint(schema_obj)
+            self._write_cache(path, (schema_obj, fingerprint))
+        self._fingerprints[id(schema_obj)] = fingerprint
+        return schema_obj
+
+    def _parse(self, schema_json):
+        reduced_json, free_names, defined_names = self._intern_named_schemas(
+            schema_json,
+            None
+        )
+        if free_names:
+            raise avro.schema.SchemaParseException(
+                'Unknown named schema: %s' % ', '.join(sorted(free_names))
+            )
+        if isinstance(reduced_json, basestring) and reduced_json in (
+            defined_names
+        ):
+            return defined_names[reduced_json]
+        names = avro.schema.Names()
+        _add_interned_names(names, defined_names)
+        return avro.schema.make_avsc_object(reduced_json, names)
+
+    def _intern_named_schemas(self, schema_json, default_namespace):
+        """ Interns the self-contained named schemas in the given schema json.
+
+        Returns a tuple of the json with the interned named schemas replaced
+        by their full names, the full names it references without defining
+        them first, and a dict of the full names it defines to their interned
+        schema objects, or to None for the named schemas left in the json.
+        """
+        if isinstance(schema_json, list):
+            return self._intern_sequence(schema_json, default_namespace)
+        if isinstance(schema_json, basestring):
+            if schema_json in avro.schema.PRIMITIVE_TYPES:
+                return schema_json, set(), {}
+            fullname = avro.schema.Name(
+                schema_json,
+                None,
+                default_namespace
+            ).fullname
+            return schema_json, {fullname}, {}
+        if not isinstance(schema_json, dict):
+            return schema_json, set(), {}
+
+        schema_type = schema_json.get('type')
+        if schema_type in ('array', 'map'):
+            key = 'items' if schema_type == 'array' else 'values'
+            if key not in schema_json:
+                return schema_json, set(), {}
+            reduced_json, free_names, defined_names = (
+                self._intern_named_schemas(schema_json[key], default_namespace)
+            )
+            return (
+                dict(schema_json, **{key: reduced_json}),
+                free_names,
+                defined_names
+            )
+        if schema_type not in avro.schema.NAMED_TYPES:
+            return schema_json, set(), {}
+        return self._intern_named_schema(schema_json, default_namespace)
+
+    def _intern_sequence(self, schemas_json, default_namespace):
+        reduced_schemas = []
+        free_names = set()
+        defined_names = {}
+        for schema_json in schemas_json:
+            reduced_json, item_free_names, item_defined_names = (
+                self._intern_named_schemas(schema_json, default_namespace)
+            )
+            reduced_schemas.append(reduced_json)
+            free_names.update(item_free_names.difference(defined_names))
+            _define_names(defined_names, item_defined_names)
+        return reduced_schemas, free_names, defined_names
+
+    def _intern_named_schema(self, schema_json, default_namespace):
+        name = avro.schema.Name(
+            schema_json.get('name'),
+            schema_json.get('namespace', default_namespace),
+            default_namespace
+        )
+        digest = _get_digest(
+            'named',
+            default_namespace or '',
+            json.dumps(schema_json)
+        )
+        interned = self._named_schemas.get(digest)
+        if interned is None and self.cache_dir is not None:
+            interned = self._read_cache(self._get_cache_path(digest))
+            if interned is not None:
+                self._add_named_schema(digest, *interned)
+        if interned is not None:
+            schema_obj, defined_names = interned
+            return schema_obj.fullname, set(), defined_names
+
+        reduced_json = schema_json
+        free_names = set()
+        defined_names = {}
+        fields = schema_json.get('fields')
+        if schema_json.get('type') in ('record', 'error') and isinstance(
+            fields,
+            list
+        ):
+            # the record name is defined before its fields, which may refer
+            # to it recursively
+            defined_names[name.fullname] = None
+            field_types, free_names, field_defined_names = (
+                self._intern_sequence(
+                    [
+                        field.get('type') if isinstance(field, dict)
+                        else None
+                        for field in fields
+                    ],
+                    name.get_space()
+                )
+            )
+            free_names.difference_update(defined_names)
+            _define_names(defined_names, field_defined_names)
+            del defined_names[name.fullname]
+            reduced_json = dict(schema_json, fields=[
+                dict(field, type=field_type) if isinstance(field, dict)
+                else field
+                for field, field_type in zip(fields, field_types)
+            ])
+        if free_names:
+            defined_names[name.fullname] = None
+            return reduced_json, free_names, defined_names
+
+        names = avro.schema.Names(default_namespace)
+        _add_interned_names(names, defined_names)
+        schema_obj = avro.schema.make_avsc_object(reduced_json, names)
+        defined_names = dict(names.names)
+        self._add_named_schema(digest, schema_obj, defined_names)
+        if self.cache_dir is not None:
+            self._write_cache(
+                self._get_cache_path(digest),
+                (schema_obj, defined_names),
+                root=schema_obj
+            )
+        return schema_obj.fullname, set(), defined_names
+
+    def _add_named_schema(self, digest, schema_obj, defined_names):
+        self._named_schemas[digest] = (schema_obj, defined_names)
+        self._named_schema_digests[id(schema_obj)] = digest
+
+    def _get_cache_path(self, digest):
+        return os.path.join(
+            self.cache_dir,
+            _CACHE_VERSION,
+            '{0}.pickle'.format(digest)
+        )
+
+    def _read_cache(self, path):
+        try:
+            with open(path, 'rb') as cache_file:
+                unpickler = pickle.Unpickler(cache_file)
+                unpickler.persistent_load = self._load_named_schema
+                return unpickler.load()
+        except Exception:
+            # missing, partially written or otherwise unreadable entries are
+            # parsed and written again
+            return None
+
+    def _write_cache(self, path, entry, root=None):
+        """ Pickles the entry into the cache file at `path`.  The interned
+        named schemas in the entry, other than `root`, are pickled as
+        references to their own cache files, so they are shared when loaded.
+        The file is written atomically; failures are ignored since the cache
+        is only an optimization.
+        """
+        def persistent_id(obj):
+            if obj is root:
+                return None
+            return self._named_schema_digests.get(id(obj))
+
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                return
+        cache_file = None
+        try:
+            with tempfile.NamedTemporaryFile(
+                dir=directory,
+                delete=False
+            ) as cache_file:
+                pickler = pickle.Pickler(cache_file, pickle.HIGHEST_PROTOCOL)
+                pickler.persistent_id = persistent_id
+                pickler.dump(entry)
+            os.rename(cache_file.name, path)
+        except (IOError, OSError, pickle.PicklingError):
+            if cache_file is not None and os.path.exists(cache_file.name):
+                os.remove(cache_file.name)
+
+    def _load_named_schema(self, digest):
+        interned = self._named_schemas.get(digest)
+        if interned is None:
+            interned = self._read_cache(self._get_cache_path(digest))
+            if interned is None:
+                raise pickle.UnpicklingError(
+                    'Missing cached schema {0}'.format(digest)
+                )
+            self._add_named_schema(digest, *interned)
+        return interned[0]
+
+
+def _fill_cache(args):
+    cache_dir, schema_jsons = args
+    store = AvroSchemaStore(cache_dir=cache_dir)
+    for schema_json in schema_jsons:
+        store.get_fingerprint(schema_json)
+
+
+def _get_digest(*parts):
+    return hashlib.md5('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _define_names(defined_names, new_names):
+    for fullname, schema_obj in new_names.iteritems():
+        if fullname in defined_names:
+            raise avro.schema.SchemaParseException(
+                'The name "%s" is already in use.' % fullname
+            )
+        defined_names[fullname] = schema_obj
+
+
+def _add_interned_names(names, defined_names):
+    names.names.update(
+        (fullname, schema_obj)
+        for fullname, schema_obj in defined_names.iteritems()
+        if schema_obj is not None
+    )
@@ -16,16 +16,25 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import copy
 import cStringIO
 
-import avro.io
 from cached_property import cached_property
 
+from data_pipeline_avro_util.avro_binary_util import compile_decoder
+from data_pipeline_avro_util.avro_binary_util import encode_default_value
+from data_pipeline_avro_util.avro_logical_types import strip_logical_types
+from data_pipeline_avro_util.util import get_avro_schema_fingerprint
 from data_pipeline_avro_util.util import get_avro_schema_object
 
 
 class AvroStringReader(object):
-    def __init__(self, reader_schema, writer_schema):
+    def __init__(
+        self,
+        reader_schema,
+        writer_schema,
+        convert_logical_types=True
+    ):
         """ Utility class for decoding Avro.
 
         Args:
@@ -35,6 +44,9 @@ class AvroStringReader(object):
             writer_schema (string|dict|:class:`avro.schema.Schema`): An avro
                 schema for decoding, which represents the object the data was
                 originally encoded with.
+            convert_logical_types (bool): Whether values of logical types are
+                decoded into Python values, e.g. `datetime.date` for `date`,
+                or left as their raw ints, longs and bytes.
 
         Notes:
             Both the `reader_schema` and `writer_schema` args may be given in
@@ -42,17 +54,113 @@ class AvroStringReader(object):
                 - An avro json string
                 - An avro dict representation (parsed json string)
                 - An :class:`avro.schema.Schema` object
+
+            When both schemas have the same fingerprint, messages are decoded
+            directly without schema resolution.  When the reader schema only
+            appends fields with default values to the writer schema, the
+            writer part is decoded directly and the precomputed defaults are
+            added to the result.
+
+            The schemas are only parsed when they are first used, and
+            `avro.io` is only imported when messages need full schema
+            resolution, which keeps importing and constructing the reader
+            cheap.
         """
-        self.reader_schema = get_avro_schema_object(reader_schema)
-        self.writer_schema = get_avro_schema_object(writer_schema)
+        self._reader_schema = reader_schema
+        self._writer_schema = writer_schema
+        self.convert_logical_types = convert_logical_types
+
+    @cached_property
+    def reader_schema(self):
+        return self._get_schema(self._reader_schema)
+
+    @cached_property
+    def writer_schema(self):
+        return self._get_schema(self._writer_schema)
+
+    def _get_schema(self, schema):
+        if not self.convert_logical_types:
+            return strip_logical_types(schema)
+        return get_avro_schema_object(schema)
 
     @cached_property
     def avro_reader(self):
+        import avro.io
         return avro.io.DatumReader(
             readers_schema=self.reader_schema,
             writers_schema=self.writer_schema
         )
 
+    @cached_property
+    def _direct_decode_func(self):
+        """ A function decoding messages without schema resolution, or None if
+        the reader and writer schemas require full resolution.
+        """
+        if self._is_same_schema:
+            read = compile_decoder(self.writer_schema)
+            return lambda encoded_message: read(encoded_message, 0)[0]
+
+        trailing_defaults = self._get_trailing_default_values()
+        if trailing_defaults is None:
+            return None
+
+        read = compile_decoder(self.writer_schema)
+        immutable_defaults = {
+            name: value for name, value in trailing_defaults.iteritems()
+            if not isinstance(value, (dict, list))
+        }
+        mutable_defaults = {
+            name: value for name, value in trailing_defaults.iteritems()
+            if isinstance(value, (dict, list))
+        }
+
+        def decode_with_defaults(encoded_message):
+            record = read(encoded_message, 0)[0]
+            record.update(immutable_defaults)
+            for name, value in mutable_defaults.iteritems():
+                record[name] = copy.deepcopy(value)
+            return record
+        return decode_with_defaults
+
+    @property
+    def _is_same_schema(self):
+        return (
+            self.reader_schema is self.writer_schema or
+            get_avro_schema_fingerprint(self.reader_schema) ==
+            get_avro_schema_fingerprint(self.writer_schema)
+        )
+
+    def _get_trailing_default_values(self):
+        """ Returns the default values of the reader schema fields which follow
+        the writer schema fields, or None if the reader schema is not the
+        writer schema with extra trailing fields that all have defaults.
+        """
+        reader_schema = self.reader_schema
+        writer_schema = self.writer_schema
+        if (reader_schema.type != 'record' or
+                writer_schema.type != 'record' or
+                reader_schema.fullname != writer_schema.fullname):
+            return None
+
+        writer_fields = writer_schema.fields
+        reader_fields = reader_schema.fields
+        if len(reader_fields) <= len(writer_fields):
+            return None
+        for writer_field, reader_field in zip(writer_fields, reader_fields):
+            if writer_field.to_json() != reader_field.to_json():
+                return None
+
+        trailing_fields = reader_fields[len(writer_fields):]
+        if not all(field.has_default for field in trailing_fields):
+            return None
+        return {
+            field.name: compile_decoder(field.type)(
+                encode_default_value(field.type, field.default),
+                0
+            )[0]
+            for field in trailing_fields
+        }
+
     def decode(self, encoded_message):
         """ Decodes a given `encoded_message` which was encoded using the
         same schema as `self.writer_schema` into a representation defined by
@@ -64,6 +172,18 @@ class AvroStringReader(object):
         Returns (dict):
             The decoded dictionary representation.
         """
+        if self._direct_decode_func is not None:
+            return self._direct_decode_func(encoded_message)
+        import avro.io
         stringio = cStringIO.StringIO(encoded_message)
         decoder = avro.io.BinaryDecoder(stringio)
         return self.avro_reader.read(decoder)
+
+    def warm_up(self):
+        """ Parses the schemas and builds the decoding functions ahead of the
+        first call to :func:`decode`, so that call isn't slower than the
+        following ones.
+        """
+        if self._direct_decode_func is None:
+            # builds and caches the resolving reader used by `decode`
+            self.avro_reader
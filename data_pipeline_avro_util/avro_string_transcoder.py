@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import avro.io
+import avro.schema
+from cached_property import cached_property
+
+from data_pipeline_avro_util.avro_binary_util import compile_record_once
+from data_pipeline_avro_util.avro_binary_util import compile_skipper
+from data_pipeline_avro_util.avro_binary_util import encode_default_value
+from data_pipeline_avro_util.avro_binary_util import encode_double
+from data_pipeline_avro_util.avro_binary_util import encode_float
+from data_pipeline_avro_util.avro_binary_util import encode_long
+from data_pipeline_avro_util.avro_binary_util import read_float
+from data_pipeline_avro_util.avro_binary_util import read_long
+from data_pipeline_avro_util.avro_binary_util import skip_bytes
+from data_pipeline_avro_util.util import get_avro_schema_object
+
+
+class AvroStringTranscoder(object):
+    def __init__(self, reader_schema, writer_schema):
+        """ Utility class for re-encoding Avro encoded with `writer_schema`
+        into the encoding of `reader_schema`, without decoding the message
+        into Python objects.  Fields are dropped, reordered, defaulted and
+        promoted following the same schema resolution rules as
+        :class:`data_pipeline_avro_util.avro_string_reader.AvroStringReader`.
+
+        Args:
+            reader_schema (string|dict|:class:`avro.schema.Schema`): An avro
+                schema the transcoded messages are encoded with. Must be
+                backwards compatible with `writer_schema`.
+            writer_schema (string|dict|:class:`avro.schema.Schema`): An avro
+                schema which represents the object the data was originally
+                encoded with.
+
+        Notes:
+            Both the `reader_schema` and `writer_schema` args may be given in
+            any of these forms:
+                - An avro json string
+                - An avro dict representation (parsed json string)
+                - An :class:`avro.schema.Schema` object
+        """
+        self.reader_schema = get_avro_schema_object(reader_schema)
+        self.writer_schema = get_avro_schema_object(writer_schema)
+
+    @cached_property
+    def _transcode_func(self):
+        return _compile_transcoder(self.writer_schema, self.reader_schema, {})
+
+    def transcode(self, encoded_message):
+        """ Transcodes a given `encoded_message` which was encoded using the
+        same schema as `self.writer_schema` into the encoding defined by
+        `self.reader_schema`.
+
+        Args:
+            encoded_message (string): An encoded object
+
+        Returns (string):
+            The message encoded with `self.reader_schema`.
+        """
+        out = []
+        self._transcode_func(encoded_message, 0, out)
+        return b''.join(out)
+
+
+def _compile_transcoder(writers_schema, readers_schema, compiled):
+    """ Builds a `transcode(data, pos, out)` function which reads a value
+    encoded with `writers_schema` at `pos`, appends its `readers_schema`
+    encoding to the `out` list, and returns the position after the value.
+
+    Resolution errors are deferred until a value which cannot be resolved is
+    actually transcoded, which matches the behavior of
+    :class:`avro.io.DatumReader`.
+    """
+    if writers_schema.type in ('union', 'error_union'):
+        return _compile_writers_union(writers_schema, readers_schema, compiled)
+
+    if readers_schema.type in ('union', 'error_union'):
+        for index, branch in enumerate(readers_schema.schemas):
+            if avro.io.DatumReader.match_schemas(writers_schema, branch):
+                encoded_index = encode_long(index)
+                transcode_branch = _compile_transcoder(
+                    writers_schema,
+                    branch,
+                    compiled
+                )
+
+                def transcode_into_union(data, pos, out):
+                    out.append(encoded_index)
+                    return transcode_branch(data, pos, out)
+                return transcode_into_union
+        return _compile_failure(
+            'Schemas do not match.',
+            writers_schema,
+            readers_schema
+        )
+
+    if not avro.io.DatumReader.match_schemas(writers_schema, readers_schema):
+        return _compile_failure(
+            'Schemas do not match.',
+            writers_schema,
+            readers_schema
+        )
+
+    if _is_same_schema(writers_schema, readers_schema):
+        return _compile_copy(compile_skipper(writers_schema))
+
+    w_type = writers_schema.type
+    r_type = readers_schema.type
+    if w_type in ('int', 'long') and r_type in ('float', 'double'):
+        encode = encode_float if r_type == 'float' else encode_double
+
+        def transcode_promoted_long(data, pos, out):
+            datum, pos = read_long(data, pos)
+            out.append(encode(datum))
+            return pos
+        return transcode_promoted_long
+    if w_type == 'float' and r_type == 'double':
+        def transcode_promoted_float(data, pos, out):
+            datum, pos = read_float(data, pos)
+            out.append(encode_double(datum))
+            return pos
+        return transcode_promoted_float
+    if w_type == 'enum':
+        return _compile_enum(writers_schema, readers_schema)
+    if w_type == 'array':
+        return _compile_blocks(
+            _compile_transcoder(
+                writers_schema.items,
+                readers_schema.items,
+                compiled
+            )
+        )
+    if w_type == 'map':
+        transcode_value = _compile_transcoder(
+            writers_schema.values,
+            readers_schema.values,
+            compiled
+        )
+
+        def transcode_entry(data, pos, out):
+            key_end = skip_bytes(data, pos)
+            out.append(data[pos:key_end])
+            return transcode_value(data, key_end, out)
+        return _compile_blocks(transcode_entry)
+    if w_type in ('record', 'error', 'request'):
+        return compile_record_once(
+            (writers_schema, readers_schema),
+            compiled,
+            lambda: _compile_record_transcoder(
+                writers_schema,
+                readers_schema,
+                compiled
+            )
+        )
+    # Remaining matches (primitives, int to long promotion and fixed) share
+    # the same encoding in both schemas.
+    return _compile_copy(compile_skipper(writers_schema))
+
+
+def _is_same_schema(writers_schema, readers_schema):
+    return (
+        writers_schema is readers_schema or
+        writers_schema.to_json(avro.schema.Names()) ==
+        readers_schema.to_json(avro.schema.Names())
+    )
+
+
+def _compile_copy(skip):
+    def transcode_copy(data, pos, out):
+        end = skip(data, pos)
+        out.append(data[pos:end])
+        return end
+    return transcode_copy
+
+
+def _compile_failure(fail_msg, writers_schema, readers_schema):
+    def transcode_failure(data, pos, out):
+        raise avro.io.SchemaResolutionException(
+            fail_msg,
+            writers_schema,
+            readers_schema
+        )
+    return transcode_failure
+
+
+def _compile_writers_union(writers_schema, readers_schema, compiled):
+    branch_transcoders = [
+        _compile_transcoder(branch, readers_schema, compiled)
+        for branch in writers_schema.schemas
+    ]
+    branch_count = len(branch_transcoders)
+
+    def transcode_union(data, pos, out):
+        index, pos = read_long(data, pos)
+        if index >= branch_count:
+            raise avro.io.SchemaResolutionException(
+                "Can't access branch index {0} for union with {1} "
+                "branches".format(index, branch_count),
+                writers_schema,
+                readers_schema
+            )
+        return branch_transcoders[index](data, pos, out)
+    return transcode_union
+
+
+def _compile_enum(writers_schema, readers_schema):
+    readers_symbols = readers_schema.symbols
+    index_map = [
+        encode_long(readers_symbols.index(symbol))
+        if symbol in readers_symbols else None
+        for symbol in writers_schema.symbols
+    ]
+
+    def transcode_enum(data, pos, out):
+        index, pos = read_long(data, pos)
+        encoded_index = index_map[index] if index < len(index_map) else None
+        if encoded_index is None:
+            raise avro.io.SchemaResolutionException(
+                "Symbol at index {0} not present in Reader's Schema".format(
+                    index
+                ),
+                writers_schema,
+                readers_schema
+            )
+        out.append(encoded_index)
+        return pos
+    return transcode_enum
+
+
+def _compile_blocks(transcode_item):
+    def transcode_blocks(data, pos, out):
+        block_count, pos = read_long(data, pos)
+        while block_count:
+            if block_count < 0:
+                # The byte size of the block changes when transcoding, so the
+                # block is always written with a positive count and no size.
+                block_count = -block_count
+                _, pos = read_long(data, pos)
+            out.append(encode_long(block_count))
+            for _ in xrange(block_count):
+                pos = transcode_item(data, pos, out)
+            block_count, pos = read_long(data, pos)
+        out.append(b'\x00')
+        return pos
+    return transcode_blocks
+
+
+def _compile_record_transcoder(writers_schema, readers_schema, compiled):
+    readers_fields = readers_schema.fields
+    readers_index = {
+        field.name: i for i, field in enumerate(readers_fields)
+    }
+    writers_field_names = {field.name for field in writers_schema.fields}
+
+    encoded_defaults = {}
+    for i, field in enumerate(readers_fields):
+        if field.name in writers_field_names:
+            continue
+        if not field.has_default:
+            return _compile_failure(
+                'No default value for field {0}'.format(field.name),
+                writers_schema,
+                readers_schema
+            )
+        encoded_defaults[i] = encode_default_value(field.type, field.default)
+
+    steps = []
+    for field in writers_schema.fields:
+        reader_pos = readers_index.get(field.name)
+        if reader_pos is None:
+            steps.append((None, compile_skipper(field.type)))
+        else:
+            steps.append((
+                reader_pos,
+                _compile_transcoder(
+                    field.type,
+                    readers_fields[reader_pos].type,
+                    compiled
+                )
+            ))
+
+    read_order = [pos for pos, _ in steps if pos is not None]
+    if read_order == sorted(read_order):
+        return _compile_ordered_record(steps, encoded_defaults,
+                                       len(readers_fields))
+    return _compile_reordered_record(steps, encoded_defaults,
+                                     len(readers_fields))
+
+
+def _compile_ordered_record(steps, encoded_defaults, field_count):
+    """ Writer fields appear in the same relative order in the reader schema,
+    so each field can be appended to the output as soon as it is read, with
+    default values interleaved at their reader positions.
+    """
+    program = []
+    next_reader_pos = 0
+    for reader_pos, func in steps:
+        if reader_pos is None:
+            program.append((False, func))
+            continue
+        for i in xrange(next_reader_pos, reader_pos):
+            program.append((None, encoded_defaults[i]))
+        program.append((True, func))
+        next_reader_pos = reader_pos + 1
+    for i in xrange(next_reader_pos, field_count):
+        program.append((None, encoded_defaults[i]))
+
+    def transcode_record(data, pos, out):
+        for is_transcoded, step in program:
+            if is_transcoded is None:
+                out.append(step)
+            elif is_transcoded:
+                pos = step(data, pos, out)
+            else:
+                pos = step(data, pos)
+        return pos
+    return transcode_record
+
+
+def _compile_reordered_record(steps, encoded_defaults, field_count):
+    def transcode_record(data, pos, out):
+        field_parts = [None] * field_count
+        for reader_pos, func in steps:
+            if reader_pos is None:
+                pos = func(data, pos)
+            else:
+                field_out = []
+                pos = func(data, pos, field_out)
+                field_parts[reader_pos] = b''.join(field_out)
+        for i, encoded_default in encoded_defaults.iteritems():
+            field_parts[i] = encoded_default
+        out.extend(field_parts)
+        return pos
+    return transcode_record
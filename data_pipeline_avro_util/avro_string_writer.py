@@ -18,29 +18,44 @@ from __future__ import unicode_literals
 
 import cStringIO
 
-import avro.io
 from cached_property import cached_property
 
+from data_pipeline_avro_util.avro_logical_types import strip_logical_types
 from data_pipeline_avro_util.util import get_avro_schema_object
 
 
 class AvroStringWriter(object):
-    def __init__(self, schema):
+    def __init__(self, schema, convert_logical_types=True):
         """ Utility class for encoding Avro.
         Args:
             schema (string|dict|:class:`avro.schema.Schema`): An avro schema
                 for encoding.
+            convert_logical_types (bool): Whether values of logical types are
+                given as Python values, e.g. `datetime.date` for `date`, or as
+                their raw ints, longs and bytes, which are encoded as is.
 
         Notes:
             The `schema` arg may be given in any of these forms:
                 - An avro json string
                 - An avro dict representation (parsed json string)
                 - An :class:`avro.schema.Schema` object
+
+            The schema is only parsed when it is first used, and `avro.io` is
+            only imported then, which keeps importing and constructing the
+            writer cheap.
         """
-        self.schema = get_avro_schema_object(schema)
+        self._schema = schema
+        self.convert_logical_types = convert_logical_types
+
+    @cached_property
+    def schema(self):
+        if not self.convert_logical_types:
+            return strip_logical_types(self._schema)
+        return get_avro_schema_object(self._schema)
 
     @cached_property
     def avro_writer(self):
+        import avro.io
         return avro.io.DatumWriter(
             writers_schema=self.schema
         )
@@ -60,6 +75,7 @@ class AvroStringWriter(object):
         # by benchmarks that indicate it's faster to instantiate a new object
         # than truncate an existing one:
         # http://stackoverflow.com/questions/4330812/how-do-i-clear-a-stringio-object
+        import avro.io
         stringio = cStringIO.StringIO()
         encoder = avro.io.BinaryEncoder(stringio)
         self.avro_writer.write(message_avro_representation, encoder)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from decimal import Decimal
+from decimal import InvalidOperation
+from decimal import ROUND_HALF_UP
+
+from data_pipeline_avro_util.data_pipeline.avro_meta_data import \
+    AvroMetaDataKeys
+from data_pipeline_avro_util.util import compile_utf8_length_check
+from data_pipeline_avro_util.util import get_avro_schema_object
+
+
+class ConstraintChecker(object):
+    def __init__(self, schema):
+        """ Utility class for checking that the values of records of a record
+        schema satisfy the constraints of their `AvroMetaDataKeys` metadata:
+
+            - `MAX_LEN` and `FIX_LEN`: strings and bytes are at most that
+              long, strings being measured in UTF-8 bytes as Redshift does.
+            - `BIT_LEN`: ints are between 0 and 2 ** bitlen - 1.
+            - `UNSIGNED`: ints are not negative.
+            - `FIXED_POINT` with `PRECISION` and `SCALE`: numbers rounded to
+              `scale` decimal places have at most `precision` digits.
+
+        Null values satisfy all the constraints.  Rather than raising on the
+        first invalid value, the checker returns a violation bitmap for each
+        record, in which bit `i` is set if the value of the `i`-th field of
+        `self.constrained_fields` violates its constraints.
+
+        Args:
+            schema (string|dict|:class:`avro.schema.Schema`): The avro record
+                schema of the records.
+
+        Raises:
+            ValueError: This exception is thrown if the schema is not a record
+                schema.
+        """
+        self.schema = get_avro_schema_object(schema)
+        if self.schema.type != 'record':
+            raise ValueError("Constraint checks require a record schema.")
+        self.constrained_fields = []
+        self._checks = []
+        for field in self.schema.fields:
+            is_violation = _compile_field_check(field)
+            if is_violation is not None:
+                bit = 1 << len(self.constrained_fields)
+                self.constrained_fields.append(field)
+                self._checks.append((field.name, bit, is_violation))
+
+    @property
+    def constrained_field_names(self):
+        return [field.name for field in self.constrained_fields]
+
+    def check(self, record):
+        """ Checks the values of a record.
+
+        Returns (int):
+            The violation bitmap of the record, which is 0 if all its values
+            are valid.
+        """
+        bitmap = 0
+        for name, bit, is_violation in self._checks:
+            value = record[name]
+            if value is not None and is_violation(value):
+                bitmap |= bit
+        return bitmap
+
+    def check_many(self, records):
+        """ Checks the values of a list of records, one field at a time.
+
+        Returns (list of int):
+            The violation bitmaps of the records, in order.
+        """
+        bitmaps = [0] * len(records)
+        for name, bit, is_violation in self._checks:
+            for i, record in enumerate(records):
+                value = record[name]
+                if value is not None and is_violation(value):
+                    bitmaps[i] |= bit
+        return bitmaps
+
+    def get_violated_field_names(self, bitmap):
+        """ Returns the names of the fields whose bits are set in the given
+        violation bitmap.
+        """
+        return [
+            name for name, bit, _ in self._checks if bitmap & bit
+        ]
+
+
+def _compile_field_check(field):
+    """ Returns a function telling whether a non-null value of the field
+    violates the constraints of its metadata, or None if it has none.
+    """
+    checks = []
+    max_len = field.get_prop(AvroMetaDataKeys.MAX_LEN)
+    fix_len = field.get_prop(AvroMetaDataKeys.FIX_LEN)
+    if max_len is not None or fix_len is not None:
+        checks.append(compile_utf8_length_check(
+            min(length for length in (max_len, fix_len) if length is not None)
+        ))
+    bit_len = field.get_prop(AvroMetaDataKeys.BIT_LEN)
+    if bit_len is not None:
+        checks.append(_compile_range_check(0, 1 << bit_len))
+    elif field.get_prop(AvroMetaDataKeys.UNSIGNED):
+        checks.append(lambda value: value < 0)
+    precision = field.get_prop(AvroMetaDataKeys.PRECISION)
+    if field.get_prop(AvroMetaDataKeys.FIXED_POINT) and precision:
+        checks.append(_compile_precision_check(
+            precision,
+            field.get_prop(AvroMetaDataKeys.SCALE) or 0
+        ))
+
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+    return lambda value: any(is_violation(value) for is_violation in checks)
+
+
+def _compile_range_check(min_value, end_value):
+    return lambda value: not min_value <= value < end_value
+
+
+def _compile_precision_check(precision, scale):
+    # values which overflow the integer digits are rejected; Redshift rounds
+    # extra decimal places half away from zero
+    end_value = 10 ** (precision - scale)
+    exponent = Decimal(10) ** -scale
+
+    def is_precision_violation(value):
+        if isinstance(value, float):
+            return not abs(round(value, scale)) < end_value
+        if isinstance(value, Decimal):
+            if not value.is_finite():
+                return True
+            try:
+                value = value.quantize(exponent, rounding=ROUND_HALF_UP)
+            except InvalidOperation:
+                # more digits than the context precision
+                return True
+        return not abs(value) < end_value
+    return is_precision_violation
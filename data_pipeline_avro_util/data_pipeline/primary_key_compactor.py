@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import cPickle
+import tempfile
+
+from data_pipeline_avro_util.avro_binary_util import read_length_prefixed
+from data_pipeline_avro_util.avro_binary_util import write_length_prefixed
+from data_pipeline_avro_util.data_pipeline.primary_key_extractor import \
+    PrimaryKeyExtractor
+from data_pipeline_avro_util.util import get_avro_schema_object
+
+
+class PrimaryKeyCompactor(object):
+
+    # Partitions which still exceed the key budget are re-partitioned at
+    # most this many times before being compacted in memory regardless.
+    _max_spill_depth = 4
+
+    def __init__(self, schema, max_keys_in_memory=1000000,
+                 spill_partitions=16, temp_dir=None):
+        """ Utility class for collapsing a stream of change records to the
+        last written record of each primary key, as defined by the
+        `AvroMetaDataKeys.PRIMARY_KEY` metadata of the schema.
+
+        Records are compacted in an in-memory hash index while the number of
+        distinct keys stays within `max_keys_in_memory`.  Beyond that, the
+        records are pickled and spilled into `spill_partitions` temp files by
+        hash of their key, and each partition is compacted separately once
+        the input is exhausted.  Pickling keeps the records exactly as given,
+        so the compacted records don't depend on whether spilling happened.
+
+        Args:
+            schema (string|dict|:class:`avro.schema.Schema`): The avro record
+                schema of the records, with primary key metadata.
+            max_keys_in_memory (int): Maximum number of distinct keys held in
+                memory at once.
+            spill_partitions (int): Number of temp files the records are
+                partitioned into when spilling.
+            temp_dir (string): Directory the partitions are spilled to;
+                defaults to the platform temp directory.
+
+        Raises:
+            ValueError: This exception is thrown if the schema has no primary
+                key fields.
+        """
+        self.schema = get_avro_schema_object(schema)
+        self.key_extractor = PrimaryKeyExtractor(self.schema)
+        self.max_keys_in_memory = max_keys_in_memory
+        self.spill_partitions = max(spill_partitions, 2)
+        self.temp_dir = temp_dir
+
+    def compact(self, records):
+        """ Compacts the given records to the last record of each key.
+
+        Args:
+            records (iterable of dict): Decoded records, oldest first.
+
+        Returns (generator of dict):
+            One record per primary key.  Without spilling, the records are in
+            the order each key first appeared in the input; when spilling, the
+            order is only preserved within each partition.
+        """
+        for record in self._compact(iter(records), depth=0):
+            yield record
+
+    def _compact(self, records, depth):
+        get_key = self.key_extractor.from_dict
+        key_index = {}
+        compacted = []
+        for record in records:
+            key = get_key(record)
+            index = key_index.get(key)
+            if index is not None:
+                compacted[index] = record
+                continue
+            if (len(compacted) >= self.max_keys_in_memory and
+                    depth < self._max_spill_depth):
+                return self._compact_spilled(
+                    compacted,
+                    record,
+                    records,
+                    depth
+                )
+            key_index[key] = len(compacted)
+            compacted.append(record)
+        return iter(compacted)
+
+    def _compact_spilled(self, compacted, next_record, records, depth):
+        partitions = [
+            tempfile.TemporaryFile(dir=self.temp_dir)
+            for _ in xrange(self.spill_partitions)
+        ]
+        try:
+            self._spill(compacted, partitions, depth)
+            del compacted[:]
+            self._spill([next_record], partitions, depth)
+            self._spill(records, partitions, depth)
+        except Exception:
+            for partition in partitions:
+                partition.close()
+            raise
+        return self._compact_partitions(partitions, depth)
+
+    def _spill(self, records, partitions, depth):
+        get_key = self.key_extractor.from_dict
+        partition_count = len(partitions)
+        for record in records:
+            partition = hash((depth, get_key(record))) % partition_count
+            write_length_prefixed(
+                partitions[partition],
+                cPickle.dumps(record, cPickle.HIGHEST_PROTOCOL)
+            )
+
+    def _compact_partitions(self, partitions, depth):
+        try:
+            for partition in partitions:
+                partition.seek(0)
+                for record in self._compact(
+                    self._read_partition(partition),
+                    depth + 1
+                ):
+                    yield record
+                partition.close()
+        finally:
+            for partition in partitions:
+                partition.close()
+
+    def _read_partition(self, partition):
+        for message in read_length_prefixed(partition):
+            yield cPickle.loads(message)
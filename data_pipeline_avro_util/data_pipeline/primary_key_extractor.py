@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from cached_property import cached_property
+
+from data_pipeline_avro_util.avro_binary_util import compile_decoder
+from data_pipeline_avro_util.avro_binary_util import compile_skipper
+from data_pipeline_avro_util.data_pipeline.avro_meta_data import \
+    AvroMetaDataKeys
+from data_pipeline_avro_util.util import get_avro_schema_object
+
+
+class PrimaryKeyExtractor(object):
+    def __init__(self, schema):
+        """ Utility class for extracting the primary key of records of a
+        record schema.  The primary key fields are the fields with the
+        `AvroMetaDataKeys.PRIMARY_KEY` metadata, ordered by its value (the
+        position of the field in the primary key).
+
+        Keys can be extracted either from decoded records or directly from
+        encoded messages, in which case only the primary key fields are
+        decoded and the other fields are skipped over.
+
+        Args:
+            schema (string|dict|:class:`avro.schema.Schema`): The avro record
+                schema of the records.
+
+        Raises:
+            ValueError: This exception is thrown if the schema is not a record
+                schema or has no primary key fields.
+        """
+        self.schema = get_avro_schema_object(schema)
+        if self.schema.type != 'record':
+            raise ValueError("Primary keys require a record schema.")
+        self.key_fields = get_primary_key_fields(self.schema)
+        if not self.key_fields:
+            raise ValueError(
+                "Schema {0} has no primary key fields.".format(
+                    self.schema.fullname
+                )
+            )
+
+    @property
+    def key_field_names(self):
+        return [field.name for field in self.key_fields]
+
+    @cached_property
+    def _encoded_key_steps(self):
+        """ (key position, function) pairs for all the record fields up to
+        the last primary key field.  The key position is None for non-key
+        fields, which are skipped.
+        """
+        key_positions = {
+            field.name: i for i, field in enumerate(self.key_fields)
+        }
+        fields = self.schema.fields
+        last_key_index = max(
+            i for i, field in enumerate(fields) if field.name in key_positions
+        )
+        return [
+            (key_positions.get(field.name), compile_skipper(field.type))
+            for field in fields[:last_key_index + 1]
+        ]
+
+    @cached_property
+    def _decoded_key_steps(self):
+        return [
+            (key_pos, compile_decoder(field.type) if key_pos is not None
+             else skip)
+            for (key_pos, skip), field in zip(
+                self._encoded_key_steps,
+                self.schema.fields
+            )
+        ]
+
+    def from_dict(self, record):
+        """ Extracts the primary key of a decoded record.
+
+        Returns (tuple):
+            The values of the primary key fields, in primary key order.
+        """
+        return tuple(record[field.name] for field in self.key_fields)
+
+    def from_encoded(self, encoded_message):
+        """ Extracts the primary key of a message encoded with `self.schema`,
+        decoding only the primary key fields.
+
+        Returns (tuple):
+            The values of the primary key fields, in primary key order.
+        """
+        key = [None] * len(self.key_fields)
+        pos = 0
+        for key_pos, func in self._decoded_key_steps:
+            if key_pos is None:
+                pos = func(encoded_message, pos)
+            else:
+                key[key_pos], pos = func(encoded_message, pos)
+        return tuple(key)
+
+    def encoded_key(self, encoded_message):
+        """ Extracts the encoded bytes of the primary key fields of a message
+        encoded with `self.schema`, without decoding them.  The result is
+        the concatenation of the encoded key fields in primary key order, so
+        two messages have the same encoded key if and only if they have the
+        same primary key.
+
+        Returns (string):
+            The encoded primary key.
+        """
+        parts = [None] * len(self.key_fields)
+        pos = 0
+        for key_pos, skip in self._encoded_key_steps:
+            end = skip(encoded_message, pos)
+            if key_pos is not None:
+                parts[key_pos] = encoded_message[pos:end]
+            pos = end
+        return b''.join(parts)
+
+
+def get_primary_key_fields(schema):
+    """ Returns the fields of the given record schema which are part of the
+    primary key, ordered by their `AvroMetaDataKeys.PRIMARY_KEY` value.
+
+    Args:
+        schema (:class:`avro.schema.RecordSchema`): An avro record schema.
+
+    Returns (list of :class:`avro.schema.Field`):
+        The primary key fields.
+    """
+    key_fields = [
+        (field.get_prop(AvroMetaDataKeys.PRIMARY_KEY), i, field)
+        for i, field in enumerate(schema.fields)
+        if field.get_prop(AvroMetaDataKeys.PRIMARY_KEY)
+    ]
+    return [field for _, _, field in sorted(key_fields)]
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import struct
+
+from data_pipeline_avro_util.data_pipeline.primary_key_extractor import \
+    PrimaryKeyExtractor
+
+
+_MURMUR2_SEED = 0x9747b28c
+_MURMUR2_M = 0x5bd1e995
+_MASK_32 = 0xffffffff
+
+
+def murmur2(data):
+    """ Computes the 32 bit murmur2 hash of `data`, compatible with the
+    `org.apache.kafka.common.utils.Utils.murmur2` function used by the Kafka
+    default partitioner, so other clients place keys identically.
+
+    Args:
+        data (string): The bytes to hash.
+
+    Returns (int):
+        The hash as a signed 32 bit integer.
+    """
+    length = len(data)
+    h = (_MURMUR2_SEED ^ length) & _MASK_32
+    word_count = length // 4
+    for k in struct.unpack_from(str('<{0}I').format(word_count), data):
+        k = (k * _MURMUR2_M) & _MASK_32
+        k ^= k >> 24
+        k = (k * _MURMUR2_M) & _MASK_32
+        h = ((h * _MURMUR2_M) & _MASK_32) ^ k
+
+    tail = word_count * 4
+    extra = length - tail
+    if extra >= 3:
+        h ^= ord(data[tail + 2]) << 16
+    if extra >= 2:
+        h ^= ord(data[tail + 1]) << 8
+    if extra >= 1:
+        h ^= ord(data[tail])
+        h = (h * _MURMUR2_M) & _MASK_32
+
+    h ^= h >> 13
+    h = (h * _MURMUR2_M) & _MASK_32
+    h ^= h >> 15
+    return h - 0x100000000 if h & 0x80000000 else h
+
+
+class PrimaryKeyPartitioner(object):
+    def __init__(self, schema, num_partitions):
+        """ Utility class for assigning Avro encoded messages to partitions by
+        their primary key.  The partition is the Kafka default partitioner
+        placement of the encoded primary key bytes (see
+        :meth:`PrimaryKeyExtractor.encoded_key`), so it is stable across
+        processes and can be reproduced by any client which encodes the key
+        fields the same way.
+
+        Args:
+            schema (string|dict|:class:`avro.schema.Schema`): The avro record
+                schema of the messages, with primary key metadata.
+            num_partitions (int): Number of partitions.
+
+        Raises:
+            ValueError: This exception is thrown if the schema has no primary
+                key fields or `num_partitions` is not positive.
+        """
+        if num_partitions <= 0:
+            raise ValueError("num_partitions must be positive.")
+        self.key_extractor = PrimaryKeyExtractor(schema)
+        self.num_partitions = num_partitions
+
+    def partition(self, encoded_message):
+        """ Returns the partition (int) of a message encoded with the schema.
+        """
+        encoded_key = self.key_extractor.encoded_key(encoded_message)
+        return (murmur2(encoded_key) & 0x7fffffff) % self.num_partitions
+
+    def partition_batch(self, encoded_messages):
+        """ Partitions a batch of encoded messages.
+
+        Args:
+            encoded_messages (iterable of string): Encoded messages.
+
+        Returns (list of list of string):
+            A buffer of messages for each partition, indexed by partition.
+            Each buffer keeps the messages in their input order.
+        """
+        encoded_key = self.key_extractor.encoded_key
+        num_partitions = self.num_partitions
+        buffers = [[] for _ in xrange(num_partitions)]
+        appenders = [buf.append for buf in buffers]
+        for message in encoded_messages:
+            appenders[
+                (murmur2(encoded_key(message)) & 0x7fffffff) % num_partitions
+            ](message)
+        return buffers
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+
+import avro.schema
+
+from data_pipeline_avro_util.avro_schema_store import AvroSchemaStore
+from data_pipeline_avro_util.data_pipeline.avro_meta_data import \
+    AvroMetaDataKeys
+from data_pipeline_avro_util.data_pipeline.primary_key_extractor import \
+    get_primary_key_fields
+from data_pipeline_avro_util.data_pipeline.temporal_converter import \
+    get_temporal_key
+from data_pipeline_avro_util.util import get_avro_schema_object
+
+
+class RedshiftDDLGenerator(object):
+    def __init__(self, schema_store=None):
+        """ Utility class for generating the Redshift `CREATE TABLE`
+        statements of many record schemas, as generated by
+        :func:`generate_redshift_ddl`.  Statements are memoized by schema
+        fingerprint and table name, so equal schemas are only generated once,
+        and schema strings seen before are not parsed again.
+
+        Args:
+            schema_store (:class:`AvroSchemaStore`): The store the schemas
+                are parsed and fingerprinted with; a store created with a
+                `cache_dir` lets new processes skip parsing.  Defaults to a
+                new store.
+        """
+        self.schema_store = schema_store or AvroSchemaStore()
+        self._fingerprints = {}
+        self._ddls = {}
+
+    def generate(self, schema, table_name=None):
+        """ Generates the `CREATE TABLE` statement of the given record schema.
+
+        Args:
+            schema (string|dict|:class:`avro.schema.Schema`): The avro record
+                schema of the table.
+            table_name (str): The table name; defaults to the record name.
+
+        Returns (unicode):
+            The `CREATE TABLE` statement.
+
+        Raises:
+            ValueError: This exception is thrown if the schema is not a record
+                schema or has a field Redshift can't represent.
+        """
+        key = (self._get_fingerprint(schema), table_name)
+        ddl = self._ddls.get(key)
+        if ddl is None:
+            ddl = generate_redshift_ddl(
+                self.schema_store.get_schema(schema),
+                table_name
+            )
+            self._ddls[key] = ddl
+        return ddl
+
+    def generate_many(self, schemas, table_names=None, pool=None,
+                      chunksize=16):
+        """ Generates the `CREATE TABLE` statements of many record schemas,
+        optionally in parallel.
+
+        Args:
+            schemas (list of string|dict|:class:`avro.schema.Schema`): The
+                avro record schemas of the tables.
+            table_names (list of str): The table names of the schemas; they
+                default to the record names.
+            pool (:class:`multiprocessing.pool.Pool`): The process or thread
+                pool the statements of the schemas not generated yet are
+                generated in; they are generated in the current thread if it
+                is not given.  Only process pools generate in parallel, since
+                parsing and generating hold the GIL.
+            chunksize (int): Number of schemas sent to a pool worker at a
+                time.
+
+        Returns (list of unicode):
+            The `CREATE TABLE` statements, in the order of the given schemas.
+
+        Raises:
+            ValueError: This exception is thrown if a schema is not a record
+                schema or has a field Redshift can't represent.
+        """
+        if table_names is None:
+            table_names = [None] * len(schemas)
+        if pool is not None:
+            self._generate_in_pool(schemas, table_names, pool, chunksize)
+        return [
+            self.generate(schema, table_name)
+            for schema, table_name in zip(schemas, table_names)
+        ]
+
+    def _get_fingerprint(self, schema):
+        schema = _get_schema_string(schema)
+        fingerprint = self._fingerprints.get(schema)
+        if fingerprint is None:
+            fingerprint = self.schema_store.get_fingerprint(schema)
+            self._fingerprints[schema] = fingerprint
+        return fingerprint
+
+    def _generate_in_pool(self, schemas, table_names, pool, chunksize):
+        """ Generates the statements of the schemas which weren't generated
+        yet in the pool workers, and memoizes them with their fingerprints so
+        the schemas don't need to be parsed in this process.
+        """
+        pending = []
+        for schema, table_name in zip(schemas, table_names):
+            schema = _get_schema_string(schema)
+            fingerprint = self._fingerprints.get(schema)
+            if (fingerprint, table_name) not in self._ddls:
+                pending.append((schema, table_name))
+        pending = sorted(set(pending))
+        chunks = [
+            pending[i:i + chunksize]
+            for i in xrange(0, len(pending), chunksize)
+        ]
+        for chunk, results in zip(chunks, pool.map(_generate_ddls, chunks)):
+            for (schema, table_name), (fingerprint, ddl) in zip(
+                    chunk, results):
+                self._fingerprints[schema] = fingerprint
+                self._ddls[(fingerprint, table_name)] = ddl
+
+
+def _get_schema_string(schema):
+    if isinstance(schema, basestring):
+        return schema
+    if isinstance(schema, avro.schema.Schema):
+        schema = schema.to_json()
+    return json.dumps(schema)
+
+
+def _generate_ddls(schemas_and_table_names):
+    """ Generates the fingerprints and statements of (schema json, table
+    name) pairs in a pool worker.
+    """
+    generator = RedshiftDDLGenerator()
+    return [
+        (
+            generator._get_fingerprint(schema),
+            generator.generate(schema, table_name)
+        )
+        for schema, table_name in schemas_and_table_names
+    ]
+
+
+def generate_redshift_ddl(schema, table_name=None):
+    """ Generates the Redshift `CREATE TABLE` statement of the given record
+    schema.  Each field becomes a column whose type is derived from its avro
+    type and `AvroMetaDataKeys` metadata, and matches the values written by
+    :class:`RedshiftExporter`:
+
+        - `FIXED_POINT` fields become `DECIMAL(precision, scale)` columns.
+        - `DATE` fields become `DATE` columns, `DATETIME` and `TIMESTAMP`
+          fields `TIMESTAMP` columns, and `YEAR` fields `SMALLINT` columns.
+          `TIME` fields, which may exceed 24 hours, stay `VARCHAR` columns.
+        - Single bit `BIT_LEN` fields and booleans become `BOOLEAN` columns,
+          and unsigned longs and 64 bit fields `DECIMAL(20, 0)` columns.
+        - Strings become `VARCHAR(MAX_LEN)` or `VARCHAR(FIX_LEN)` columns,
+          bytes and fixed become `VARCHAR` columns twice that long for their
+          hex digits, and enums `VARCHAR` columns of their longest symbol.
+        - Arrays, maps, records and other unions are written as json into
+          `VARCHAR(65535)` columns.
+
+    Fields which are not nullable unions are `NOT NULL`, and the `ENCODE`
+    metadata of a field sets its column compression encoding.  The primary
+    key, `DISTSTYLE` and `SORTKEY` of the table come from the
+    `PRIMARY_KEY` and `SORT_KEY` field metadata and the `DISTSTYLE` record
+    metadata, and the `DISTKEY` from the field with the `DIST_KEY` metadata.
+
+    Args:
+        schema (string|dict|:class:`avro.schema.Schema`): The avro record
+            schema of the table.
+        table_name (str): The table name; defaults to the record name.
+
+    Returns (unicode):
+        The `CREATE TABLE` statement.
+
+    Raises:
+        ValueError: This exception is thrown if the schema is not a record
+            schema, has a field Redshift can't represent, has an `ENCODE`
+            or `DISTSTYLE` Redshift doesn't know, or has a `DISTSTYLE` that
+            doesn't match its distribution key.
+    """
+    schema = get_avro_schema_object(schema)
+    if schema.type != 'record':
+        raise ValueError("Redshift tables require a record schema.")
+    lines = [
+        '    {0}'.format(_get_column_definition(field))
+        for field in schema.fields
+    ]
+    key_fields = get_primary_key_fields(schema)
+    if key_fields:
+        lines.append('    PRIMARY KEY ({0})'.format(
+            _quote_identifiers(key_fields)
+        ))
+    ddl = ['CREATE TABLE {0} (\n{1}\n)'.format(
+        _quote_identifier(table_name or schema.name),
+        ',\n'.join(lines)
+    )]
+
+    diststyle = schema.get_prop(AvroMetaDataKeys.DISTSTYLE)
+    if diststyle:
+        if not isinstance(diststyle, basestring) or (
+                diststyle.upper() not in _DISTSTYLES):
+            raise ValueError("Unknown Redshift DISTSTYLE {0!r}.".format(
+                diststyle
+            ))
+        diststyle = diststyle.upper()
+        ddl.append('DISTSTYLE {0}'.format(diststyle))
+    dist_key_fields = [
+        field for field in schema.fields
+        if field.get_prop(AvroMetaDataKeys.DIST_KEY)
+    ]
+    if len(dist_key_fields) > 1:
+        raise ValueError("Redshift tables have at most one distribution key.")
+    if diststyle == 'KEY' and not dist_key_fields:
+        raise ValueError("DISTSTYLE KEY requires a distribution key.")
+    if dist_key_fields:
+        if diststyle and diststyle != 'KEY':
+            raise ValueError(
+                "A distribution key requires DISTSTYLE KEY, not {0}.".format(
+                    diststyle
+                )
+            )
+        ddl.append('DISTKEY ({0})'.format(
+            _quote_identifiers(dist_key_fields)
+        ))
+    sort_key_fields = sorted(
+        (field.get_prop(AvroMetaDataKeys.SORT_KEY), i, field)
+        for i, field in enumerate(schema.fields)
+        if field.get_prop(AvroMetaDataKeys.SORT_KEY)
+    )
+    if sort_key_fields:
+        ddl.append('SORTKEY ({0})'.format(
+            _quote_identifiers([field for _, _, field in sort_key_fields])
+        ))
+    return '\n'.join(ddl) + ';'
+
+
+_MAX_VARCHAR_LENGTH = 65535
+_MAX_DECIMAL_PRECISION = 38
+# the longest MySQL time is -838:59:59.000000
+_TIME_LENGTH = 17
+# the metadata values are spliced into the statement, so only these are
+# accepted
+_ENCODINGS = frozenset([
+    'AZ64',
+    'BYTEDICT',
+    'DELTA',
+    'DELTA32K',
+    'LZO',
+    'MOSTLY16',
+    'MOSTLY32',
+    'MOSTLY8',
+    'RAW',
+    'RUNLENGTH',
+    'TEXT255',
+    'TEXT32K',
+    'ZSTD',
+])
+_DISTSTYLES = frozenset(['ALL', 'AUTO', 'EVEN', 'KEY'])
+
+
+def _quote_identifier(name):
+    return '"{0}"'.format(name.replace('"', '""'))
+
+
+def _quote_identifiers(fields):
+    return ', '.join(_quote_identifier(field.name) for field in fields)
+
+
+def _get_column_definition(field):
+    schema = field.type
+    nullable = False
+    if schema.type == 'union':
+        branches = [s for s in schema.schemas if s.type != 'null']
+        nullable = len(branches) < len(schema.schemas)
+        if len(branches) == 1:
+            schema = branches[0]
+    definition = [
+        _quote_identifier(field.name),
+        _get_column_type(field, schema)
+    ]
+    if not nullable:
+        definition.append('NOT NULL')
+    encode = field.get_prop(AvroMetaDataKeys.ENCODE)
+    if encode:
+        if not isinstance(encode, basestring) or (
+                encode.upper() not in _ENCODINGS):
+            raise ValueError(
+                "Unknown Redshift encoding {0!r} of field {1}.".format(
+                    encode,
+                    field.name
+                )
+            )
+        definition.append('ENCODE {0}'.format(encode.upper()))
+    return ' '.join(definition)
+
+
+def _get_column_type(field, schema):
+    schema_type = schema.type
+    temporal_key = get_temporal_key(field)
+    if temporal_key == AvroMetaDataKeys.DATE:
+        return 'DATE'
+    if temporal_key in (AvroMetaDataKeys.DATETIME, AvroMetaDataKeys.TIMESTAMP):
+        return 'TIMESTAMP'
+    if temporal_key == AvroMetaDataKeys.TIME:
+        return _varchar(_TIME_LENGTH)
+    if field.get_prop(AvroMetaDataKeys.YEAR):
+        return 'SMALLINT'
+    if field.get_prop(AvroMetaDataKeys.FIXED_POINT):
+        precision = field.get_prop(AvroMetaDataKeys.PRECISION)
+        if not precision or precision > _MAX_DECIMAL_PRECISION:
+            raise ValueError(
+                "Field {0} has a precision of {1}, Redshift supports 1 to "
+                "{2}.".format(field.name, precision, _MAX_DECIMAL_PRECISION)
+            )
+        return 'DECIMAL({0}, {1})'.format(
+            precision,
+            field.get_prop(AvroMetaDataKeys.SCALE) or 0
+        )
+
+    bit_len = field.get_prop(AvroMetaDataKeys.BIT_LEN)
+    if bit_len == 1 or schema_type == 'boolean':
+        return 'BOOLEAN'
+    if bit_len is not None:
+        if bit_len <= 31:
+            return 'INTEGER'
+        return 'BIGINT' if bit_len <= 63 else 'DECIMAL(20, 0)'
+    if schema_type == 'int':
+        return 'INTEGER'
+    if schema_type == 'long':
+        if field.get_prop(AvroMetaDataKeys.UNSIGNED):
+            return 'DECIMAL(20, 0)'
+        return 'BIGINT'
+    if schema_type == 'float':
+        return 'REAL'
+    if schema_type == 'double':
+        return 'DOUBLE PRECISION'
+
+    lengths = [
+        length for length in (
+            field.get_prop(AvroMetaDataKeys.MAX_LEN),
+            field.get_prop(AvroMetaDataKeys.FIX_LEN)
+        )
+        if length is not None
+    ]
+    max_len = min(lengths) if lengths else None
+    if schema_type == 'string':
+        return _varchar(max_len)
+    if schema_type == 'bytes':
+        return _varchar(max_len and max_len * 2)
+    if schema_type == 'fixed':
+        return _varchar(min(max_len or schema.size, schema.size) * 2)
+    if schema_type == 'enum':
+        return _varchar(max(
+            len(symbol.encode('utf-8')) for symbol in schema.symbols
+        ))
+    return _varchar(None)
+
+
+def _varchar(length):
+    if length is None:
+        length = _MAX_VARCHAR_LENGTH
+    return 'VARCHAR({0})'.format(max(min(length, _MAX_VARCHAR_LENGTH), 1))
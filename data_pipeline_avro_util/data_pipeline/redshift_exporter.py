@@ -0,0 +1,481 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import gzip
+import json
+import operator
+import os
+import zlib
+from decimal import Context
+from decimal import Decimal
+from decimal import ROUND_HALF_UP
+
+from data_pipeline_avro_util.avro_binary_util import compile_decoder
+from data_pipeline_avro_util.data_pipeline.avro_meta_data import \
+    AvroMetaDataKeys
+from data_pipeline_avro_util.data_pipeline.temporal_converter import \
+    get_temporal_converters
+from data_pipeline_avro_util.data_pipeline.temporal_converter import \
+    get_temporal_key
+from data_pipeline_avro_util.util import compile_utf8_length_check
+from data_pipeline_avro_util.util import get_avro_schema_object
+from data_pipeline_avro_util.util import get_nullable_value_schema
+
+
+class RedshiftExporter(object):
+    def __init__(self, schema, output_dir, file_prefix='part', csv=True,
+                 delimiter=None, null_string='\\N', compress=False,
+                 compresslevel=6, max_file_size=256 * 1024 * 1024,
+                 buffer_size=4 * 1024 * 1024):
+        """ Utility class for exporting records of a record schema into
+        delimited text files ready to be loaded with the Redshift `COPY`
+        command.  Each record becomes a row with the record fields in schema
+        order, formatted according to their `AvroMetaDataKeys` metadata:
+
+            - `FIXED_POINT` numbers are rounded half away from zero to
+              exactly `SCALE` decimal places, as Redshift rounds them.
+            - `DATE`, `DATETIME`, `TIME` and `TIMESTAMP` strings are written
+              like other strings, and `TIMESTAMP` numbers as UTC
+              `YYYY-MM-DD HH:MM:SS[.ffffff]` timestamps with `FSP`
+              fractional digits.  Python date and time values are formatted
+              the same way.
+            - `BIT_LEN` fields of a single bit and booleans are written as
+              `t` or `f`, other ints as decimal numbers.
+            - Strings are truncated to `MAX_LEN` or `FIX_LEN` UTF-8 bytes,
+              without splitting characters, and bytes are truncated to that
+              many bytes and written as hex digits.
+            - Arrays, maps and records are written as json.
+
+        Rows are formatted into buffers of about `buffer_size` bytes, which
+        are written to files of about `max_file_size` bytes, so that large
+        exports are split into files `COPY` can load in parallel.  Files are
+        named `<file_prefix>.<index>.csv` or `<file_prefix>.<index>.txt`,
+        followed by `.gz` when compressed, and the index keeps increasing
+        across the exports of an exporter.
+
+        Args:
+            schema (string|dict|:class:`avro.schema.Schema`): The avro record
+                schema of the records.
+            output_dir (string): Directory the files are written to.
+            file_prefix (string): Prefix of the file names.
+            csv (bool): Whether the files are in the CSV format, in which all
+                strings are quoted, or in the delimited text format, in which
+                backslashes, delimiters and line breaks are escaped with a
+                backslash; the latter is loaded with the `ESCAPE` option.
+            delimiter (string): The field delimiter; defaults to `,` for CSV
+                and to a tab for delimited text.
+            null_string (string): The string null values are written as,
+                which is the `NULL AS` option of `COPY`.
+            compress (bool): Whether the files are gzip compressed.
+            compresslevel (int): The gzip compression level, from 1 to 9.
+            max_file_size (int): Size in bytes of the uncompressed rows after
+                which a new file is started.
+            buffer_size (int): Size in bytes of the uncompressed rows buffered
+                before they are written.
+
+        Raises:
+            ValueError: This exception is thrown if the schema is not a record
+                schema.
+        """
+        self.schema = get_avro_schema_object(schema)
+        if self.schema.type != 'record':
+            raise ValueError("Exports require a record schema.")
+        self.output_dir = output_dir
+        self.file_prefix = file_prefix
+        self.csv = csv
+        if delimiter is None:
+            delimiter = ',' if csv else '\t'
+        self.delimiter = delimiter
+        self.null_string = null_string
+        self.compress = compress
+        self.compresslevel = compresslevel
+        self.max_file_size = max_file_size
+        self.buffer_size = buffer_size
+        self._file_index = 0
+
+        escape = _compile_csv_escape() if csv else _compile_text_escape(
+            delimiter
+        )
+        fields = self.schema.fields
+        self._get_values = _compile_values_getter(
+            [field.name for field in fields]
+        )
+        self._formatters = [
+            _compile_field_formatter(field, escape, null_string)
+            for field in fields
+        ]
+
+    def format_row(self, record):
+        """ Formats a record into a row, without its line break.
+
+        Returns (unicode):
+            The formatted row.
+
+        Raises:
+            ValueError: This exception is thrown if a field that is not
+                nullable has a null value.
+        """
+        return self.delimiter.join([
+            format_value(value) for format_value, value in zip(
+                self._formatters,
+                self._get_values(record)
+            )
+        ])
+
+    def export_records(self, records):
+        """ Exports the given records.
+
+        Args:
+            records (iterable of dict): The records to export.
+
+        Returns (list of string):
+            The paths of the files written, in order.
+        """
+        paths = []
+        output = None
+        try:
+            for chunk in self._format_chunks(records):
+                if output is None or output.tell() >= self.max_file_size:
+                    if output is not None:
+                        output.close()
+                    path = self._next_path()
+                    output = self._open(path)
+                    paths.append(path)
+                output.write(chunk)
+        finally:
+            if output is not None:
+                output.close()
+        return paths
+
+    def export_messages(self, encoded_messages):
+        """ Exports messages encoded with `self.schema`, which are decoded
+        without schema resolution.
+
+        Args:
+            encoded_messages (iterable of string): The encoded messages.
+
+        Returns (list of string):
+            The paths of the files written, in order.
+        """
+        read = compile_decoder(self.schema)
+        return self.export_records(
+            read(message, 0)[0] for message in encoded_messages
+        )
+
+    def export_container_file(self, file_obj):
+        """ Exports the records of an Avro object container file, whose
+        schema must have the fields of `self.schema`.  The data blocks are
+        decoded without schema resolution.
+
+        Args:
+            file_obj (file): The container file, open for reading.
+
+        Returns (list of string):
+            The paths of the files written, in order.
+
+        Raises:
+            ValueError: This exception is thrown if the file is corrupted,
+                or a field that is not nullable has a null value.
+        """
+        return self.export_records(read_container_file_records(file_obj))
+
+    def _format_chunks(self, records):
+        """ Formats the records into chunks of about `self.buffer_size`
+        UTF-8 encoded bytes made of whole rows.
+        """
+        delimiter = self.delimiter
+        get_values = self._get_values
+        formatters = self._formatters
+        buffer_size = self.buffer_size
+        rows = []
+        size = 0
+        for record in records:
+            row = delimiter.join([
+                format_value(value) for format_value, value in zip(
+                    formatters,
+                    get_values(record)
+                )
+            ])
+            rows.append(row)
+            size += len(row) + 1
+            if size >= buffer_size:
+                rows.append('')
+                yield '\n'.join(rows).encode('utf-8')
+                rows = []
+                size = 0
+        if rows:
+            rows.append('')
+            yield '\n'.join(rows).encode('utf-8')
+
+    def _next_path(self):
+        extension = 'csv' if self.csv else 'txt'
+        if self.compress:
+            extension += '.gz'
+        path = os.path.join(self.output_dir, '{0}.{1:05d}.{2}'.format(
+            self.file_prefix,
+            self._file_index,
+            extension
+        ))
+        self._file_index += 1
+        return path
+
+    def _open(self, path):
+        if self.compress:
+            return _UncompressedSizeGzipFile(path, self.compresslevel)
+        return open(path, 'wb')
+
+
+class _UncompressedSizeGzipFile(object):
+    """ A gzip file whose `tell` is the number of uncompressed bytes written
+    to it.
+    """
+
+    def __init__(self, path, compresslevel):
+        self._file = gzip.GzipFile(path, 'wb', compresslevel)
+        self._size = 0
+
+    def write(self, data):
+        self._file.write(data)
+        self._size += len(data)
+
+    def tell(self):
+        return self._size
+
+    def close(self):
+        self._file.close()
+
+
+# DataFileReader attributes the compiled decoding of data blocks relies on
+_FAST_PATH_ATTRIBUTES = (
+    'codec',
+    'datum_reader',
+    'is_EOF',
+    'raw_decoder',
+    'sync_marker',
+)
+
+
+def read_container_file_records(file_obj):
+    """ Reads the records of an Avro object container file, decoding its
+    data blocks with the compiled decoder of its schema rather than with
+    :class:`avro.io.DatumReader`.
+
+    The data blocks are read through attributes of
+    :class:`avro.datafile.DataFileReader` that are not part of its
+    documented interface. If the installed avro library does not provide
+    them, or the file uses a codec other than `null` or `deflate`, the
+    records are read by iterating the `DataFileReader` instead.
+
+    Args:
+        file_obj (file): The container file, open for reading.
+
+    Returns (generator of dict):
+        The records of the file, in order.
+
+    Raises:
+        ValueError: This exception is thrown if the file is corrupted.
+    """
+    import avro.datafile
+    import avro.io
+    reader = avro.datafile.DataFileReader(file_obj, avro.io.DatumReader())
+    if not all(hasattr(reader, name) for name in _FAST_PATH_ATTRIBUTES) or (
+            reader.codec not in ('null', 'deflate')):
+        for record in reader:
+            yield record
+        return
+    read = compile_decoder(reader.datum_reader.writers_schema)
+    decoder = reader.raw_decoder
+    while not reader.is_EOF():
+        count = decoder.read_long()
+        data = decoder.read_bytes()
+        if reader.codec == 'deflate':
+            # -15 is the window size of raw deflate data without headers
+            data = zlib.decompress(data, -15)
+        if file_obj.read(len(reader.sync_marker)) != reader.sync_marker:
+            raise ValueError("Container file is missing a sync marker.")
+        pos = 0
+        for _ in xrange(count):
+            record, pos = read(data, pos)
+            yield record
+
+
+def _compile_values_getter(names):
+    if len(names) == 1:
+        name = names[0]
+        return lambda record: (record[name],)
+    return operator.itemgetter(*names)
+
+
+def _compile_field_formatter(field, escape, null_string):
+    if field.type.type == 'null':
+        return lambda value: null_string
+    format_value = _compile_value_formatter(field, escape)
+    if field.type.type != 'union':
+        name = field.name
+
+        def format_required_value(value):
+            if value is None:
+                raise ValueError(
+                    "Field {0} is not nullable but its value is null.".format(
+                        name
+                    )
+                )
+            return format_value(value)
+        return format_required_value
+
+    def format_nullable_value(value):
+        if value is None:
+            return null_string
+        return format_value(value)
+    return format_nullable_value
+
+
+def _compile_value_formatter(field, escape):
+    _, schema = get_nullable_value_schema(field.type)
+    schema_type = schema.type
+    temporal_key = get_temporal_key(field)
+    if temporal_key is not None:
+        return _compile_temporal_formatter(
+            temporal_key,
+            field.get_prop(AvroMetaDataKeys.FSP) or 0,
+            escape
+        )
+    if field.get_prop(AvroMetaDataKeys.FIXED_POINT):
+        return _compile_fixed_point_formatter(
+            field.get_prop(AvroMetaDataKeys.SCALE) or 0
+        )
+    if field.get_prop(AvroMetaDataKeys.BIT_LEN) == 1 or (
+            schema_type == 'boolean'):
+        return _format_boolean
+    if schema_type in ('int', 'long'):
+        return '%d'.__mod__
+    if schema_type in ('float', 'double'):
+        return _format_float
+    lengths = [
+        length for length in (
+            field.get_prop(AvroMetaDataKeys.MAX_LEN),
+            field.get_prop(AvroMetaDataKeys.FIX_LEN)
+        )
+        if length is not None
+    ]
+    max_len = min(lengths) if lengths else None
+    if schema_type in ('bytes', 'fixed'):
+        return _compile_bytes_formatter(max_len)
+    if schema_type == 'string':
+        return _compile_string_formatter(max_len, escape)
+    if schema_type == 'enum':
+        return escape
+    return lambda value: escape(json.dumps(value, ensure_ascii=False))
+
+
+def _compile_temporal_formatter(key, fsp, escape):
+    if key != AvroMetaDataKeys.TIMESTAMP:
+        _, format_temporal = get_temporal_converters(key, fsp)
+        return lambda value: (
+            escape(value) if isinstance(value, basestring)
+            else format_temporal(value)
+        )
+
+    parse_timestamp, _ = get_temporal_converters(key, fsp)
+    _, format_datetime = get_temporal_converters(
+        AvroMetaDataKeys.DATETIME,
+        fsp
+    )
+
+    def format_timestamp(value):
+        if isinstance(value, basestring):
+            return escape(value)
+        if isinstance(value, (int, long)):
+            value = parse_timestamp(value)
+        return format_datetime(value)
+    return format_timestamp
+
+
+# wide enough for the 38 digits of the widest Redshift DECIMAL
+_FIXED_POINT_CONTEXT = Context(prec=100)
+
+
+def _compile_fixed_point_formatter(scale):
+    exponent = Decimal(1).scaleb(-scale)
+
+    def format_fixed_point(value):
+        # rounded half away from zero, as ConstraintChecker models Redshift
+        if isinstance(value, float):
+            value = Decimal(repr(value))
+        elif not isinstance(value, Decimal):
+            value = Decimal(value)
+        if not value.is_finite():
+            return str(value)
+        return format(
+            value.quantize(exponent, ROUND_HALF_UP, _FIXED_POINT_CONTEXT),
+            'f'
+        )
+    return format_fixed_point
+
+
+def _format_boolean(value):
+    return 't' if value else 'f'
+
+
+def _format_float(value):
+    if value - value == 0:
+        return repr(value)
+    if value != value:
+        return 'NaN'
+    return 'Infinity' if value > 0 else '-Infinity'
+
+
+def _compile_bytes_formatter(max_len):
+    if max_len is None:
+        return lambda value: value.encode('hex')
+    return lambda value: value[:max_len].encode('hex')
+
+
+def _compile_string_formatter(max_len, escape):
+    if max_len is None:
+        return escape
+    is_too_long = compile_utf8_length_check(max_len)
+
+    def format_string(value):
+        if is_too_long(value):
+            # characters split by the truncation are dropped
+            value = value.encode('utf-8')[:max_len].decode('utf-8', 'ignore')
+        return escape(value)
+    return format_string
+
+
+def _compile_csv_escape():
+    def escape_csv(value):
+        return '"' + value.replace('"', '""') + '"'
+    return escape_csv
+
+
+def _compile_text_escape(delimiter):
+    escaped_delimiter = '\\' + delimiter
+
+    def escape_text(value):
+        return value.replace(
+            '\\', '\\\\'
+        ).replace(
+            delimiter, escaped_delimiter
+        ).replace(
+            '\n', '\\\n'
+        ).replace(
+            '\r', '\\\r'
+        )
+    return escape_text
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from collections import namedtuple
+
+from data_pipeline_avro_util.data_pipeline.avro_meta_data import \
+    AvroMetaDataKeys
+
+
+class ColumnDescriptor(namedtuple('ColumnDescriptor', [
+    'name',
+    'sql_type',
+    'is_nullable',
+    'length',
+    'precision',
+    'scale',
+    'is_unsigned',
+    'symbols',
+    'primary_key_position',
+    'sort_key_position',
+    'is_dist_key',
+    'doc',
+])):
+    """Describes a table column for :func:`build_table_schema`.
+
+    Args:
+        name (str): Column name, which becomes the field name.
+        sql_type (str): SQL type name without its parameters, such as
+            `varchar` or `decimal`; case insensitive.
+        is_nullable (bool): Whether the column is nullable.
+        length (int): Length of char, binary and bit types.
+        precision (int): Precision of numeric types, or the fractional
+            seconds precision of temporal types.
+        scale (int): Scale of numeric types.
+        is_unsigned (bool): Whether the integer type is unsigned.
+        symbols (list of str): Values of an enum type.
+        primary_key_position (int): 1-based position of the column in the
+            primary key, if it is part of it.
+        sort_key_position (int): 1-based position of the column in the sort
+            key, if it is part of it.
+        is_dist_key (bool): Whether the column is the distribution key.
+        doc (str): Column documentation.
+    """
+
+    def __new__(cls, name, sql_type, is_nullable=True, length=None,
+                precision=None, scale=None, is_unsigned=False, symbols=None,
+                primary_key_position=None, sort_key_position=None,
+                is_dist_key=False, doc=None):
+        return super(ColumnDescriptor, cls).__new__(
+            cls,
+            name,
+            sql_type,
+            is_nullable,
+            length,
+            precision,
+            scale,
+            is_unsigned,
+            symbols,
+            primary_key_position,
+            sort_key_position,
+            is_dist_key,
+            doc
+        )
+
+
+class TableDescriptor(namedtuple('TableDescriptor', [
+    'name',
+    'columns',
+    'namespace',
+    'doc',
+])):
+    """Describes a table for :func:`build_table_schema`.
+
+    Args:
+        name (str): Table name, which becomes the record name.
+        columns (list of :class:`ColumnDescriptor`): Table columns in order.
+        namespace (str): Namespace of the record.
+        doc (str): Table documentation.
+    """
+
+    def __new__(cls, name, columns, namespace=None, doc=None):
+        return super(TableDescriptor, cls).__new__(
+            cls,
+            name,
+            columns,
+            namespace,
+            doc
+        )
+
+
+def build_table_schema(table):
+    """ Builds the Avro record schema of the given table.  Each column becomes
+    a field with the `AvroMetaDataKeys` metadata of its SQL type and keys.
+    Nullable columns become unions with `null` and a null default value.
+    Enum columns with the same symbols share a single enum type.
+
+    The schema json is built directly rather than through
+    :class:`AvroSchemaBuilder`, and is the same as the json the builder
+    would return.  It is not parsed, so the names of the table and its
+    columns are not validated.
+
+    Args:
+        table (:class:`TableDescriptor`): The table to build the schema of.
+
+    Returns (dict):
+        The Avro json schema of the table.
+
+    Raises:
+        ValueError: This exception is thrown if a column has an unsupported
+            SQL type or two columns have the same name.
+    """
+    return _build_table_schema(table, {})
+
+
+def build_table_schemas(tables, pool=None, chunksize=16):
+    """ Builds the Avro record schemas of many tables, optionally in parallel.
+    The enum types defined by several tables with the same name, namespace
+    and symbols are built once and shared between their schemas, so they
+    should not be modified in place.
+
+    Args:
+        tables (list of :class:`TableDescriptor`): The tables to build the
+            schemas of.
+        pool (:class:`multiprocessing.pool.Pool`): The process or thread pool
+            the schemas are built in; they are built in the current thread
+            if it is not given.  Process pools scale with the number of
+            processes, while thread pools only help when the caller is not
+            CPU bound, since building schemas holds the GIL.  Enum types are
+            only shared within the chunks of tables sent to the workers.
+        chunksize (int): Number of tables sent to a pool worker at a time.
+
+    Returns (list of dict):
+        The Avro json schemas, in the order of the given tables.
+
+    Raises:
+        ValueError: This exception is thrown if a column has an unsupported
+            SQL type or two columns of a table have the same name.
+    """
+    if pool is None:
+        return _build_table_schema_chunk(tables)
+    chunks = [
+        tables[i:i + chunksize] for i in xrange(0, len(tables), chunksize)
+    ]
+    return [
+        table_schema
+        for table_schemas in pool.map(_build_table_schema_chunk, chunks)
+        for table_schema in table_schemas
+    ]
+
+
+def _build_table_schema_chunk(tables):
+    named_types = {}
+    return [_build_table_schema(table, named_types) for table in tables]
+
+
+def _build_table_schema(table, named_types):
+    """ Builds the schema json of a table.  `named_types` maps the key of
+    each named type built so far, possibly for other tables, to its json.
+    """
+    record_schema = {'type': 'record', 'name': table.name}
+    if table.namespace is not None:
+        record_schema['namespace'] = table.namespace
+    if table.doc:
+        record_schema['doc'] = table.doc
+    fields = []
+    field_names = set()
+    # key of a named type defined by the table -> type name to refer to it
+    defined_types = {}
+    for column in table.columns:
+        if column.name in field_names:
+            raise ValueError("Duplicate column {0} in table {1}".format(
+                column.name,
+                table.name
+            ))
+        field_names.add(column.name)
+        typ, metadata = _get_type_and_metadata(
+            column,
+            table.namespace,
+            named_types,
+            defined_types
+        )
+        field = {'name': column.name}
+        if column.is_nullable:
+            field['type'] = ['null', typ]
+            field['default'] = None
+        else:
+            field['type'] = typ
+        if column.doc:
+            field['doc'] = column.doc
+        field.update(metadata)
+        if column.primary_key_position is not None:
+            field[AvroMetaDataKeys.PRIMARY_KEY] = column.primary_key_position
+        if column.sort_key_position is not None:
+            field[AvroMetaDataKeys.SORT_KEY] = column.sort_key_position
+        if column.is_dist_key:
+            field[AvroMetaDataKeys.DIST_KEY] = True
+        fields.append(field)
+    record_schema['fields'] = fields
+    return record_schema
+
+
+_INT_TYPES = {'tinyint', 'smallint', 'mediumint', 'int', 'integer'}
+_FLOAT_TYPES = {'float', 'float4', 'real'}
+_DOUBLE_TYPES = {'double', 'double precision', 'float8'}
+_DECIMAL_TYPES = {'decimal', 'numeric', 'dec', 'fixed'}
+_STRING_TYPES = {'text', 'tinytext', 'mediumtext', 'longtext'}
+_BYTES_TYPES = {'blob', 'tinyblob', 'mediumblob', 'longblob'}
+_LENGTH_KEYS = {
+    'char': AvroMetaDataKeys.FIX_LEN,
+    'binary': AvroMetaDataKeys.FIX_LEN,
+    'varchar': AvroMetaDataKeys.MAX_LEN,
+    'varbinary': AvroMetaDataKeys.MAX_LEN,
+}
+_TEMPORAL_TYPES = {
+    'date': ('string', AvroMetaDataKeys.DATE),
+    'datetime': ('string', AvroMetaDataKeys.DATETIME),
+    'time': ('string', AvroMetaDataKeys.TIME),
+    'timestamp': ('long', AvroMetaDataKeys.TIMESTAMP),
+    'year': ('int', AvroMetaDataKeys.YEAR),
+}
+
+
+def _get_type_and_metadata(column, namespace, named_types, defined_types):
+    sql_type = column.sql_type.lower()
+    metadata = {}
+    if sql_type in _INT_TYPES or sql_type == 'bigint':
+        typ = 'long' if sql_type == 'bigint' else 'int'
+        if column.is_unsigned:
+            metadata[AvroMetaDataKeys.UNSIGNED] = True
+            if sql_type in ('int', 'integer'):
+                # unsigned int does not fit in an Avro int
+                typ = 'long'
+        return typ, metadata
+    if sql_type in ('bool', 'boolean'):
+        return 'boolean', metadata
+    if sql_type == 'bit':
+        bit_len = column.length or 1
+        metadata[AvroMetaDataKeys.BIT_LEN] = bit_len
+        return 'int' if bit_len <= 32 else 'long', metadata
+    if sql_type in _FLOAT_TYPES:
+        return 'float', metadata
+    if sql_type in _DOUBLE_TYPES:
+        return 'double', metadata
+    if sql_type in _DECIMAL_TYPES:
+        metadata[AvroMetaDataKeys.FIXED_POINT] = True
+        metadata[AvroMetaDataKeys.PRECISION] = column.precision
+        metadata[AvroMetaDataKeys.SCALE] = column.scale or 0
+        return 'double', metadata
+    if sql_type in _LENGTH_KEYS:
+        metadata[_LENGTH_KEYS[sql_type]] = column.length
+        if sql_type.endswith('char'):
+            return 'string', metadata
+        return 'bytes', metadata
+    if sql_type in _STRING_TYPES:
+        return 'string', metadata
+    if sql_type in _BYTES_TYPES:
+        return 'bytes', metadata
+    if sql_type in _TEMPORAL_TYPES:
+        typ, key = _TEMPORAL_TYPES[sql_type]
+        metadata[key] = True
+        if column.precision and sql_type != 'year':
+            metadata[AvroMetaDataKeys.FSP] = column.precision
+        return typ, metadata
+    if sql_type == 'enum':
+        # the first column defines the enum type, the others refer to it
+        symbols = tuple(column.symbols)
+        if symbols in defined_types:
+            return defined_types[symbols], metadata
+        enum_name = '{0}_enum'.format(column.name)
+        key = (namespace, enum_name, symbols)
+        enum_schema = named_types.get(key)
+        if enum_schema is None:
+            enum_schema = {
+                'type': 'enum',
+                'name': enum_name,
+                'symbols': list(symbols)
+            }
+            if namespace:
+                enum_schema['namespace'] = namespace
+            named_types[key] = enum_schema
+        defined_types[symbols] = (
+            '{0}.{1}'.format(namespace, enum_name) if namespace else enum_name
+        )
+        return enum_schema, metadata
+    raise ValueError("Unsupported SQL type {0} of column {1}".format(
+        column.sql_type,
+        column.name
+    ))
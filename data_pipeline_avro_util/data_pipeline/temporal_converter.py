@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import datetime
+import re
+
+from data_pipeline_avro_util.avro_binary_util import EPOCH_DATETIME
+from data_pipeline_avro_util.avro_binary_util import get_epoch_microseconds
+from data_pipeline_avro_util.data_pipeline.avro_meta_data import \
+    AvroMetaDataKeys
+from data_pipeline_avro_util.util import get_avro_schema_object
+
+
+class TemporalConverter(object):
+    def __init__(self, schema):
+        """ Utility class for converting the temporal fields of records of a
+        record schema between their encoded values and Python values.  The
+        temporal fields are the fields with one of these metadata:
+
+            - `AvroMetaDataKeys.DATE`: `YYYY-MM-DD` strings, converted to
+              `datetime.date`.
+            - `AvroMetaDataKeys.DATETIME`: `YYYY-MM-DD HH:MM:SS[.ffffff]`
+              strings, converted to naive `datetime.datetime`.
+            - `AvroMetaDataKeys.TIME`: `[-]HH:MM:SS[.ffffff]` strings, which
+              may have more than 24 hours, converted to `datetime.timedelta`.
+            - `AvroMetaDataKeys.TIMESTAMP`: numbers of seconds since the
+              epoch, multiplied by 10 ** fsp, converted to UTC
+              `datetime.datetime`.
+
+        The `AvroMetaDataKeys.FSP` metadata gives the number of fractional
+        second digits of the field values, and defaults to 0.
+        `AvroMetaDataKeys.YEAR` fields already hold the year as an int and are
+        left unchanged.
+
+        Strings are parsed and formatted by slicing their fixed layout rather
+        than with `strptime` and `strftime`, and the conversion functions of
+        the fields are built once for the schema.  Null values of nullable
+        fields are left unchanged.
+
+        Args:
+            schema (string|dict|:class:`avro.schema.Schema`): The avro record
+                schema of the records.
+
+        Raises:
+            ValueError: This exception is thrown if the schema is not a record
+                schema.
+        """
+        self.schema = get_avro_schema_object(schema)
+        if self.schema.type != 'record':
+            raise ValueError("Temporal conversion requires a record schema.")
+        self.temporal_fields = get_temporal_fields(self.schema)
+        self._parsers = []
+        self._formatters = []
+        for field in self.temporal_fields:
+            key = get_temporal_key(field)
+            fsp = field.get_prop(AvroMetaDataKeys.FSP) or 0
+            parse, format_value = get_temporal_converters(key, fsp)
+            self._parsers.append((field.name, parse))
+            self._formatters.append((field.name, format_value))
+
+    @property
+    def temporal_field_names(self):
+        return [field.name for field in self.temporal_fields]
+
+    def parse(self, record):
+        """ Converts the encoded temporal values of a record into Python
+        values, in place.
+
+        Returns (dict):
+            The given record.
+
+        Raises:
+            ValueError: This exception is thrown if a value doesn't have the
+                expected layout or is not a valid date or time.
+        """
+        return _convert_record(self._parsers, record)
+
+    def parse_many(self, records):
+        """ Converts the encoded temporal values of a list of records into
+        Python values, in place, one field at a time.
+
+        Returns (list of dict):
+            The given records.
+        """
+        return _convert_records(self._parsers, records)
+
+    def format(self, record):
+        """ Converts the Python temporal values of a record into their
+        encoded values, in place.  Fractional seconds beyond the fsp of a
+        field are truncated, and the time zones of `DATETIME` values are
+        ignored.
+
+        Returns (dict):
+            The given record.
+        """
+        return _convert_record(self._formatters, record)
+
+    def format_many(self, records):
+        """ Converts the Python temporal values of a list of records into
+        their encoded values, in place, one field at a time.
+
+        Returns (list of dict):
+            The given records.
+        """
+        return _convert_records(self._formatters, records)
+
+
+def get_temporal_fields(schema):
+    """ Returns the fields of the given record schema with the
+    `AvroMetaDataKeys.DATE`, `DATETIME`, `TIME` or `TIMESTAMP` metadata.
+
+    Args:
+        schema (:class:`avro.schema.RecordSchema`): An avro record schema.
+
+    Returns (list of :class:`avro.schema.Field`):
+        The temporal fields, in schema order.
+    """
+    return [
+        field for field in schema.fields
+        if get_temporal_key(field) is not None
+    ]
+
+
+def get_temporal_key(field):
+    """ Returns the `AvroMetaDataKeys` temporal metadata key of the given
+    field, or None if it isn't a temporal field.
+    """
+    for key in _temporal_keys:
+        if field.get_prop(key):
+            return key
+    return None
+
+
+def get_temporal_converters(key, fsp=0):
+    """ Builds the functions converting values with the given temporal
+    metadata key and fractional seconds precision, as described in
+    :class:`TemporalConverter`.
+
+    Returns (tuple):
+        The `parse(value)` and `format(value)` functions; neither accepts
+        None.
+    """
+    return _temporal_converters[key](fsp)
+
+
+def _convert_record(converters, record):
+    for name, convert in converters:
+        value = record[name]
+        if value is not None:
+            record[name] = convert(value)
+    return record
+
+
+def _convert_records(converters, records):
+    for name, convert in converters:
+        for record in records:
+            value = record[name]
+            if value is not None:
+                record[name] = convert(value)
+    return records
+
+
+# \d only matches ASCII digits without the re.UNICODE flag
+_DATE_PATTERN = re.compile(r'\d{4}-\d\d-\d\d\Z')
+_DATETIME_PATTERN = re.compile(
+    r'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d(?:\.\d{1,6})?\Z'
+)
+_TIME_PATTERN = re.compile(r'(-?)(\d+):(\d\d):(\d\d)(?:\.(\d{1,6}))?\Z')
+
+
+def _parse_date(value, _date=datetime.date, _match=_DATE_PATTERN.match):
+    if _match(value) is None:
+        raise ValueError("{0} is not a YYYY-MM-DD date".format(value))
+    return _date(int(value[0:4]), int(value[5:7]), int(value[8:10]))
+
+
+# the date method also formats the date part of datetimes
+_format_date = datetime.date.isoformat
+
+
+def _parse_fraction(fraction):
+    """ Parses the at most 6 digits following the decimal point of seconds
+    into microseconds.
+    """
+    if not fraction:
+        return 0
+    return int(fraction) * _fraction_scales[len(fraction)]
+
+
+_fraction_scales = [10 ** (6 - digits) for digits in range(7)]
+
+
+def _get_fraction_formatter(fsp):
+    """ Returns a function formatting microseconds into the decimal point and
+    the `fsp` first fractional second digits, or into an empty string if
+    `fsp` is 0.
+    """
+    if not fsp:
+        return lambda microsecond: ''
+    end = fsp + 1
+    return lambda microsecond: ('.%06d' % microsecond)[:end]
+
+
+def _compile_date_converters(fsp):
+    return _parse_date, _format_date
+
+
+def _compile_datetime_converters(fsp):
+    format_fraction = _get_fraction_formatter(fsp)
+
+    def parse_datetime(
+        value,
+        _datetime=datetime.datetime,
+        _match=_DATETIME_PATTERN.match
+    ):
+        if _match(value) is None:
+            raise ValueError(
+                "{0} is not a YYYY-MM-DD HH:MM:SS datetime".format(value)
+            )
+        return _datetime(
+            int(value[0:4]),
+            int(value[5:7]),
+            int(value[8:10]),
+            int(value[11:13]),
+            int(value[14:16]),
+            int(value[17:19]),
+            _parse_fraction(value[20:])
+        )
+
+    end = 20 + fsp if fsp else 19
+    zero_fraction = format_fraction(0)
+
+    def format_datetime(value):
+        # isoformat leaves out zero microseconds, and any time zone offset
+        # follows the microseconds
+        formatted = value.isoformat(str(' '))
+        if value.microsecond:
+            return formatted[:end]
+        return formatted[:19] + zero_fraction
+    return parse_datetime, format_datetime
+
+
+def _compile_time_converters(fsp):
+    format_fraction = _get_fraction_formatter(fsp)
+
+    def parse_time(
+        value,
+        _timedelta=datetime.timedelta,
+        _match=_TIME_PATTERN.match
+    ):
+        match = _match(value)
+        if match is None:
+            raise ValueError("{0} is not a HH:MM:SS time".format(value))
+        negative, hours, minutes, seconds, fraction = match.groups()
+        delta = _timedelta(
+            0,
+            int(seconds),
+            _parse_fraction(fraction),
+            0,
+            int(minutes),
+            int(hours)
+        )
+        return -delta if negative else delta
+
+    def format_time(value):
+        sign = ''
+        if value.days < 0:
+            sign = '-'
+            value = -value
+        minutes, second = divmod(value.days * 86400 + value.seconds, 60)
+        hour, minute = divmod(minutes, 60)
+        return '%s%02d:%02d:%02d%s' % (
+            sign,
+            hour,
+            minute,
+            second,
+            format_fraction(value.microseconds)
+        )
+    return parse_time, format_time
+
+
+def _compile_timestamp_converters(fsp):
+    if fsp > 6:
+        raise ValueError("fsp {0} is more than 6 digits".format(fsp))
+    microseconds_per_unit = 10 ** (6 - fsp)
+
+    def parse_timestamp(value, _timedelta=datetime.timedelta):
+        return EPOCH_DATETIME + _timedelta(
+            0,
+            0,
+            value * microseconds_per_unit
+        )
+
+    def format_timestamp(value):
+        # naive datetimes are taken as UTC
+        return get_epoch_microseconds(value) // microseconds_per_unit
+    return parse_timestamp, format_timestamp
+
+
+_temporal_converters = {
+    AvroMetaDataKeys.DATE: _compile_date_converters,
+    AvroMetaDataKeys.DATETIME: _compile_datetime_converters,
+    AvroMetaDataKeys.TIME: _compile_time_converters,
+    AvroMetaDataKeys.TIMESTAMP: _compile_timestamp_converters,
+}
+
+_temporal_keys = sorted(_temporal_converters)
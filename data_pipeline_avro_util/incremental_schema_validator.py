@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+import threading
+from collections import namedtuple
+from collections import OrderedDict
+
+from avro import schema
+
+
+_INT_RANGE = (-(1 << 31), (1 << 31) - 1)
+_LONG_RANGE = (-(1 << 63), (1 << 63) - 1)
+
+
+class _LRUCache(object):
+    """A dict holding at most `max_size` entries, which evicts the least
+    recently used entry when full.  It is safe to use from several threads.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self._entries[key] = value
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class IncrementalSchemaValidator(object):
+    """Validates an Avro schema piece by piece while it is being built by
+    :class:`data_pipeline_avro_util.avro_builder.AvroSchemaBuilder`, so that
+    an invalid step fails right away instead of when the whole schema is
+    parsed at the end.
+
+    It checks the named types begun by the builder and every field added to
+    a record: the uniqueness of the type names, the field schemas and their
+    named type references, and whether the field default values match the
+    field types.  Each step either succeeds or leaves the validator unchanged.
+
+    Named schemas defined inline in the field types are parsed independently
+    and memoized by their json, so building similar schemas repeatedly only
+    parses them once.  Only the named schemas which don't reference any other
+    named type are memoized, in a memo shared by all the validators of the
+    process which keeps the most recently used schemas and may be used from
+    several threads.
+
+    Notes:
+        The validator tracks the field dicts and the named schemas begun by
+        the builder by identity, so they are expected not to be modified
+        outside of the builder.  The full schema is still parsed by the
+        builder at the end, which remains the final check.
+    """
+
+    _memoized_schemas = _LRUCache(max_size=1000)
+
+    def __init__(self):
+        self.names = schema.Names()
+        # id(schema json) -> (schema json, schema object) of the named
+        # schemas begun by the builder, which may each be used as the type
+        # of one field.
+        self._begun_schemas = {}
+        # ids of the begun schemas which are used by a field
+        self._attached_schema_ids = set()
+        # id(field json) -> _FieldEntry of the validated fields
+        self._fields = {}
+
+    def begin_named_schema(self, schema_json, default_namespace):
+        """Validates a named schema begun by the builder and defines its name.
+        The fields a record already has are validated as added fields.
+
+        Args:
+            schema_json (dict): The named schema.
+            default_namespace (string): The namespace of the enclosing record.
+
+        Raises:
+            :class:`avro.schema.SchemaParseException`: if the schema is not
+                valid or its name is already defined.
+        """
+        names = _ChildNames(self.names, default_namespace)
+        if schema_json.get('type') not in ('record', 'error'):
+            schema_obj = schema.make_avsc_object(schema_json, names)
+            self.names.names.update(names.names)
+            self._begun_schemas[id(schema_json)] = (schema_json, schema_obj)
+            return
+
+        fields = schema_json.get('fields') or []
+        schema_obj = schema.make_avsc_object(
+            dict(schema_json, fields=[]),
+            names
+        )
+        self.names.names.update(names.names)
+        self._begun_schemas[id(schema_json)] = (schema_json, schema_obj)
+        try:
+            field_names = set()
+            for field in fields:
+                field_name = isinstance(field, dict) and field.get('name')
+                if field_name in field_names:
+                    raise schema.SchemaParseException(
+                        'Field name %s already in use.' % field_name
+                    )
+                field_names.add(field_name)
+            self.replace_fields(
+                [],
+                fields,
+                schema.Name(
+                    schema_obj.name,
+                    schema_json.get('namespace', default_namespace),
+                    default_namespace
+                ).get_space()
+            )
+        except Exception:
+            for fullname in names.names:
+                self.names.names.pop(fullname, None)
+            del self._begun_schemas[id(schema_json)]
+            raise
+        self.end_record(schema_json)
+
+    def get_begun_schemas(self):
+        """Returns (list of dict): The named schemas begun by the builder,
+        which are tracked by identity.
+        """
+        return [schema_json for schema_json, _ in self._begun_schemas.values()]
+
+    def end_record(self, record_json):
+        """Sets the validated fields of a record begun by the builder, so that
+        default values of its type can be validated.
+        """
+        begun_schema = self._begun_schemas.get(id(record_json))
+        if begun_schema is None:
+            return
+        begun_schema[1].set_prop('fields', [
+            self._fields[id(field)].field_obj
+            for field in record_json['fields'] if id(field) in self._fields
+        ])
+
+    def replace_fields(self, removed_fields, added_fields, default_namespace):
+        """Validates the fields added to a record and forgets the removed
+        ones, as a single step.
+
+        Args:
+            removed_fields (list of dict): Fields removed from the record,
+                whose inline named types are undefined.
+            added_fields (list of dict): Fields added to the record.
+            default_namespace (string): The namespace of the record.
+
+        Raises:
+            :class:`avro.schema.SchemaParseException`: if an added field is
+                not valid.
+        """
+        removed_entries = [
+            self._fields[id(field)]
+            for field in removed_fields if id(field) in self._fields
+        ]
+        for entry in removed_entries:
+            self._unregister(entry)
+        added_entries = []
+        try:
+            for field in added_fields:
+                entry = self._validate_field(field, default_namespace)
+                self._register(entry)
+                added_entries.append(entry)
+        except Exception:
+            for entry in added_entries:
+                self._unregister(entry)
+            for entry in removed_entries:
+                self._register(entry)
+            raise
+
+    def rekey_field(self, old_field, new_field):
+        """Tracks `new_field` in place of its copy source `old_field`."""
+        entry = self._fields.pop(id(old_field), None)
+        if entry is not None:
+            self._fields[id(new_field)] = entry._replace(field_json=new_field)
+
+    def _register(self, entry):
+        self.names.names.update(entry.defined_names)
+        self._attached_schema_ids.update(entry.attached_schema_ids)
+        self._fields[id(entry.field_json)] = entry
+
+    def _unregister(self, entry):
+        for fullname in entry.defined_names:
+            self.names.names.pop(fullname, None)
+        self._attached_schema_ids.difference_update(entry.attached_schema_ids)
+        del self._fields[id(entry.field_json)]
+
+    def _validate_field(self, field_json, default_namespace):
+        if not isinstance(field_json, dict):
+            raise schema.SchemaParseException(
+                'Not a valid field: %s' % field_json
+            )
+        names = _ChildNames(self.names, default_namespace)
+        attached_schema_ids = []
+        field_type = self._resolve_named_schemas(
+            field_json.get('type'),
+            names,
+            default_namespace,
+            attached_schema_ids
+        )
+        field_obj = schema.RecordSchema.make_field_objects(
+            [dict(field_json, type=field_type)],
+            names
+        )[0]
+        if (field_obj.has_default and
+                not is_valid_default_value(field_obj.type, field_obj.default)):
+            raise schema.SchemaParseException(
+                'Default value %r of field %s does not match its type.' % (
+                    field_obj.default,
+                    field_obj.name
+                )
+            )
+        return _FieldEntry(
+            field_json,
+            field_obj,
+            names.names,
+            attached_schema_ids
+        )
+
+    def _resolve_named_schemas(self, schema_json, names, default_namespace,
+                               attached_schema_ids):
+        """Defines the named schemas in the given schema json in `names` and
+        returns the json with the named schemas replaced by their full names,
+        so the rest of it can be parsed cheaply.
+        """
+        if isinstance(schema_json, list):
+            return [
+                self._resolve_named_schemas(
+                    item,
+                    names,
+                    default_namespace,
+                    attached_schema_ids
+                ) for item in schema_json
+            ]
+        if not isinstance(schema_json, dict):
+            return schema_json
+
+        begun_schema = self._begun_schemas.get(id(schema_json))
+        if begun_schema is not None:
+            fullname = begun_schema[1].fullname
+            if (id(schema_json) in self._attached_schema_ids or
+                    id(schema_json) in attached_schema_ids):
+                raise schema.SchemaParseException(
+                    'The name "%s" is already in use.' % fullname
+                )
+            attached_schema_ids.append(id(schema_json))
+            return fullname
+
+        schema_type = schema_json.get('type')
+        if schema_type in schema.NAMED_TYPES:
+            return self._define_named_schema(
+                schema_json,
+                names,
+                default_namespace
+            )
+        if schema_type == 'array' and 'items' in schema_json:
+            return dict(schema_json, items=self._resolve_named_schemas(
+                schema_json['items'],
+                names,
+                default_namespace,
+                attached_schema_ids
+            ))
+        if schema_type == 'map' and 'values' in schema_json:
+            return dict(schema_json, values=self._resolve_named_schemas(
+                schema_json['values'],
+                names,
+                default_namespace,
+                attached_schema_ids
+            ))
+        return schema_json
+
+    def _define_named_schema(self, schema_json, names, default_namespace):
+        key = (
+            default_namespace or '',
+            json.dumps(schema_json, sort_keys=True)
+        )
+        memoized = self._memoized_schemas.get(key)
+        if memoized is None:
+            schema_names = _ChildNames(names, default_namespace)
+            schema_obj = schema.make_avsc_object(schema_json, schema_names)
+            memoized = (schema_obj, schema_names.names)
+            if not schema_names.has_references:
+                self._memoized_schemas.put(key, memoized)
+        else:
+            for fullname in memoized[1]:
+                if names.lookup(fullname) is not None:
+                    raise schema.SchemaParseException(
+                        'The name "%s" is already in use.' % fullname
+                    )
+        schema_obj, defined_names = memoized
+        names.names.update(defined_names)
+        return schema_obj.fullname
+
+
+def is_valid_default_value(avro_schema, default_value):
+    """ Whether the given json default value is valid for the avro schema.
+    The default value of a union must match the first schema of the union.
+
+    Args:
+        avro_schema (:class:`avro.schema.Schema`): The schema of the value.
+        default_value (object): The default value as read from json.
+
+    Returns (bool):
+        True if the default value is valid, False otherwise.
+    """
+    schema_type = avro_schema.type
+    if schema_type == 'union':
+        return bool(avro_schema.schemas) and is_valid_default_value(
+            avro_schema.schemas[0],
+            default_value
+        )
+    if schema_type == 'null':
+        return default_value is None
+    if schema_type == 'boolean':
+        return isinstance(default_value, bool)
+    if isinstance(default_value, bool):
+        return False
+    if schema_type in ('int', 'long'):
+        low, high = _INT_RANGE if schema_type == 'int' else _LONG_RANGE
+        return (isinstance(default_value, (int, long)) and
+                low <= default_value <= high)
+    if schema_type in ('float', 'double'):
+        return isinstance(default_value, (int, long, float))
+    if schema_type in ('string', 'bytes'):
+        return isinstance(default_value, basestring)
+    if schema_type == 'fixed':
+        return (isinstance(default_value, basestring) and
+                len(default_value) == avro_schema.size)
+    if schema_type == 'enum':
+        return default_value in avro_schema.symbols
+    if schema_type == 'array':
+        return isinstance(default_value, list) and all(
+            is_valid_default_value(avro_schema.items, item)
+            for item in default_value
+        )
+    if schema_type == 'map':
+        return isinstance(default_value, dict) and all(
+            is_valid_default_value(avro_schema.values, value)
+            for value in default_value.values()
+        )
+    if schema_type in ('record', 'error'):
+        return isinstance(default_value, dict) and all(
+            is_valid_default_value(field.type, default_value[field.name])
+            if field.name in default_value else field.has_default
+            for field in avro_schema.fields
+        )
+    return False
+
+
+_FieldEntry = namedtuple(
+    '_FieldEntry',
+    ['field_json', 'field_obj', 'defined_names', 'attached_schema_ids']
+)
+
+
+class _ChildNames(schema.Names):
+    """Names which also resolve the names of a parent and only add the new
+    names to itself, so they can be discarded if the parsing fails.
+    """
+
+    def __init__(self, parent, default_namespace):
+        super(_ChildNames, self).__init__(default_namespace)
+        self.parent = parent
+        self.has_references = False
+
+    def lookup(self, fullname):
+        if fullname in self.names:
+            return self.names[fullname]
+        if isinstance(self.parent, _ChildNames):
+            return self.parent.lookup(fullname)
+        return self.parent.names.get(fullname)
+
+    def has_name(self, name_attr, space_attr):
+        return self.get_name(name_attr, space_attr) is not None
+
+    def get_name(self, name_attr, space_attr):
+        fullname = schema.Name(
+            name_attr,
+            space_attr,
+            self.default_namespace
+        ).fullname
+        if fullname in self.names:
+            return self.names[fullname]
+        named_schema = self.lookup(fullname)
+        if named_schema is not None:
+            self.has_references = True
+        return named_schema
+
+    def add_name(self, name_attr, space_attr, new_schema):
+        fullname = schema.Name(
+            name_attr,
+            space_attr,
+            self.default_namespace
+        ).fullname
+        if fullname not in self.names and self.lookup(fullname) is not None:
+            raise schema.SchemaParseException(
+                'The name "%s" is already in use.' % fullname
+            )
+        return super(_ChildNames, self).add_name(
+            name_attr,
+            space_attr,
+            new_schema
+        )
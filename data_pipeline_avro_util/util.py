@@ -16,7 +16,9 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
-import avro.io
+import hashlib
+import json
+
 import avro.schema
 
 
@@ -35,3 +37,64 @@ def get_avro_schema_object(schema):
         return avro.schema.parse(schema)
     else:
         return avro.schema.make_avsc_object(schema)
+
+
+def get_avro_schema_fingerprint(schema):
+    """ Computes a fingerprint which uniquely identifies the given avro schema,
+    which may be given in any of the forms accepted by
+    :func:`get_avro_schema_object`.  Two schemas have the same fingerprint
+    if and only if their json representations, including docs and metadata,
+    are identical.
+
+    Returns (string):
+        The hex digest of the schema fingerprint.
+    """
+    schema_json = get_avro_schema_object(schema).to_json()
+    return hashlib.md5(
+        json.dumps(schema_json, sort_keys=True, separators=(',', ':'))
+    ).hexdigest()
+
+
+def get_nullable_value_schema(schema):
+    """ Helper function to get the schema of the non-null values of a nullable
+    union, i.e. a union of `null` and one other schema.
+
+    Args:
+        schema (:class:`avro.schema.Schema`): An avro schema object.
+
+    Returns (tuple):
+        A tuple of whether the schema is a nullable union and the schema of
+        its non-null values, which is the given schema itself if it is not a
+        nullable union.
+    """
+    if schema.type == 'union':
+        branches = schema.schemas
+        if len(branches) == 2 and branches[0].type == 'null':
+            return True, branches[1]
+        if len(branches) == 2 and branches[1].type == 'null':
+            return True, branches[0]
+    return False, schema
+
+
+def compile_utf8_length_check(max_len):
+    """ Helper function to build a function telling whether a string is longer
+    than `max_len` bytes once UTF-8 encoded, as Redshift measures strings.
+    Byte strings are measured as they are.
+
+    Returns (function):
+        A `is_too_long(value)` function returning a bool.
+    """
+    # a UTF-8 encoded character takes at most 4 bytes, so shorter strings
+    # don't need to be encoded to be measured
+    max_short_len = max_len // 4
+
+    def is_too_long(value):
+        length = len(value)
+        if length <= max_short_len:
+            return False
+        if length > max_len:
+            return True
+        if isinstance(value, unicode):
+            return len(value.encode('utf-8')) > max_len
+        return False
+    return is_too_long
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import itertools
+
+import pytest
+from avro.schema import AvroException
+
+from data_pipeline_avro_util.avro_binary_comparator import \
+    AvroBinaryComparator
+from data_pipeline_avro_util.avro_string_writer import AvroStringWriter
+
+
+class TestAvroBinaryComparator(object):
+
+    @property
+    def schema_json(self):
+        return {
+            'type': 'record',
+            'name': 'event',
+            'fields': [
+                {
+                    'name': 'level',
+                    'type': {
+                        'type': 'enum',
+                        'name': 'level',
+                        'symbols': ['low', 'high']
+                    }
+                },
+                {'name': 'name', 'type': ['null', 'string']},
+                {'name': 'ts', 'type': 'long', 'order': 'descending'},
+                {
+                    'name': 'attrs',
+                    'type': {'type': 'map', 'values': 'int'},
+                    'order': 'ignore'
+                },
+                {'name': 'scores', 'type': {'type': 'array', 'items': 'int'}},
+                {'name': 'weight', 'type': 'double'},
+            ]
+        }
+
+    @property
+    def records(self):
+        return [
+            self._record('low', None, 10, [1], 0.5),
+            self._record('low', 'b', 10, [1], 0.5),
+            self._record('low', 'a❤', 10, [1], 0.5),
+            self._record('low', 'a', 20, [1], 0.5),
+            self._record('low', 'a', 10, [1, 2], 0.5),
+            self._record('low', 'a', 10, [1], 0.5),
+            self._record('low', 'a', 10, [1], -1.5),
+            self._record('low', 'a', 10, [], 0.5),
+            self._record('low', 'a', 10, [0, 5], 0.5),
+            self._record('high', None, 30, [], 0.5),
+            self._record('low', 'a', -5, [1], 0.5),
+        ]
+
+    def _record(self, level, name, ts, scores, weight):
+        return {
+            'level': level,
+            'name': name,
+            'ts': ts,
+            'attrs': {'k': ts},
+            'scores': scores,
+            'weight': weight
+        }
+
+    def _expected_key(self, record):
+        return (
+            ['low', 'high'].index(record['level']),
+            (0, None) if record['name'] is None else (
+                1, record['name'].encode('utf-8')
+            ),
+            -record['ts'],
+            record['scores'],
+            record['weight'],
+        )
+
+    @pytest.fixture
+    def comparator(self):
+        return AvroBinaryComparator(self.schema_json)
+
+    @pytest.fixture
+    def encoded_records(self):
+        writer = AvroStringWriter(self.schema_json)
+        return [writer.encode(record) for record in self.records]
+
+    def test_sort_key(self, comparator, encoded_records):
+        expected = [
+            encoded_records[i] for i in sorted(
+                range(len(self.records)),
+                key=lambda i: self._expected_key(self.records[i])
+            )
+        ]
+        actual = sorted(encoded_records, key=comparator.sort_key)
+        assert actual == expected
+
+    def test_compare(self, comparator, encoded_records):
+        pairs = itertools.product(
+            zip(encoded_records, self.records),
+            repeat=2
+        )
+        for (encoded_a, record_a), (encoded_b, record_b) in pairs:
+            expected = cmp(
+                self._expected_key(record_a),
+                self._expected_key(record_b)
+            )
+            actual = comparator.compare(encoded_a, encoded_b)
+            assert cmp(actual, 0) == expected
+            assert cmp(
+                comparator.sort_key(encoded_a),
+                comparator.sort_key(encoded_b)
+            ) == expected
+
+    def test_compare_map_fails(self):
+        schema_json = {'type': 'map', 'values': 'int'}
+        encoded = AvroStringWriter(schema_json).encode({'a': 1})
+        comparator = AvroBinaryComparator(schema_json)
+        with pytest.raises(AvroException):
+            comparator.compare(encoded, encoded)
+        with pytest.raises(AvroException):
+            comparator.sort_key(encoded)
@@ -21,6 +21,9 @@ from avro import schema
 
 from data_pipeline_avro_util.avro_builder import AvroField
 from data_pipeline_avro_util.avro_builder import AvroSchemaBuilder
+from data_pipeline_avro_util.avro_builder import FieldOperation
+from data_pipeline_avro_util.avro_string_reader import AvroStringReader
+from data_pipeline_avro_util.avro_string_writer import AvroStringWriter
 
 
 class TestAvroSchemaBuilder(object):
@@ -433,6 +436,26 @@ class TestAvroSchemaBuilder(object):
         }
         assert actual_json == expected_json
 
+    def test_end_with_schema_object(self, builder):
+        builder.begin_record(self.name).add_field('id', builder.create_int())
+        schema_obj = builder.end(return_schema_object=True)
+
+        assert isinstance(schema_obj, schema.RecordSchema)
+        assert builder.schema_object is schema_obj
+        writer = AvroStringWriter(schema_obj)
+        reader = AvroStringReader(schema_obj, schema_obj)
+        assert writer.schema is schema_obj
+        assert reader.decode(writer.encode({'id': 1})) == {'id': 1}
+
+    def test_end_keeps_schema_object(self, builder):
+        actual_json = builder.begin_enum(self.name, self.enum_symbols).end()
+        assert builder.schema_object.to_json() == actual_json
+
+    def test_end_nested_schema_with_schema_object(self, builder):
+        builder.begin_record(self.name).begin_array(builder.create_int())
+        with pytest.raises(ValueError):
+            builder.end(return_schema_object=True)
+
     def test_create_record_with_optional_attributes(self, builder):
         actual_json = builder.begin_record(
             self.name,
@@ -682,6 +705,78 @@ class TestAvroSchemaBuilder(object):
         expected_json['fields'].append({'name': 'new_field', 'type': 'int'})
         assert actual_json == expected_json
 
+    def test_preloaded_json_is_shared_not_modified(self, builder):
+        nested_type = {'type': 'array', 'items': 'string'}
+        source_json = {
+            'type': 'record',
+            'name': self.name,
+            'fields': [
+                {'name': 'a', 'type': nested_type},
+                {'name': 'b', 'type': 'int'},
+            ]
+        }
+        builder.begin_with_schema_json(source_json)
+        assert builder.get_field('b') is not source_json['fields'][1]
+        builder.get_field('b')['doc'] = self.doc
+        builder.add_field('c', builder.create_int()).remove_field('a')
+        actual_json = builder.end()
+
+        assert source_json == {
+            'type': 'record',
+            'name': self.name,
+            'fields': [
+                {'name': 'a', 'type': nested_type},
+                {'name': 'b', 'type': 'int'},
+            ]
+        }
+        assert actual_json['fields'] == [
+            {'name': 'b', 'type': 'int', 'doc': self.doc},
+            {'name': 'c', 'type': 'int'},
+        ]
+
+    def test_nested_field_type_change_does_not_modify_source(self, builder):
+        source_json = {
+            'type': 'record',
+            'name': self.name,
+            'fields': [
+                {'name': 'a', 'type': ['int', 'string']},
+                {
+                    'name': 'b',
+                    'type': {'type': 'map', 'values': ['int', 'long']}
+                },
+            ]
+        }
+        builder.begin_with_schema_json(source_json)
+        builder.get_field('a')['type'].append('null')
+        builder.get_field('b')['type']['values'].append('null')
+        actual_json = builder.end()
+
+        assert source_json['fields'] == [
+            {'name': 'a', 'type': ['int', 'string']},
+            {'name': 'b', 'type': {'type': 'map', 'values': ['int', 'long']}},
+        ]
+        assert actual_json['fields'] == [
+            {'name': 'a', 'type': ['int', 'string', 'null']},
+            {
+                'name': 'b',
+                'type': {'type': 'map', 'values': ['int', 'long', 'null']}
+            },
+        ]
+
+    def test_nullable_type_does_not_modify_source(self, builder):
+        union_type = ['int', {'type': 'array', 'items': ['int', 'string']}]
+        actual_json = builder.begin_nullable_type(union_type).end()
+        assert actual_json == [
+            'null',
+            'int',
+            {'type': 'array', 'items': ['int', 'string']}
+        ]
+        actual_json[2]['items'].append('null')
+        assert union_type == [
+            'int',
+            {'type': 'array', 'items': ['int', 'string']}
+        ]
+
     def test_removed_field(self, builder):
         actual_json = builder.begin_record(
             self.name
@@ -849,6 +944,311 @@ class TestAvroSchemaBuilder(object):
                 new_fields=[{'name': 'c', 'type': 'int'}]
             )
 
+    def test_field_lookups_after_mutations(self, builder):
+        builder.begin_record(self.name)
+        for i in range(5):
+            builder.add_field('f{0}'.format(i), builder.create_int())
+        assert builder.get_field_index('f4') == 4
+
+        builder.remove_field('f1')
+        builder.insert_field(builder.create_field('g', 'long'), index=0)
+        builder.insert_fields(
+            [builder.create_field('h1', 'int'),
+             builder.create_field('h2', 'int')],
+            index=-1
+        )
+        builder.replace_field('f2', [builder.create_field('r', 'string')])
+        builder.add_field('last', builder.create_int())
+
+        expected_names = ['g', 'f0', 'r', 'f3', 'h1', 'h2', 'f4', 'last']
+        for index, name in enumerate(expected_names):
+            assert builder.get_field_index(name) == index
+            assert builder.get_field(name)['name'] == name
+        for name in ('f1', 'f2'):
+            with pytest.raises(ValueError):
+                builder.get_field_index(name)
+        assert [f['name'] for f in builder.end()['fields']] == expected_names
+
+    def test_field_lookups_with_nested_records(self, builder):
+        builder.begin_record(self.name).add_field('a', 'int')
+        assert builder.get_field_index('a') == 0
+        builder.begin_record(self.another_name).add_field('b', 'int')
+        assert builder.get_field_index('b') == 0
+        with pytest.raises(ValueError):
+            builder.get_field_index('a')
+        inner_record = builder.end()
+
+        builder.insert_field(builder.create_field('inner', inner_record), 0)
+        assert builder.get_field_index('a') == 1
+        with pytest.raises(ValueError):
+            builder.get_field_index('b')
+
+    def test_field_lookups_after_external_change(self, builder):
+        builder.begin_record(self.name).add_field('a', 'int')
+        builder.add_field('b', 'int')
+        builder.get_field('a')['name'] = 'renamed'
+
+        assert builder.get_field_index('renamed') == 0
+        assert builder.get_field_index('b') == 1
+        with pytest.raises(ValueError):
+            builder.get_field_index('a')
+
+    @property
+    def batch_fields(self):
+        return [
+            {'name': 'a', 'type': 'int'},
+            {'name': 'b', 'type': 'int'},
+            {'name': 'c', 'type': 'int'},
+            {'name': 'd', 'type': 'int'},
+        ]
+
+    def test_apply_field_operations(self, builder):
+        original_fields = self.batch_fields
+        builder.begin_with_schema_json({
+            'type': 'record',
+            'name': self.name,
+            'fields': original_fields
+        })
+        builder.apply_field_operations([
+            FieldOperation.insert(1, [{'name': 'x', 'type': 'int'}]),
+            FieldOperation.remove('a'),
+            FieldOperation.replace('c', [{'name': 'y', 'type': 'long'}]),
+            FieldOperation.rename('b', 'b2'),
+            FieldOperation.set_metadata('b', pkey=1),
+            FieldOperation.insert(1, [{'name': 'z', 'type': 'int'}]),
+            FieldOperation.insert(-1, [{'name': 'w', 'type': 'int'}]),
+            FieldOperation.insert(100, [{'name': 'v', 'type': 'int'}]),
+        ])
+
+        assert builder.get_field_index('d') == 5
+        assert builder.end()['fields'] == [
+            {'name': 'x', 'type': 'int'},
+            {'name': 'z', 'type': 'int'},
+            {'name': 'b2', 'type': 'int', 'pkey': 1},
+            {'name': 'y', 'type': 'long'},
+            {'name': 'w', 'type': 'int'},
+            {'name': 'd', 'type': 'int'},
+            {'name': 'v', 'type': 'int'},
+        ]
+        assert original_fields == self.batch_fields
+
+    @pytest.mark.parametrize('operations', [
+        [FieldOperation.remove('unknown')],
+        [FieldOperation.remove('a'), FieldOperation.rename('a', 'a2')],
+        [FieldOperation.set_metadata('a', k=1), FieldOperation.remove('a')],
+        [FieldOperation.rename('a', 'a2'), FieldOperation.rename('a', 'a3')],
+        [FieldOperation.remove('a'), FieldOperation.replace('a', [])],
+    ])
+    def test_apply_invalid_field_operations(self, builder, operations):
+        builder.begin_with_schema_json({
+            'type': 'record',
+            'name': self.name,
+            'fields': self.batch_fields
+        })
+        with pytest.raises(ValueError):
+            builder.apply_field_operations(
+                [FieldOperation.insert(0, [{'name': 'x', 'type': 'int'}])] +
+                operations
+            )
+        assert builder.end()['fields'] == self.batch_fields
+
+    @pytest.fixture
+    def validating_builder(self):
+        return AvroSchemaBuilder(validate_incrementally=True)
+
+    def test_incremental_validation_builds_same_schema(
+        self,
+        builder,
+        validating_builder
+    ):
+        def build(ab):
+            ab.begin_record(self.name, namespace=self.namespace)
+            ab.add_field(
+                'color',
+                ab.begin_enum('color', self.enum_symbols).end(),
+                has_default=True,
+                default_value='a'
+            )
+            ab.add_field(
+                'other_color',
+                ab.begin_nullable_type('color').end(),
+                has_default=True,
+                default_value=None
+            )
+            ab.add_field(
+                'child',
+                ab.begin_record(
+                    self.another_name
+                ).add_field(
+                    'id',
+                    'long'
+                ).add_field(
+                    'parent',
+                    ['null', self.name],
+                    has_default=True,
+                    default_value=None
+                ).end(),
+                has_default=True,
+                default_value={'id': 1}
+            )
+            ab.add_field('tags', ab.begin_array('string').end())
+            return ab.end()
+
+        assert build(validating_builder) == build(builder)
+
+    def test_incremental_validation_with_nullable_begun_types(
+        self,
+        builder,
+        validating_builder
+    ):
+        def build(ab):
+            ab.begin_record(self.name, namespace=self.namespace)
+            record_schema = ab.begin_record(
+                self.another_name
+            ).add_field('a', 'int').end()
+            ab.add_field('x', ab.begin_nullable_type(record_schema).end())
+            enum_schema = ab.begin_enum('color', self.enum_symbols).end()
+            ab.add_field(
+                'color',
+                ab.begin_nullable_type(enum_schema, default_value='a').end(),
+                has_default=True,
+                default_value='a'
+            )
+            ab.add_field('y', ab.begin_nullable_type(self.another_name).end())
+            return ab.end()
+
+        assert build(validating_builder) == build(builder)
+
+    def test_incremental_validation_rejects_nullable_begun_type_used_twice(
+        self,
+        validating_builder
+    ):
+        ab = validating_builder
+        ab.begin_record(self.name)
+        enum_schema = ab.begin_enum(self.another_name, self.enum_symbols).end()
+        ab.add_field('a', enum_schema)
+        with pytest.raises(schema.SchemaParseException):
+            ab.add_field('b', ab.begin_nullable_type(enum_schema).end())
+
+    def test_incremental_validation_rejects_dup_field_name(
+        self,
+        validating_builder
+    ):
+        validating_builder.begin_record(self.name).add_field('a', 'int')
+        with pytest.raises(schema.SchemaParseException):
+            validating_builder.add_field('a', 'long')
+        with pytest.raises(schema.SchemaParseException):
+            validating_builder.insert_fields(
+                [{'name': 'b', 'type': 'int'}, {'name': 'b', 'type': 'int'}],
+                index=0
+            )
+        assert validating_builder.end()['fields'] == [
+            {'name': 'a', 'type': 'int'}
+        ]
+
+    @pytest.mark.parametrize('typ, default_value', [
+        ('int', 'abc'),
+        ('int', 1 << 40),
+        ('boolean', 0),
+        (['null', 'string'], 'abc'),
+        ({'type': 'array', 'items': 'int'}, [1, None]),
+        ({'type': 'enum', 'name': 'e', 'symbols': ['x']}, 'y'),
+        ({'type': 'fixed', 'name': 'f', 'size': 2}, 'abc'),
+    ])
+    def test_incremental_validation_rejects_invalid_default(
+        self,
+        validating_builder,
+        typ,
+        default_value
+    ):
+        validating_builder.begin_record(self.name)
+        with pytest.raises(schema.SchemaParseException):
+            validating_builder.add_field(
+                'a',
+                typ,
+                has_default=True,
+                default_value=default_value
+            )
+        # the failed field leaves no named type behind
+        validating_builder.add_field('b', typ)
+
+    def test_incremental_validation_rejects_unknown_reference(
+        self,
+        validating_builder
+    ):
+        validating_builder.begin_record(self.name)
+        with pytest.raises(schema.SchemaParseException):
+            validating_builder.add_field('a', 'unknown')
+        with pytest.raises(schema.SchemaParseException):
+            validating_builder.add_field(
+                'b',
+                {'type': 'array', 'items': 'unknown'}
+            )
+
+    def test_incremental_validation_rejects_dup_type_name(
+        self,
+        validating_builder
+    ):
+        validating_builder.begin_record(self.name)
+        validating_builder.add_field(
+            'a',
+            {'type': 'fixed', 'name': self.another_name, 'size': 4}
+        )
+        with pytest.raises(schema.SchemaParseException):
+            validating_builder.begin_enum(self.another_name, self.enum_symbols)
+        with pytest.raises(schema.SchemaParseException):
+            validating_builder.begin_record(self.name)
+
+    def test_incremental_validation_rejects_schema_used_twice(
+        self,
+        validating_builder
+    ):
+        ab = validating_builder
+        ab.begin_record(self.name)
+        enum_schema = ab.begin_enum(self.another_name, self.enum_symbols).end()
+        ab.add_field('a', enum_schema)
+        with pytest.raises(schema.SchemaParseException):
+            ab.add_field('b', enum_schema)
+        ab.add_field('b', self.another_name)
+
+    def test_incremental_validation_after_removing_named_type(
+        self,
+        validating_builder
+    ):
+        enum_schema = {
+            'type': 'enum',
+            'name': self.another_name,
+            'symbols': self.enum_symbols
+        }
+        validating_builder.begin_with_schema_json({
+            'type': 'record',
+            'name': self.name,
+            'fields': [{'name': 'a', 'type': enum_schema}]
+        })
+        validating_builder.replace_field(
+            'a',
+            [{'name': 'b', 'type': dict(enum_schema, symbols=['c'])}]
+        )
+        validating_builder.apply_field_operations([
+            FieldOperation.rename('b', 'c'),
+        ])
+        actual_fields = validating_builder.end()['fields']
+        assert [field['name'] for field in actual_fields] == ['c']
+        assert actual_fields[0]['type']['symbols'] == ['c']
+
+    def test_incremental_validation_of_preloaded_json(
+        self,
+        validating_builder
+    ):
+        with pytest.raises(schema.SchemaParseException):
+            validating_builder.begin_with_schema_json({
+                'type': 'record',
+                'name': self.name,
+                'fields': [{'name': 'a', 'type': 'int', 'default': None}]
+            })
+        validating_builder.begin_with_schema_json(self.record_schema_json)
+        assert validating_builder.end() == self.record_schema_json
+
 
 class TestAvroField(object):
 
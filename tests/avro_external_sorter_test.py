@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import random
+
+import pytest
+
+from data_pipeline_avro_util.avro_binary_comparator import \
+    AvroBinaryComparator
+from data_pipeline_avro_util.avro_external_sorter import AvroExternalSorter
+from data_pipeline_avro_util.avro_string_writer import AvroStringWriter
+
+
+class TestAvroExternalSorter(object):
+
+    @property
+    def schema_json(self):
+        return {
+            'type': 'record',
+            'name': 'row',
+            'fields': [
+                {'name': 'id', 'type': 'int'},
+                {'name': 'seq', 'type': 'int', 'order': 'ignore'},
+                {'name': 'payload', 'type': 'string', 'order': 'ignore'},
+            ]
+        }
+
+    @pytest.fixture
+    def encoded_messages(self):
+        rand = random.Random(42)
+        writer = AvroStringWriter(self.schema_json)
+        return [
+            writer.encode({
+                'id': rand.randint(-50, 50),
+                'seq': seq,
+                'payload': 'x' * rand.randint(0, 300)
+            })
+            for seq in range(500)
+        ]
+
+    @pytest.fixture
+    def expected_messages(self, encoded_messages):
+        comparator = AvroBinaryComparator(self.schema_json)
+        return sorted(encoded_messages, key=comparator.sort_key)
+
+    def test_sort_in_memory(self, encoded_messages, expected_messages):
+        sorter = AvroExternalSorter(self.schema_json)
+        assert list(sorter.sort(encoded_messages)) == expected_messages
+
+    def test_sort_with_spilled_runs(
+        self,
+        encoded_messages,
+        expected_messages,
+        tmpdir
+    ):
+        sorter = AvroExternalSorter(
+            self.schema_json,
+            max_buffer_size=4096,
+            temp_dir=str(tmpdir),
+            read_chunk_size=100
+        )
+        actual = list(sorter.sort(iter(encoded_messages)))
+        # Equal ids keep their input order, so the output is identical to
+        # the stable in-memory sort.
+        assert actual == expected_messages
+
+    def test_sort_with_multiple_merge_passes(
+        self,
+        encoded_messages,
+        expected_messages
+    ):
+        sorter = AvroExternalSorter(
+            self.schema_json,
+            max_buffer_size=2048,
+            max_merge_width=3
+        )
+        assert list(sorter.sort(encoded_messages)) == expected_messages
+
+    def test_sort_empty_stream(self):
+        sorter = AvroExternalSorter(self.schema_json, max_buffer_size=1)
+        assert list(sorter.sort([])) == []
+
+    def test_sort_with_custom_key(self, encoded_messages):
+        sorter = AvroExternalSorter(
+            self.schema_json,
+            max_buffer_size=4096,
+            key=len
+        )
+        assert list(sorter.sort(encoded_messages)) == sorted(
+            encoded_messages,
+            key=len
+        )
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import copy
+import datetime
+import json
+from decimal import Decimal
+
+import pytest
+from avro import timezones
+
+from data_pipeline_avro_util.avro_logical_types import \
+    compile_column_converter
+from data_pipeline_avro_util.avro_logical_types import \
+    compile_logical_type_converter
+from data_pipeline_avro_util.avro_logical_types import \
+    compile_record_batch_converter
+from data_pipeline_avro_util.avro_logical_types import DecimalCodec
+from data_pipeline_avro_util.avro_logical_types import strip_logical_types
+from data_pipeline_avro_util.avro_string_reader import AvroStringReader
+from data_pipeline_avro_util.avro_string_writer import AvroStringWriter
+from data_pipeline_avro_util.util import get_avro_schema_object
+
+
+class TestLogicalTypeConversions(object):
+
+    @property
+    def schema_json(self):
+        return {
+            'type': 'record',
+            'name': 'logical',
+            'fields': [
+                {'name': 'id', 'type': 'int'},
+                {
+                    'name': 'date',
+                    'type': ['null', {'type': 'int', 'logicalType': 'date'}]
+                },
+                {
+                    'name': 'time_millis',
+                    'type': {'type': 'int', 'logicalType': 'time-millis'}
+                },
+                {
+                    'name': 'time_micros',
+                    'type': {'type': 'long', 'logicalType': 'time-micros'}
+                },
+                {
+                    'name': 'ts_millis',
+                    'type': {'type': 'long', 'logicalType': 'timestamp-millis'}
+                },
+                {
+                    'name': 'ts_micros',
+                    'type': {'type': 'long', 'logicalType': 'timestamp-micros'}
+                },
+                {
+                    'name': 'dec_bytes',
+                    'type': {
+                        'type': 'bytes',
+                        'logicalType': 'decimal',
+                        'precision': 10,
+                        'scale': 2
+                    }
+                },
+                {
+                    'name': 'dec_fixed',
+                    'type': {
+                        'type': 'fixed',
+                        'name': 'dec_fixed',
+                        'size': 8,
+                        'logicalType': 'decimal',
+                        'precision': 12,
+                        'scale': 4
+                    }
+                },
+                {
+                    'name': 'history',
+                    'type': {
+                        'type': 'map',
+                        'values': {
+                            'type': 'array',
+                            'items': {'type': 'int', 'logicalType': 'date'}
+                        }
+                    }
+                },
+            ]
+        }
+
+    @property
+    def schema(self):
+        return get_avro_schema_object(self.schema_json)
+
+    @property
+    def record(self):
+        return {
+            'id': 1,
+            'date': datetime.date(2016, 2, 29),
+            'time_millis': datetime.time(13, 14, 15, 16000),
+            'time_micros': datetime.time(23, 59, 59, 999999),
+            'ts_millis': datetime.datetime(
+                2016, 1, 1, 10, 11, 12, 13000, tzinfo=timezones.utc
+            ),
+            'ts_micros': datetime.datetime(
+                1969, 12, 31, 23, 0, 0, 1, tzinfo=timezones.utc
+            ),
+            'dec_bytes': Decimal('-1234.56'),
+            'dec_fixed': Decimal('98765.4321'),
+            'history': {'a': [datetime.date(1969, 12, 31)], 'b': []},
+        }
+
+    @property
+    def raw_record(self):
+        encoded_message = AvroStringWriter(self.schema_json).encode(
+            self.record
+        )
+        return AvroStringReader(
+            reader_schema=self.schema_json,
+            writer_schema=self.schema_json,
+            convert_logical_types=False
+        ).decode(encoded_message)
+
+    def test_strip_logical_types(self):
+        stripped_schema = strip_logical_types(self.schema_json)
+        assert 'logicalType' not in json.dumps(stripped_schema.to_json())
+        assert stripped_schema.fields_dict['dec_fixed'].type.size == 8
+
+        int_schema = get_avro_schema_object('"int"')
+        assert strip_logical_types(int_schema) is int_schema
+
+    def test_raw_values(self):
+        raw_record = self.raw_record
+        assert raw_record['date'] == 16860
+        assert raw_record['time_millis'] == 47655016
+        assert raw_record['ts_micros'] == -3599999999
+        assert raw_record['dec_bytes'] == b'\xfe\x1d\xc0'
+        assert raw_record['history'] == {'a': [-1], 'b': []}
+
+    def test_raw_values_round_trip(self):
+        raw_writer = AvroStringWriter(
+            self.schema_json,
+            convert_logical_types=False
+        )
+        encoded_message = raw_writer.encode(self.raw_record)
+        reader = AvroStringReader(
+            reader_schema=self.schema_json,
+            writer_schema=self.schema_json
+        )
+        assert reader.decode(encoded_message) == self.record
+
+    def test_convert_to_python(self):
+        convert = compile_logical_type_converter(self.schema)
+        assert convert(self.raw_record) == self.record
+
+    def test_convert_to_raw(self):
+        convert = compile_logical_type_converter(self.schema, to_python=False)
+        record = self.record
+        record['ts_millis'] = record['ts_millis'].replace(tzinfo=None)
+        assert convert(record) == self.raw_record
+
+    def test_convert_null(self):
+        convert = compile_logical_type_converter(self.schema)
+        raw_record = dict(self.raw_record, date=None)
+        assert convert(raw_record)['date'] is None
+
+    def test_no_logical_types(self):
+        schema = get_avro_schema_object({
+            'type': 'record',
+            'name': 'plain',
+            'fields': [{'name': 'a', 'type': ['null', 'int']}]
+        })
+        assert compile_logical_type_converter(schema) is None
+
+    def test_decimal_with_too_many_places(self):
+        convert = compile_logical_type_converter(
+            self.schema.fields_dict['dec_bytes'].type,
+            to_python=False
+        )
+        with pytest.raises(ValueError):
+            convert(Decimal('1.001'))
+
+    def test_logical_types_in_unions_without_null(self):
+        schema = get_avro_schema_object(
+            ['string', {'type': 'int', 'logicalType': 'date'}]
+        )
+        with pytest.raises(ValueError):
+            compile_logical_type_converter(schema)
+
+    @pytest.mark.parametrize('to_python', [True, False])
+    def test_convert_columns(self, to_python):
+        records = [self.record, dict(self.record, date=None)]
+        raw_records = [self.raw_record, dict(self.raw_record, date=None)]
+        if not to_python:
+            records, raw_records = raw_records, records
+        for field in self.schema.fields:
+            convert_column = compile_column_converter(field.type, to_python)
+            assert convert_column(
+                [record[field.name] for record in raw_records]
+            ) == [record[field.name] for record in records]
+
+    def test_convert_record_batch(self):
+        convert_records = compile_record_batch_converter(
+            self.schema,
+            field_names=['date', 'ts_millis']
+        )
+        raw_records = [self.raw_record, dict(self.raw_record, date=None)]
+        expected_records = copy.deepcopy(raw_records)
+        for expected_record in expected_records:
+            expected_record['ts_millis'] = self.record['ts_millis']
+        expected_records[0]['date'] = self.record['date']
+        assert convert_records(raw_records) == expected_records
+
+
+class TestDecimalCodec(object):
+
+    @pytest.fixture(params=[
+        {'type': 'bytes'},
+        {'type': 'fixed', 'name': 'dec4', 'size': 4},
+        {'type': 'fixed', 'name': 'dec5', 'size': 5},
+        {'type': 'fixed', 'name': 'dec8', 'size': 8},
+    ])
+    def schema_json(self, request):
+        return dict(
+            request.param,
+            logicalType='decimal',
+            precision=9,
+            scale=2
+        )
+
+    @pytest.fixture
+    def codec(self, schema_json):
+        return DecimalCodec(schema_json)
+
+    @property
+    def values(self):
+        return [
+            Decimal('0.00'),
+            Decimal('-1234.56'),
+            Decimal('9999999.99'),
+            Decimal('-9999999.99'),
+            Decimal('0.01'),
+        ]
+
+    def _avro_encode(self, schema_json, value):
+        encoded_message = AvroStringWriter(schema_json).encode(value)
+        if schema_json['type'] == 'bytes':
+            return encoded_message[1:]
+        return encoded_message
+
+    def test_encode_and_decode(self, codec, schema_json):
+        for value in self.values:
+            datum = codec.encode(value)
+            assert datum == self._avro_encode(schema_json, value)
+            decoded_value = codec.decode(datum)
+            assert decoded_value == value
+            assert decoded_value.as_tuple() == value.as_tuple()
+
+    def test_encode_and_decode_many(self, codec):
+        data = codec.encode_many(self.values)
+        assert data == [codec.encode(value) for value in self.values]
+        assert codec.decode_many(data) == self.values
+        assert codec.decode_many([]) == []
+
+    def test_unscaled(self, codec):
+        assert codec.to_unscaled(Decimal('-1234.56')) == -123456
+        assert codec.to_unscaled(Decimal('12.3')) == 1230
+        assert codec.to_unscaled(Decimal('1E+3')) == 100000
+        assert codec.to_unscaled(Decimal('1.500')) == 150
+        assert codec.from_unscaled(-123456) == Decimal('-1234.56')
+        assert codec.decode_unscaled(codec.encode_unscaled(-123456)) == -123456
+        assert codec.decode_unscaled_many(
+            codec.encode_unscaled_many([1, -1])
+        ) == [1, -1]
+
+    @pytest.mark.parametrize('value', [
+        Decimal('1.001'),
+        Decimal('10000000.00'),
+        Decimal('NaN'),
+        Decimal('-Infinity'),
+    ])
+    def test_invalid_values(self, codec, value):
+        with pytest.raises(ValueError):
+            codec.encode(value)
+
+    def test_single_byte_fixed(self):
+        codec = DecimalCodec({
+            'type': 'fixed',
+            'name': 'dec1',
+            'size': 1,
+            'logicalType': 'decimal',
+            'precision': 2,
+            'scale': 2
+        })
+        values = [Decimal('-0.99'), Decimal('0.99')]
+        assert codec.encode_many(values) == [b'\x9d', b'\x63']
+        assert codec.decode_many(codec.encode_many(values)) == values
+
+    def test_not_a_decimal_schema(self):
+        with pytest.raises(ValueError):
+            DecimalCodec('"bytes"')
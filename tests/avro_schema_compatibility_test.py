@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+
+import avro.io
+import mock
+import pytest
+
+from data_pipeline_avro_util import avro_schema_compatibility
+from data_pipeline_avro_util.avro_schema_compatibility import Compatibility
+from data_pipeline_avro_util.avro_schema_compatibility import \
+    get_resolution_fingerprint
+from data_pipeline_avro_util.avro_schema_compatibility import \
+    SchemaCompatibilityChecker
+from data_pipeline_avro_util.avro_string_reader import AvroStringReader
+from data_pipeline_avro_util.avro_string_writer import AvroStringWriter
+
+
+def _record(fields, name='foo', **attributes):
+    schema = {'type': 'record', 'name': name, 'fields': fields}
+    schema.update(attributes)
+    return schema
+
+
+def _enum(symbols, name='color', **attributes):
+    schema = {'type': 'enum', 'name': name, 'symbols': symbols}
+    schema.update(attributes)
+    return schema
+
+
+@pytest.mark.parametrize('reader_schema, writer_schema, expected', [
+    ('int', 'int', True),
+    ('long', 'int', True),
+    ('double', 'long', True),
+    ('double', 'float', True),
+    ('int', 'long', False),
+    ('string', 'bytes', False),
+    (['null', 'long'], 'int', True),
+    (['null', 'string'], ['null', 'string', 'int'], False),
+    (['null', 'string', 'int'], ['null', 'string'], True),
+    ('int', ['null', 'int'], False),
+    (_enum(['A', 'B', 'C']), _enum(['B', 'A']), True),
+    (_enum(['A', 'B']), _enum(['A', 'B', 'C']), False),
+    (_enum(['A'], name='shade'), _enum(['A']), False),
+    (_enum(['A'], name='shade', aliases=['color']), _enum(['A']), True),
+    (
+        {'type': 'fixed', 'name': 'f', 'size': 4},
+        {'type': 'fixed', 'name': 'f', 'size': 8},
+        False
+    ),
+    (
+        {'type': 'array', 'items': 'long'},
+        {'type': 'array', 'items': 'long'},
+        True
+    ),
+    (
+        {'type': 'array', 'items': 'long'},
+        {'type': 'array', 'items': 'int'},
+        False
+    ),
+    (
+        {'type': 'map', 'values': 'long'},
+        {'type': 'map', 'values': 'int'},
+        False
+    ),
+    (
+        {'type': 'map', 'values': 'int'},
+        {'type': 'map', 'values': 'long'},
+        False
+    ),
+    (
+        {'type': 'array', 'items': ['null', 'long']},
+        {'type': 'array', 'items': ['null', 'int']},
+        True
+    ),
+    (
+        ['null', {'type': 'array', 'items': 'long'}],
+        {'type': 'array', 'items': 'int'},
+        False
+    ),
+    (
+        {'type': 'bytes', 'logicalType': 'decimal', 'precision': 8, 'scale': 2},
+        {'type': 'bytes', 'logicalType': 'decimal', 'precision': 8, 'scale': 3},
+        False
+    ),
+    (
+        _record([{'name': 'a', 'type': 'long'}]),
+        _record([{'name': 'a', 'type': 'int'}, {'name': 'b', 'type': 'int'}]),
+        True
+    ),
+    (
+        _record([{'name': 'a', 'type': 'int'}, {'name': 'b', 'type': 'int'}]),
+        _record([{'name': 'a', 'type': 'int'}]),
+        False
+    ),
+    (
+        _record([
+            {'name': 'a', 'type': 'int'},
+            {'name': 'b', 'type': 'int', 'default': 1}
+        ]),
+        _record([{'name': 'a', 'type': 'int'}]),
+        True
+    ),
+    (
+        _record([
+            {'name': 'a', 'type': 'int'},
+            {'name': 'b', 'type': ['null', 'int'], 'default': None}
+        ]),
+        _record([{'name': 'a', 'type': 'int'}]),
+        True
+    ),
+    (
+        _record([{'name': 'b', 'type': 'int', 'aliases': ['a']}]),
+        _record([{'name': 'a', 'type': 'int'}]),
+        True
+    ),
+    (
+        _record([{'name': 'a', 'type': 'int'}], name='bar'),
+        _record([{'name': 'a', 'type': 'int'}]),
+        False
+    ),
+    (
+        _record([{'name': 'a', 'type': 'int'}], name='bar', aliases=['foo']),
+        _record([{'name': 'a', 'type': 'int'}]),
+        True
+    ),
+    (
+        _record([
+            {'name': 'a', 'type': 'int'},
+            {'name': 'next', 'type': ['null', 'foo'], 'default': None}
+        ]),
+        _record([
+            {'name': 'next', 'type': ['null', 'foo']}
+        ]),
+        False
+    ),
+    (
+        _record([
+            {'name': 'a', 'type': 'long', 'default': 0},
+            {'name': 'next', 'type': ['null', 'foo'], 'default': None}
+        ]),
+        _record([
+            {'name': 'a', 'type': 'int'},
+            {'name': 'next', 'type': ['null', 'foo']}
+        ]),
+        True
+    ),
+])
+def test_can_read(reader_schema, writer_schema, expected):
+    checker = SchemaCompatibilityChecker()
+    assert checker.can_read(
+        json.dumps(reader_schema),
+        json.dumps(writer_schema)
+    ) == expected
+
+
+@pytest.mark.parametrize('reader_schema, writer_schema, datum', [
+    (
+        {'type': 'array', 'items': 'long'},
+        {'type': 'array', 'items': 'int'},
+        [1, 2]
+    ),
+    (
+        {'type': 'map', 'values': 'double'},
+        {'type': 'map', 'values': 'float'},
+        {'a': 1.5}
+    ),
+    (
+        {'type': 'array', 'items': ['null', 'long']},
+        {'type': 'array', 'items': ['null', 'int']},
+        [1, None]
+    ),
+])
+def test_can_read_matches_datum_reader(reader_schema, writer_schema, datum):
+    writer_schema = json.dumps(writer_schema)
+    reader = AvroStringReader(json.dumps(reader_schema), writer_schema)
+    encoded = AvroStringWriter(writer_schema).encode(datum)
+    try:
+        reader.decode(encoded)
+        is_readable = True
+    except avro.io.SchemaResolutionException:
+        is_readable = False
+    checker = SchemaCompatibilityChecker()
+    assert checker.can_read(reader.reader_schema, writer_schema) == (
+        is_readable
+    )
+
+
+def test_resolution_fingerprint_ignores_docs_and_metadata():
+    schema = _record([{'name': 'a', 'type': 'int'}])
+    documented_schema = _record(
+        [{'name': 'a', 'type': 'int', 'doc': 'a', 'pkey': 1}],
+        doc='foo'
+    )
+    assert (
+        get_resolution_fingerprint(schema) ==
+        get_resolution_fingerprint(documented_schema)
+    )
+    assert (
+        get_resolution_fingerprint(schema) !=
+        get_resolution_fingerprint(_record([{'name': 'a', 'type': 'long'}]))
+    )
+
+
+class TestSchemaCompatibilityChecker(object):
+
+    @pytest.fixture
+    def checker(self):
+        return SchemaCompatibilityChecker()
+
+    @property
+    def old_schema(self):
+        return _record([{'name': 'a', 'type': 'int'}])
+
+    @property
+    def new_schema(self):
+        return _record([
+            {'name': 'a', 'type': 'int'},
+            {'name': 'b', 'type': 'int', 'default': 0}
+        ])
+
+    @property
+    def long_schema(self):
+        return _record([{'name': 'a', 'type': 'long'}])
+
+    def test_is_compatible(self, checker):
+        assert checker.is_compatible(
+            self.new_schema,
+            self.old_schema,
+            Compatibility.FULL
+        )
+        assert checker.is_compatible(
+            self.long_schema,
+            self.old_schema,
+            Compatibility.BACKWARD
+        )
+        assert not checker.is_compatible(
+            self.long_schema,
+            self.old_schema,
+            Compatibility.FORWARD
+        )
+        assert not checker.is_compatible(self.long_schema, self.old_schema)
+
+    def test_unknown_compatibility(self, checker):
+        with pytest.raises(ValueError):
+            checker.is_compatible(self.new_schema, self.old_schema, 'none')
+
+    def test_find_incompatible_versions(self, checker):
+        assert checker.add_version(self.old_schema) == 0
+        assert checker.add_version(self.long_schema) == 1
+        assert checker.add_version(dict(self.old_schema, doc='doc')) == 2
+
+        assert checker.find_incompatible_versions(
+            self.new_schema,
+            Compatibility.BACKWARD
+        ) == [1]
+        assert checker.find_incompatible_versions(self.new_schema) == [1]
+        assert checker.find_incompatible_versions(
+            self.long_schema,
+            Compatibility.FORWARD
+        ) == [0, 2]
+
+    def test_verdicts_are_memoized(self, checker):
+        for _ in range(3):
+            checker.add_version(self.old_schema)
+        checker.add_version(self.long_schema)
+        new_schema = json.dumps(self.new_schema)
+
+        with mock.patch.object(
+            avro_schema_compatibility,
+            '_can_read',
+            wraps=avro_schema_compatibility._can_read
+        ) as can_read:
+            checker.find_incompatible_versions(new_schema)
+            assert can_read.call_count > 0
+            can_read.reset_mock()
+            checker.find_incompatible_versions(new_schema)
+            assert can_read.call_count == 0
+        # the identical old versions are checked once in each direction, and
+        # the long version only until the backward check fails
+        assert len(checker._verdicts) == 3
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+import random
+
+import pytest
+
+from data_pipeline_avro_util.avro_builder import AvroSchemaBuilder
+from data_pipeline_avro_util.avro_builder import FieldOperation
+from data_pipeline_avro_util.avro_schema_diff import diff_record_fields
+from data_pipeline_avro_util.util import get_avro_schema_object
+
+
+class TestDiffRecordFields(object):
+
+    def _record(self, fields):
+        return {'type': 'record', 'name': 'foo', 'fields': fields}
+
+    def _field(self, name, typ='int', **metadata):
+        field = {'name': name, 'type': typ}
+        field.update(metadata)
+        return field
+
+    def _apply(self, old_schema, operations):
+        builder = AvroSchemaBuilder()
+        builder.begin_with_schema_json(old_schema)
+        return builder.apply_field_operations(operations).end()
+
+    def test_identical_schemas(self):
+        schema = self._record([self._field('a'), self._field('b')])
+        assert diff_record_fields(schema, schema) == []
+
+    def test_diff_operations(self):
+        old_schema = self._record([
+            self._field('a'),
+            self._field('b'),
+            self._field('c', pkey=1),
+            self._field('d'),
+        ])
+        new_schema = self._record([
+            self._field('x'),
+            self._field('a', 'long'),
+            self._field('c', pkey=2, maxlen=8),
+            self._field('d'),
+            self._field('y'),
+        ])
+        assert diff_record_fields(old_schema, new_schema) == [
+            FieldOperation.insert(0, [self._field('x')]),
+            FieldOperation.replace('a', [self._field('a', 'long')]),
+            FieldOperation.remove('b'),
+            FieldOperation.set_metadata('c', pkey=2, maxlen=8),
+            FieldOperation.insert(4, [self._field('y')]),
+        ]
+
+    def test_removed_metadata_is_replaced(self):
+        old_schema = self._record([self._field('a', pkey=1)])
+        new_schema = self._record([self._field('a')])
+        assert diff_record_fields(old_schema, new_schema) == [
+            FieldOperation.replace('a', [self._field('a')])
+        ]
+
+    def test_diff_schema_objects_and_strings(self):
+        old_schema = self._record([self._field('a'), self._field('b')])
+        new_schema = self._record([self._field('b'), self._field('a')])
+        operations = diff_record_fields(
+            json.dumps(old_schema),
+            get_avro_schema_object(new_schema)
+        )
+        assert len(operations) == 2
+        assert self._apply(old_schema, operations) == new_schema
+
+    def test_non_record_schema(self):
+        with pytest.raises(ValueError):
+            diff_record_fields('"int"', self._record([]))
+
+    def test_applying_diff_gives_new_schema(self):
+        rand = random.Random(11)
+        for _ in range(50):
+            names = ['f{0}'.format(i) for i in range(30)]
+            old_fields = [
+                self._field(name, rand.choice(['int', 'long']))
+                for name in rand.sample(names, rand.randint(0, 20))
+            ]
+            new_fields = []
+            for name in rand.sample(names, rand.randint(0, 20)):
+                field = self._field(name, rand.choice(['int', 'long']))
+                if rand.random() < 0.3:
+                    field['pkey'] = rand.randint(1, 3)
+                new_fields.append(field)
+            old_schema = self._record(old_fields)
+            new_schema = self._record(new_fields)
+
+            operations = diff_record_fields(old_schema, new_schema)
+            assert self._apply(old_schema, operations) == new_schema
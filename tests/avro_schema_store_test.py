@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+import multiprocessing
+import os
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
+
+import mock
+import pytest
+from avro import schema
+
+from data_pipeline_avro_util import avro_binary_util
+from data_pipeline_avro_util import avro_schema_store
+from data_pipeline_avro_util.avro_schema_store import AvroSchemaStore
+from data_pipeline_avro_util.avro_string_writer import AvroStringWriter
+from data_pipeline_avro_util.util import get_avro_schema_fingerprint
+from data_pipeline_avro_util.util import get_avro_schema_object
+
+
+class TestAvroSchemaStore(object):
+
+    @pytest.fixture
+    def store(self):
+        return AvroSchemaStore()
+
+    @property
+    def address_schema(self):
+        return {
+            'type': 'record',
+            'name': 'address',
+            'fields': [
+                {'name': 'street', 'type': 'string'},
+                {'name': 'state', 'type': {
+                    'type': 'enum',
+                    'name': 'state',
+                    'symbols': ['CA', 'NY']
+                }},
+            ]
+        }
+
+    def _business_schema(self, *extra_fields):
+        return {
+            'type': 'record',
+            'name': 'business',
+            'namespace': 'yelp',
+            'fields': [
+                {'name': 'id', 'type': 'int'},
+                {'name': 'address', 'type': self.address_schema},
+                {'name': 'previous_state', 'type': ['null', 'state']},
+            ] + list(extra_fields)
+        }
+
+    @property
+    def v1_schema(self):
+        return self._business_schema()
+
+    @property
+    def v2_schema(self):
+        return self._business_schema(
+            {'name': 'name', 'type': 'string', 'default': ''}
+        )
+
+    @property
+    def message(self):
+        return {
+            'id': 1,
+            'address': {'street': 'Market', 'state': 'CA'},
+            'previous_state': 'NY'
+        }
+
+    def test_get_schema_is_interned(self, store):
+        schema_obj = store.get_schema(self.v1_schema)
+        assert store.get_schema(json.dumps(self.v1_schema)) is schema_obj
+        assert store.get_schema(
+            get_avro_schema_object(self.v1_schema)
+        ) is store.get_schema(get_avro_schema_object(self.v1_schema))
+
+    def test_named_schemas_are_shared(self, store):
+        v1 = store.get_schema(self.v1_schema)
+        v2 = store.get_schema(self.v2_schema)
+        assert v1 is not v2
+        assert v1.fields_dict['address'].type is v2.fields_dict['address'].type
+        assert (
+            v2.fields_dict['previous_state'].type.schemas[1] is
+            v1.fields_dict['address'].type.fields_dict['state'].type
+        )
+        assert v2.fields_dict['address'].type.fullname == 'yelp.address'
+
+    def test_named_schemas_are_interned_by_namespace(self, store):
+        v1 = store.get_schema(self.v1_schema)
+        other = store.get_schema(dict(self.v1_schema, namespace='other'))
+        assert (
+            v1.fields_dict['address'].type is not
+            other.fields_dict['address'].type
+        )
+        assert other.fields_dict['address'].type.fullname == 'other.address'
+
+    @pytest.mark.parametrize('schema_json', [
+        'int',
+        {'type': 'array', 'items': {
+            'type': 'fixed',
+            'name': 'md5',
+            'size': 16
+        }},
+        ['null', {'type': 'enum', 'name': 'e', 'symbols': ['A']}, 'e'],
+        {
+            'type': 'record',
+            'name': 'node',
+            'fields': [
+                {'name': 'value', 'type': 'int'},
+                {'name': 'children', 'type': {
+                    'type': 'array',
+                    'items': 'node'
+                }},
+            ]
+        },
+        {
+            'type': 'record',
+            'name': 'outer',
+            'namespace': 'a',
+            'fields': [
+                {'name': 'kind', 'type': {
+                    'type': 'enum',
+                    'name': 'kind',
+                    'symbols': ['X']
+                }},
+                {'name': 'inner', 'type': {
+                    'type': 'record',
+                    'name': 'inner',
+                    'namespace': 'b',
+                    'fields': [
+                        {'name': 'kind', 'type': 'a.kind'},
+                        {'name': 'outer', 'type': ['null', 'a.outer']},
+                    ]
+                }},
+            ]
+        },
+    ])
+    def test_same_schema_as_parsed(self, store, schema_json):
+        assert (
+            store.get_schema(json.dumps(schema_json)).to_json() ==
+            get_avro_schema_object(json.dumps(schema_json)).to_json()
+        )
+
+    @pytest.mark.parametrize('schema_json', [
+        'not json',
+        {'type': 'record', 'name': 'foo', 'fields': [
+            {'name': 'a', 'type': 'bar'},
+        ]},
+        {'type': 'record', 'name': 'foo', 'fields': [
+            {'name': 'a', 'type': 'bar'},
+            {'name': 'b', 'type': {
+                'type': 'enum',
+                'name': 'bar',
+                'symbols': ['A']
+            }},
+        ]},
+        {'type': 'record', 'name': 'foo', 'fields': [
+            {'name': 'a', 'type': {
+                'type': 'enum',
+                'name': 'bar',
+                'symbols': ['A']
+            }},
+            {'name': 'b', 'type': {
+                'type': 'fixed',
+                'name': 'bar',
+                'size': 1
+            }},
+        ]},
+    ])
+    def test_invalid_schema(self, store, schema_json):
+        if not isinstance(schema_json, basestring):
+            schema_json = json.dumps(schema_json)
+        with pytest.raises(schema.SchemaParseException):
+            store.get_schema(schema_json)
+
+    def test_codecs_are_shared(self, store):
+        encoded_message = AvroStringWriter(self.v1_schema).encode(self.message)
+        with mock.patch.object(
+            avro_binary_util,
+            '_compile_record_decoder',
+            wraps=avro_binary_util._compile_record_decoder
+        ) as compile_record_decoder:
+            decoder = store.get_decoder(self.v1_schema)
+            assert store.get_decoder(json.dumps(self.v1_schema)) is decoder
+            store.get_decoder(self.v2_schema)
+        compiled_records = [
+            args[0].fullname
+            for args, _ in compile_record_decoder.call_args_list
+        ]
+        assert sorted(compiled_records) == [
+            'yelp.address',
+            'yelp.business',
+            'yelp.business'
+        ]
+        assert decoder(encoded_message, 0) == (
+            self.message,
+            len(encoded_message)
+        )
+
+        skipper = store.get_skipper(self.v1_schema)
+        assert store.get_skipper(self.v1_schema) is skipper
+        assert skipper(encoded_message, 0) == len(encoded_message)
+
+    def test_get_fingerprint(self, store):
+        assert store.get_fingerprint(self.v1_schema) == (
+            get_avro_schema_fingerprint(self.v1_schema)
+        )
+
+
+class TestAvroSchemaStoreCache(object):
+
+    @pytest.fixture
+    def cache_dir(self, tmpdir):
+        return str(tmpdir)
+
+    @property
+    def schemas(self):
+        test = TestAvroSchemaStore()
+        return [json.dumps(test.v1_schema), json.dumps(test.v2_schema)]
+
+    def _fill_cache(self, cache_dir):
+        store = AvroSchemaStore(cache_dir=cache_dir)
+        for schema_json in self.schemas:
+            store.get_schema(schema_json)
+
+    def test_cached_schemas_are_not_parsed(self, cache_dir):
+        self._fill_cache(cache_dir)
+        store = AvroSchemaStore(cache_dir=cache_dir)
+        with mock.patch.object(
+            schema,
+            'make_avsc_object',
+            wraps=schema.make_avsc_object
+        ) as make_avsc_object:
+            v1, v2 = [store.get_schema(s) for s in self.schemas]
+            fingerprint = store.get_fingerprint(self.schemas[0])
+        assert make_avsc_object.call_count == 0
+        assert v1.fields_dict['address'].type is v2.fields_dict['address'].type
+        assert v1.to_json() == get_avro_schema_object(self.schemas[0]).to_json()
+        assert fingerprint == get_avro_schema_fingerprint(self.schemas[0])
+
+        message = TestAvroSchemaStore().message
+        encoded_message = AvroStringWriter(v1).encode(message)
+        assert store.get_decoder(v1)(encoded_message, 0)[0] == message
+
+    @pytest.mark.parametrize('damage', [
+        lambda path: open(path, 'wb').write(b'garbage'),
+        lambda path: open(path, 'wb').close(),
+        os.remove,
+    ])
+    def test_damaged_cache_entries_are_rebuilt(self, cache_dir, damage):
+        self._fill_cache(cache_dir)
+        for root, _, files in os.walk(cache_dir):
+            for name in files:
+                damage(os.path.join(root, name))
+
+        store = AvroSchemaStore(cache_dir=cache_dir)
+        v1, v2 = [store.get_schema(s) for s in self.schemas]
+        assert v1.to_json() == get_avro_schema_object(self.schemas[0]).to_json()
+        assert v1.fields_dict['address'].type is v2.fields_dict['address'].type
+
+    def test_cache_is_versioned(self, cache_dir):
+        self._fill_cache(cache_dir)
+        with mock.patch.object(
+            avro_schema_store,
+            '_CACHE_VERSION',
+            'other_version'
+        ), mock.patch.object(
+            schema,
+            'make_avsc_object',
+            wraps=schema.make_avsc_object
+        ) as make_avsc_object:
+            AvroSchemaStore(cache_dir=cache_dir).get_schema(self.schemas[0])
+        assert make_avsc_object.call_count > 0
+        assert sorted(os.listdir(cache_dir)) == sorted([
+            avro_schema_store._CACHE_VERSION,
+            'other_version'
+        ])
+
+
+class TestAvroSchemaStoreWarmUp(object):
+
+    @property
+    def schemas(self):
+        return TestAvroSchemaStoreCache().schemas
+
+    @contextmanager
+    def _assert_no_parsing_or_compiling(self):
+        with mock.patch.object(
+            schema,
+            'make_avsc_object',
+            wraps=schema.make_avsc_object
+        ) as make_avsc_object, mock.patch.object(
+            avro_schema_store,
+            'compile_decoder',
+            wraps=avro_schema_store.compile_decoder
+        ) as compile_decoder:
+            yield
+        assert make_avsc_object.call_count == 0
+        assert compile_decoder.call_count == 0
+
+    def test_warm_up(self):
+        store = AvroSchemaStore()
+        store.warm_up(self.schemas + [tuple(self.schemas)])
+        with self._assert_no_parsing_or_compiling():
+            for schema_json in self.schemas:
+                store.get_fingerprint(schema_json)
+                store.get_decoder(schema_json)
+                store.get_skipper(schema_json)
+            reader = store.get_reader(*self.schemas)
+        assert '_direct_decode_func' in reader.__dict__
+
+        message = TestAvroSchemaStore().message
+        encoded_message = AvroStringWriter(self.schemas[1]).encode(
+            dict(message, name='business')
+        )
+        assert reader.decode(encoded_message) == message
+
+    @pytest.mark.parametrize('pool_class', [ThreadPool, multiprocessing.Pool])
+    def test_warm_up_with_pool(self, tmpdir, pool_class):
+        store = AvroSchemaStore(cache_dir=str(tmpdir))
+        pool = pool_class(2)
+        try:
+            with mock.patch.object(
+                schema,
+                'make_avsc_object',
+                wraps=schema.make_avsc_object
+            ) as make_avsc_object:
+                store.warm_up(self.schemas, pool=pool, chunksize=1)
+        finally:
+            pool.close()
+        if pool_class is multiprocessing.Pool:
+            # the schemas are parsed in the workers only
+            assert make_avsc_object.call_count == 0
+        assert os.listdir(str(tmpdir))
+
+        v1, v2 = [store.get_schema(s) for s in self.schemas]
+        assert v1.fields_dict['address'].type is v2.fields_dict['address'].type
+        with self._assert_no_parsing_or_compiling():
+            store.get_decoder(self.schemas[0])
+
+    def test_warm_up_with_pool_requires_cache_dir(self):
+        pool = ThreadPool(1)
+        try:
+            with pytest.raises(ValueError):
+                AvroSchemaStore().warm_up(self.schemas, pool=pool)
+        finally:
+            pool.close()
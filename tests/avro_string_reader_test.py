@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import cStringIO
+import datetime
+from decimal import Decimal
+
+import avro.io
+import pytest
+from avro import timezones
+
+from data_pipeline_avro_util.avro_string_reader import AvroStringReader
+from data_pipeline_avro_util.avro_string_writer import AvroStringWriter
+from data_pipeline_avro_util.testing_helpers.generate_payload_data import \
+    generate_payload_data
+from data_pipeline_avro_util.util import get_avro_schema_object
+
+
+class TestAvroStringReader(object):
+
+    @pytest.fixture
+    def avro_schema_object(self, avro_schema_json):
+        return get_avro_schema_object(avro_schema_json)
+
+    @property
+    def logical_schema_json(self):
+        return {
+            'type': 'record',
+            'name': 'logical',
+            'fields': [
+                {
+                    'name': 'date',
+                    'type': {'type': 'int', 'logicalType': 'date'}
+                },
+                {
+                    'name': 'time_millis',
+                    'type': {'type': 'int', 'logicalType': 'time-millis'}
+                },
+                {
+                    'name': 'time_micros',
+                    'type': {'type': 'long', 'logicalType': 'time-micros'}
+                },
+                {
+                    'name': 'ts_millis',
+                    'type': {'type': 'long', 'logicalType': 'timestamp-millis'}
+                },
+                {
+                    'name': 'ts_micros',
+                    'type': {'type': 'long', 'logicalType': 'timestamp-micros'}
+                },
+                {
+                    'name': 'dec_bytes',
+                    'type': {
+                        'type': 'bytes',
+                        'logicalType': 'decimal',
+                        'precision': 10,
+                        'scale': 2
+                    }
+                },
+                {
+                    'name': 'dec_fixed',
+                    'type': {
+                        'type': 'fixed',
+                        'name': 'dec_fixed',
+                        'size': 8,
+                        'logicalType': 'decimal',
+                        'precision': 12,
+                        'scale': 4
+                    }
+                },
+                {
+                    'name': 'collections',
+                    'type': {
+                        'type': 'map',
+                        'values': {'type': 'array', 'items': 'double'}
+                    }
+                },
+            ]
+        }
+
+    @property
+    def logical_record(self):
+        return {
+            'date': datetime.date(2016, 2, 29),
+            'time_millis': datetime.time(13, 14, 15, 16000),
+            'time_micros': datetime.time(23, 59, 59, 999999),
+            'ts_millis': datetime.datetime(
+                2016, 1, 1, 10, 11, 12, 13000, tzinfo=timezones.utc
+            ),
+            'ts_micros': datetime.datetime(
+                1969, 12, 31, 23, 0, 0, 1, tzinfo=timezones.utc
+            ),
+            'dec_bytes': Decimal('-1234.56'),
+            'dec_fixed': Decimal('98765.4321'),
+            'collections': {'a': [1.5, -2.25], 'b': []},
+        }
+
+    def _resolving_decode(self, reader, encoded_message):
+        decoder = avro.io.BinaryDecoder(cStringIO.StringIO(encoded_message))
+        return reader.avro_reader.read(decoder)
+
+    def test_decode_same_schema(self, avro_schema_object):
+        payload = generate_payload_data(avro_schema_object)
+        encoded = AvroStringWriter(avro_schema_object).encode(payload)
+        reader = AvroStringReader(
+            reader_schema=avro_schema_object,
+            writer_schema=avro_schema_object.to_json()
+        )
+        assert reader._direct_decode_func is not None
+        assert reader.decode(encoded) == payload
+
+    def test_decode_same_schema_with_logical_types(self):
+        encoded = AvroStringWriter(self.logical_schema_json).encode(
+            self.logical_record
+        )
+        reader = AvroStringReader(
+            reader_schema=self.logical_schema_json,
+            writer_schema=self.logical_schema_json
+        )
+        actual = reader.decode(encoded)
+        assert actual == self._resolving_decode(reader, encoded)
+        assert actual == self.logical_record
+
+    def test_decode_trailing_reader_fields_with_defaults(
+        self,
+        avro_schema_json
+    ):
+        writer_schema = get_avro_schema_object(avro_schema_json)
+        avro_schema_json['fields'].extend([
+            {'name': 'new_int', 'type': 'int', 'default': 7},
+            {
+                'name': 'new_array',
+                'type': {'type': 'array', 'items': 'string'},
+                'default': ['a']
+            },
+        ])
+        reader = AvroStringReader(
+            reader_schema=avro_schema_json,
+            writer_schema=writer_schema
+        )
+        payload = generate_payload_data(writer_schema)
+        encoded = AvroStringWriter(writer_schema).encode(payload)
+
+        assert reader._direct_decode_func is not None
+        actual = reader.decode(encoded)
+        assert actual == self._resolving_decode(reader, encoded)
+        assert actual['new_int'] == 7
+        assert actual['new_array'] == ['a']
+
+        actual['new_array'].append('b')
+        assert reader.decode(encoded)['new_array'] == ['a']
+
+    def test_trailing_default_values_without_datum_reader(
+        self,
+        avro_schema_json
+    ):
+        writer_schema = get_avro_schema_object(avro_schema_json)
+        avro_schema_json['fields'].extend([
+            {'name': 'new_null', 'type': ['null', 'int'], 'default': None},
+            {'name': 'new_bytes', 'type': 'bytes', 'default': 'ÿ'},
+            {
+                'name': 'new_enum',
+                'type': {'type': 'enum', 'name': 'E', 'symbols': ['A', 'B']},
+                'default': 'B'
+            },
+            {
+                'name': 'new_map',
+                'type': {'type': 'map', 'values': 'double'},
+                'default': {'a': 1.5}
+            },
+            {
+                'name': 'new_record',
+                'type': {
+                    'type': 'record',
+                    'name': 'R',
+                    'fields': [{'name': 'x', 'type': 'long'}]
+                },
+                'default': {'x': 3}
+            },
+        ])
+        reader = AvroStringReader(
+            reader_schema=avro_schema_json,
+            writer_schema=writer_schema
+        )
+        payload = generate_payload_data(writer_schema)
+        encoded = AvroStringWriter(writer_schema).encode(payload)
+
+        actual = reader.decode(encoded)
+        # the defaults are decoded without building the resolving reader
+        assert 'avro_reader' not in reader.__dict__
+        # avro.io leaves bytes defaults as unicode instead of mapping their
+        # code points to bytes as the specification requires
+        assert actual.pop('new_bytes') == b'\xff'
+        expected = self._resolving_decode(reader, encoded)
+        expected.pop('new_bytes')
+        assert actual == expected
+        assert actual['new_null'] is None
+        assert actual['new_enum'] == 'B'
+        assert actual['new_map'] == {'a': 1.5}
+        assert actual['new_record'] == {'x': 3}
+
+    def test_decode_with_schema_resolution(self, avro_schema_json):
+        writer_schema = get_avro_schema_object(avro_schema_json)
+        avro_schema_json['fields'].reverse()
+        reader = AvroStringReader(
+            reader_schema=avro_schema_json,
+            writer_schema=writer_schema
+        )
+        payload = generate_payload_data(writer_schema)
+        encoded = AvroStringWriter(writer_schema).encode(payload)
+
+        assert reader._direct_decode_func is None
+        assert reader.decode(encoded) == payload
+
+    def test_decode_trailing_reader_field_without_default(
+        self,
+        avro_schema_json
+    ):
+        writer_schema = get_avro_schema_object(avro_schema_json)
+        avro_schema_json['fields'].append({'name': 'new_int', 'type': 'int'})
+        reader = AvroStringReader(
+            reader_schema=avro_schema_json,
+            writer_schema=writer_schema
+        )
+        assert reader._direct_decode_func is None
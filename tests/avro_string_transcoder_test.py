@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import pytest
+from avro.io import SchemaResolutionException
+
+from data_pipeline_avro_util.avro_string_reader import AvroStringReader
+from data_pipeline_avro_util.avro_string_transcoder import \
+    AvroStringTranscoder
+from data_pipeline_avro_util.avro_string_writer import AvroStringWriter
+
+
+class TestAvroStringTranscoder(object):
+
+    @property
+    def writer_schema(self):
+        return {
+            'type': 'record',
+            'name': 'user',
+            'fields': [
+                {'name': 'id', 'type': 'int'},
+                {'name': 'dropped', 'type': {'type': 'map', 'values': 'int'}},
+                {'name': 'score', 'type': 'float'},
+                {'name': 'name', 'type': ['null', 'string']},
+                {
+                    'name': 'color',
+                    'type': {
+                        'type': 'enum',
+                        'name': 'color',
+                        'symbols': ['red', 'green']
+                    }
+                },
+                {
+                    'name': 'tags',
+                    'type': {'type': 'array', 'items': 'string'}
+                },
+                {
+                    'name': 'address',
+                    'type': {
+                        'type': 'record',
+                        'name': 'address',
+                        'fields': [
+                            {'name': 'zip', 'type': 'int'},
+                            {'name': 'city', 'type': 'string'}
+                        ]
+                    }
+                },
+            ]
+        }
+
+    @property
+    def reader_schema(self):
+        return {
+            'type': 'record',
+            'name': 'user',
+            'fields': [
+                {
+                    'name': 'address',
+                    'type': {
+                        'type': 'record',
+                        'name': 'address',
+                        'fields': [
+                            {'name': 'city', 'type': 'string'},
+                            {'name': 'zip', 'type': 'long'},
+                            {
+                                'name': 'country',
+                                'type': 'string',
+                                'default': 'US'
+                            }
+                        ]
+                    }
+                },
+                {'name': 'id', 'type': 'double'},
+                {'name': 'score', 'type': 'double'},
+                {'name': 'name', 'type': ['null', 'string']},
+                {
+                    'name': 'color',
+                    'type': {
+                        'type': 'enum',
+                        'name': 'color',
+                        'symbols': ['blue', 'green', 'red']
+                    }
+                },
+                {
+                    'name': 'tags',
+                    'type': {'type': 'array', 'items': 'string'}
+                },
+                {
+                    'name': 'nums',
+                    'type': {'type': 'array', 'items': 'int'},
+                    'default': [1, 2]
+                },
+            ]
+        }
+
+    @property
+    def record(self):
+        return {
+            'id': 123,
+            'dropped': {'a': 1, 'b': -2},
+            'score': 0.5,
+            'name': 'foo❤',
+            'color': 'green',
+            'tags': ['x', 'y', 'z'],
+            'address': {'zip': 94107, 'city': 'San Francisco'}
+        }
+
+    def _assert_transcodes(self, reader_schema, writer_schema, record):
+        encoded = AvroStringWriter(writer_schema).encode(record)
+        transcoder = AvroStringTranscoder(
+            reader_schema=reader_schema,
+            writer_schema=writer_schema
+        )
+        transcoded = transcoder.transcode(encoded)
+
+        expected = AvroStringReader(
+            reader_schema=reader_schema,
+            writer_schema=writer_schema
+        ).decode(encoded)
+        actual = AvroStringReader(
+            reader_schema=reader_schema,
+            writer_schema=reader_schema
+        ).decode(transcoded)
+        assert actual == expected
+        return transcoded
+
+    def test_transcode_same_schema(self):
+        encoded = AvroStringWriter(self.writer_schema).encode(self.record)
+        transcoder = AvroStringTranscoder(
+            reader_schema=self.writer_schema,
+            writer_schema=self.writer_schema
+        )
+        assert transcoder.transcode(encoded) == encoded
+
+    def test_transcode_resolves_schemas(self):
+        self._assert_transcodes(
+            self.reader_schema,
+            self.writer_schema,
+            self.record
+        )
+
+    def test_transcode_union_branch_into_non_union(self):
+        reader_schema = self.writer_schema
+        reader_schema['fields'][3]['type'] = 'string'
+        self._assert_transcodes(reader_schema, self.writer_schema, self.record)
+
+        record = self.record
+        record['name'] = None
+        encoded = AvroStringWriter(self.writer_schema).encode(record)
+        transcoder = AvroStringTranscoder(reader_schema, self.writer_schema)
+        with pytest.raises(SchemaResolutionException):
+            transcoder.transcode(encoded)
+
+    def test_transcode_non_union_into_union(self):
+        reader_schema = self.writer_schema
+        reader_schema['fields'][0]['type'] = ['null', 'string', 'long']
+        self._assert_transcodes(reader_schema, self.writer_schema, self.record)
+
+    def test_transcode_empty_collections(self):
+        record = self.record
+        record['tags'] = []
+        record['dropped'] = {}
+        self._assert_transcodes(self.reader_schema, self.writer_schema, record)
+
+    def test_transcode_recursive_schema(self):
+        writer_schema = {
+            'type': 'record',
+            'name': 'node',
+            'fields': [
+                {'name': 'value', 'type': 'int'},
+                {'name': 'next', 'type': ['null', 'node']}
+            ]
+        }
+        reader_schema = {
+            'type': 'record',
+            'name': 'node',
+            'fields': [
+                {'name': 'next', 'type': ['null', 'node']},
+                {'name': 'value', 'type': 'long'},
+                {'name': 'label', 'type': 'string', 'default': ''}
+            ]
+        }
+        record = {
+            'value': 1,
+            'next': {'value': 2, 'next': {'value': 3, 'next': None}}
+        }
+        self._assert_transcodes(reader_schema, writer_schema, record)
+
+    def test_transcode_missing_default(self):
+        reader_schema = self.writer_schema
+        reader_schema['fields'].append({'name': 'no_default', 'type': 'int'})
+        encoded = AvroStringWriter(self.writer_schema).encode(self.record)
+        transcoder = AvroStringTranscoder(reader_schema, self.writer_schema)
+        with pytest.raises(SchemaResolutionException):
+            transcoder.transcode(encoded)
+
+    def test_transcode_missing_enum_symbol(self):
+        reader_schema = self.writer_schema
+        reader_schema['fields'][4]['type']['symbols'] = ['red']
+        encoded = AvroStringWriter(self.writer_schema).encode(self.record)
+        transcoder = AvroStringTranscoder(reader_schema, self.writer_schema)
+        with pytest.raises(SchemaResolutionException):
+            transcoder.transcode(encoded)
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from decimal import Decimal
+
+import pytest
+
+from data_pipeline_avro_util.data_pipeline.constraint_checker import \
+    ConstraintChecker
+from data_pipeline_avro_util.data_pipeline.table_schema_builder import \
+    build_table_schema
+from data_pipeline_avro_util.data_pipeline.table_schema_builder import \
+    ColumnDescriptor
+from data_pipeline_avro_util.data_pipeline.table_schema_builder import \
+    TableDescriptor
+
+
+class TestConstraintChecker(object):
+
+    @property
+    def schema_json(self):
+        return build_table_schema(TableDescriptor('business', [
+            ColumnDescriptor('id', 'int', is_nullable=False, is_unsigned=True),
+            ColumnDescriptor('name', 'varchar', length=8),
+            ColumnDescriptor('code', 'char', length=2),
+            ColumnDescriptor('checksum', 'binary', length=4),
+            ColumnDescriptor('flags', 'bit', length=3),
+            ColumnDescriptor('price', 'decimal', precision=5, scale=2),
+            ColumnDescriptor('description', 'text'),
+        ]))
+
+    @pytest.fixture
+    def checker(self):
+        return ConstraintChecker(self.schema_json)
+
+    @property
+    def valid_record(self):
+        return {
+            'id': 1,
+            'name': 'Café',
+            'code': 'CA',
+            'checksum': b'\x00\x01\x02\x03',
+            'flags': 7,
+            'price': 999.99,
+            'description': 'x' * 100,
+        }
+
+    @property
+    def null_record(self):
+        return dict(
+            self.valid_record,
+            name=None,
+            code=None,
+            checksum=None,
+            flags=None,
+            price=None
+        )
+
+    def test_constrained_field_names(self, checker):
+        assert checker.constrained_field_names == [
+            'id',
+            'name',
+            'code',
+            'checksum',
+            'flags',
+            'price'
+        ]
+
+    def test_valid_records(self, checker):
+        assert checker.check(self.valid_record) == 0
+        assert checker.check(self.null_record) == 0
+        assert checker.check(dict(self.valid_record, name='a' * 8)) == 0
+        assert checker.check(dict(self.valid_record, price=-999.994)) == 0
+        assert checker.check(
+            dict(self.valid_record, price=Decimal('123.45'))
+        ) == 0
+        assert checker.check(
+            dict(self.valid_record, price=Decimal('999.985'))
+        ) == 0
+        assert checker.check(dict(self.valid_record, price=999)) == 0
+
+    @pytest.mark.parametrize('field_name, value', [
+        ('id', -1),
+        ('name', 'a' * 9),
+        # 6 characters but 11 UTF-8 bytes, which Redshift counts
+        ('name', 'Café❤❤'),
+        ('code', 'CAL'),
+        ('checksum', b'\x00' * 5),
+        ('flags', 8),
+        ('flags', -1),
+        ('price', 1000.0),
+        ('price', 999.995),
+        ('price', float('nan')),
+        ('price', Decimal('-1000.00')),
+        # rounded as a float, 999.995 would become 999.99
+        ('price', Decimal('999.995')),
+        ('price', Decimal('-999.995')),
+        ('price', Decimal('NaN')),
+        ('price', Decimal('Infinity')),
+        ('price', Decimal('1E+40')),
+        ('price', 10 ** 20),
+    ])
+    def test_violations(self, checker, field_name, value):
+        bitmap = checker.check(dict(self.valid_record, **{field_name: value}))
+        assert checker.get_violated_field_names(bitmap) == [field_name]
+
+    def test_decimal_rounding_overflow(self):
+        checker = ConstraintChecker(build_table_schema(TableDescriptor('t', [
+            ColumnDescriptor('price', 'decimal', precision=3, scale=2),
+        ])))
+        assert checker.check({'price': Decimal('9.994')}) == 0
+        assert checker.check({'price': Decimal('9.995')}) == 1
+
+    def test_check_many(self, checker):
+        records = [
+            self.valid_record,
+            dict(self.valid_record, id=-1, name='a' * 10, price=1e6),
+            self.null_record,
+            dict(self.null_record, flags=16),
+        ]
+        bitmaps = checker.check_many(records)
+        assert bitmaps == [checker.check(record) for record in records]
+        assert bitmaps == [0, 0b100011, 0, 0b10000]
+        assert checker.get_violated_field_names(bitmaps[1]) == [
+            'id',
+            'name',
+            'price'
+        ]
+        assert checker.check_many([]) == []
+
+    def test_requires_record_schema(self):
+        with pytest.raises(ValueError):
+            ConstraintChecker('"string"')
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import random
+
+import pytest
+
+from data_pipeline_avro_util.data_pipeline.primary_key_compactor import \
+    PrimaryKeyCompactor
+
+
+class TestPrimaryKeyCompactor(object):
+
+    @property
+    def schema_json(self):
+        return {
+            'type': 'record',
+            'name': 'account',
+            'fields': [
+                {'name': 'id', 'type': 'int', 'pkey': 1},
+                {'name': 'shard', 'type': 'string', 'pkey': 2},
+                {'name': 'balance', 'type': 'long'},
+            ]
+        }
+
+    @pytest.fixture
+    def records(self):
+        rand = random.Random(7)
+        return [
+            {
+                'id': rand.randint(0, 60),
+                'shard': rand.choice(['a', 'b']),
+                'balance': seq
+            }
+            for seq in range(1000)
+        ]
+
+    def _last_writes(self, records):
+        last_writes = {}
+        for record in records:
+            last_writes[(record['id'], record['shard'])] = record
+        return last_writes
+
+    def _key(self, record):
+        return record['id'], record['shard']
+
+    def test_compact_in_memory(self, records):
+        compactor = PrimaryKeyCompactor(self.schema_json)
+        actual = list(compactor.compact(records))
+
+        expected = self._last_writes(records)
+        assert len(actual) == len(expected)
+        assert {self._key(r): r for r in actual} == expected
+
+        first_seen = []
+        for record in records:
+            if self._key(record) not in first_seen:
+                first_seen.append(self._key(record))
+        assert [self._key(r) for r in actual] == first_seen
+
+    def test_compact_with_spilling(self, records, tmpdir):
+        compactor = PrimaryKeyCompactor(
+            self.schema_json,
+            max_keys_in_memory=10,
+            spill_partitions=4,
+            temp_dir=str(tmpdir)
+        )
+        actual = list(compactor.compact(iter(records)))
+
+        expected = self._last_writes(records)
+        assert len(actual) == len(expected)
+        assert {self._key(r): r for r in actual} == expected
+
+    def test_spilling_keeps_records_unchanged(self, records, tmpdir):
+        # keys outside the schema and values the schema would normalize
+        records = [
+            dict(record, shard=str(record['shard']), note=[i])
+            for i, record in enumerate(records)
+        ]
+        in_memory = list(PrimaryKeyCompactor(self.schema_json).compact(records))
+        spilled = list(PrimaryKeyCompactor(
+            self.schema_json,
+            max_keys_in_memory=10,
+            spill_partitions=4,
+            temp_dir=str(tmpdir)
+        ).compact(records))
+
+        assert sorted(spilled) == sorted(in_memory)
+        assert all(
+            type(record['shard']) is str and 'note' in record
+            for record in spilled
+        )
+
+    def test_compact_empty_stream(self):
+        compactor = PrimaryKeyCompactor(self.schema_json)
+        assert list(compactor.compact([])) == []
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import pytest
+
+from data_pipeline_avro_util.avro_string_writer import AvroStringWriter
+from data_pipeline_avro_util.data_pipeline.primary_key_extractor import \
+    PrimaryKeyExtractor
+
+
+class TestPrimaryKeyExtractor(object):
+
+    @property
+    def schema_json(self):
+        return {
+            'type': 'record',
+            'name': 'business',
+            'fields': [
+                {'name': 'name', 'type': 'string'},
+                {'name': 'region', 'type': ['null', 'string'], 'pkey': 2},
+                {'name': 'tags', 'type': {'type': 'array', 'items': 'string'}},
+                {'name': 'id', 'type': 'long', 'pkey': 1},
+                {'name': 'rating', 'type': 'double'},
+            ]
+        }
+
+    @property
+    def record(self):
+        return {
+            'name': 'Café',
+            'region': 'us❤',
+            'tags': ['a', 'b'],
+            'id': 1234567890123,
+            'rating': 4.5
+        }
+
+    @pytest.fixture
+    def extractor(self):
+        return PrimaryKeyExtractor(self.schema_json)
+
+    @pytest.fixture
+    def encoded_record(self):
+        return AvroStringWriter(self.schema_json).encode(self.record)
+
+    def test_key_field_names(self, extractor):
+        assert extractor.key_field_names == ['id', 'region']
+
+    def test_from_dict(self, extractor):
+        assert extractor.from_dict(self.record) == (1234567890123, 'us❤')
+
+    def test_from_encoded(self, extractor, encoded_record):
+        assert extractor.from_encoded(encoded_record) == (
+            1234567890123,
+            'us❤'
+        )
+
+    def test_encoded_key(self, extractor, encoded_record):
+        writer = AvroStringWriter(self.schema_json)
+        same_key = self.record
+        same_key.update(name='other', tags=[], rating=1.0)
+        other_key = self.record
+        other_key['region'] = None
+
+        encoded_key = extractor.encoded_key(encoded_record)
+        assert encoded_key == extractor.encoded_key(writer.encode(same_key))
+        assert encoded_key != extractor.encoded_key(writer.encode(other_key))
+
+    def test_schema_without_primary_key(self):
+        schema_json = self.schema_json
+        for field in schema_json['fields']:
+            field.pop('pkey', None)
+        with pytest.raises(ValueError):
+            PrimaryKeyExtractor(schema_json)
+
+    def test_non_record_schema(self):
+        with pytest.raises(ValueError):
+            PrimaryKeyExtractor('"int"')
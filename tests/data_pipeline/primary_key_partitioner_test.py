@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import pytest
+
+from data_pipeline_avro_util.avro_string_writer import AvroStringWriter
+from data_pipeline_avro_util.data_pipeline.primary_key_partitioner import \
+    murmur2
+from data_pipeline_avro_util.data_pipeline.primary_key_partitioner import \
+    PrimaryKeyPartitioner
+
+
+@pytest.mark.parametrize('data, expected_hash', [
+    (b'', 275646681),
+    (b'21', -973932308),
+    (b'abc', 479470107),
+    (b'foobar', -790332482),
+    (b'a-little-bit-long-string', -985981536),
+    (b'a-little-bit-longer-string', -1486304829),
+    (b'lkjh234lh9fiuh90y23oiuhsafujhadof229phr9h19h89h8', -58897971),
+])
+def test_murmur2_matches_kafka(data, expected_hash):
+    assert murmur2(data) == expected_hash
+
+
+class TestPrimaryKeyPartitioner(object):
+
+    @property
+    def schema_json(self):
+        return {
+            'type': 'record',
+            'name': 'review',
+            'fields': [
+                {'name': 'text', 'type': 'string'},
+                {'name': 'id', 'type': 'long', 'pkey': 1},
+            ]
+        }
+
+    @pytest.fixture
+    def partitioner(self):
+        return PrimaryKeyPartitioner(self.schema_json, num_partitions=8)
+
+    @pytest.fixture
+    def encoded_messages(self):
+        writer = AvroStringWriter(self.schema_json)
+        return [
+            writer.encode({'text': 'review {0}'.format(i), 'id': i % 50})
+            for i in range(200)
+        ]
+
+    def test_partition_by_key(self, partitioner):
+        writer = AvroStringWriter(self.schema_json)
+        partition = partitioner.partition(writer.encode({'text': 'a', 'id': 7}))
+        assert 0 <= partition < 8
+        assert partition == partitioner.partition(
+            writer.encode({'text': 'b', 'id': 7})
+        )
+
+    def test_partition_batch(self, partitioner, encoded_messages):
+        buffers = partitioner.partition_batch(encoded_messages)
+        assert len(buffers) == 8
+        assert sum(len(buf) for buf in buffers) == len(encoded_messages)
+        for partition, buf in enumerate(buffers):
+            assert all(
+                partitioner.partition(message) == partition for message in buf
+            )
+            assert buf == [
+                message for message in encoded_messages if message in buf
+            ]
+        assert sum(1 for buf in buffers if buf) > 1
+
+    def test_invalid_num_partitions(self):
+        with pytest.raises(ValueError):
+            PrimaryKeyPartitioner(self.schema_json, num_partitions=0)
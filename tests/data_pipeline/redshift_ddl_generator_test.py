@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+from multiprocessing.pool import ThreadPool
+
+import mock
+import pytest
+
+from data_pipeline_avro_util.data_pipeline import redshift_ddl_generator
+from data_pipeline_avro_util.data_pipeline.avro_meta_data import \
+    AvroMetaDataKeys
+from data_pipeline_avro_util.data_pipeline.redshift_ddl_generator import \
+    generate_redshift_ddl
+from data_pipeline_avro_util.data_pipeline.redshift_ddl_generator import \
+    RedshiftDDLGenerator
+from data_pipeline_avro_util.data_pipeline.table_schema_builder import \
+    build_table_schema
+from data_pipeline_avro_util.data_pipeline.table_schema_builder import \
+    ColumnDescriptor
+from data_pipeline_avro_util.data_pipeline.table_schema_builder import \
+    TableDescriptor
+from data_pipeline_avro_util.util import get_avro_schema_object
+
+
+class TestGenerateRedshiftDDL(object):
+
+    @property
+    def schema_json(self):
+        schema = build_table_schema(TableDescriptor('business', [
+            ColumnDescriptor(
+                'id',
+                'bigint',
+                is_nullable=False,
+                is_unsigned=True,
+                primary_key_position=1,
+                sort_key_position=2
+            ),
+            ColumnDescriptor('name', 'varchar', length=8),
+            ColumnDescriptor('code', 'char', length=2, is_nullable=False),
+            ColumnDescriptor('checksum', 'binary', length=4),
+            ColumnDescriptor('price', 'decimal', precision=6, scale=2),
+            ColumnDescriptor('count', 'int'),
+            ColumnDescriptor('rating', 'double'),
+            ColumnDescriptor('score', 'float'),
+            ColumnDescriptor('active', 'bit', length=1),
+            ColumnDescriptor('flags', 'bit', length=40),
+            ColumnDescriptor('is_open', 'boolean'),
+            ColumnDescriptor('opened', 'date', sort_key_position=1),
+            ColumnDescriptor('updated_at', 'timestamp', precision=3),
+            ColumnDescriptor('duration', 'time'),
+            ColumnDescriptor('founded', 'year'),
+            ColumnDescriptor('kind', 'enum', symbols=['A', 'Café']),
+            ColumnDescriptor('description', 'text', is_dist_key=True),
+        ]))
+        schema[AvroMetaDataKeys.DISTSTYLE] = 'key'
+        schema['fields'][1][AvroMetaDataKeys.ENCODE] = 'lzo'
+        return schema
+
+    def test_generate_ddl(self):
+        assert generate_redshift_ddl(self.schema_json) == (
+            'CREATE TABLE "business" (\n'
+            '    "id" DECIMAL(20, 0) NOT NULL,\n'
+            '    "name" VARCHAR(8) ENCODE LZO,\n'
+            '    "code" VARCHAR(2) NOT NULL,\n'
+            '    "checksum" VARCHAR(8),\n'
+            '    "price" DECIMAL(6, 2),\n'
+            '    "count" INTEGER,\n'
+            '    "rating" DOUBLE PRECISION,\n'
+            '    "score" REAL,\n'
+            '    "active" BOOLEAN,\n'
+            '    "flags" BIGINT,\n'
+            '    "is_open" BOOLEAN,\n'
+            '    "opened" DATE,\n'
+            '    "updated_at" TIMESTAMP,\n'
+            '    "duration" VARCHAR(17),\n'
+            '    "founded" SMALLINT,\n'
+            '    "kind" VARCHAR(5),\n'
+            '    "description" VARCHAR(65535),\n'
+            '    PRIMARY KEY ("id")\n'
+            ')\n'
+            'DISTSTYLE KEY\n'
+            'DISTKEY ("description")\n'
+            'SORTKEY ("opened", "id");'
+        )
+
+    def test_generate_ddl_with_table_name(self):
+        schema = build_table_schema(TableDescriptor('business', [
+            ColumnDescriptor('a"b', 'int', is_nullable=False),
+        ]))
+        assert generate_redshift_ddl(schema, 'biz') == (
+            'CREATE TABLE "biz" (\n'
+            '    "a""b" INTEGER NOT NULL\n'
+            ');'
+        )
+
+    def test_requires_record_schema(self):
+        with pytest.raises(ValueError):
+            generate_redshift_ddl('"string"')
+
+    def test_rejects_unsupported_precision(self):
+        schema = build_table_schema(TableDescriptor('business', [
+            ColumnDescriptor('price', 'decimal', precision=40, scale=2),
+        ]))
+        with pytest.raises(ValueError):
+            generate_redshift_ddl(schema)
+
+    @pytest.mark.parametrize('encode', ['ZSTD', 'az64', 'Mostly16'])
+    def test_known_encodings(self, encode):
+        schema = self.schema_json
+        schema['fields'][1][AvroMetaDataKeys.ENCODE] = encode
+        assert '"name" VARCHAR(8) ENCODE {0},'.format(encode.upper()) in (
+            generate_redshift_ddl(schema)
+        )
+
+    @pytest.mark.parametrize('encode', [
+        'gzip',
+        'lzo, "other" INT',
+        'zstd;',
+        5,
+    ])
+    def test_rejects_unknown_encoding(self, encode):
+        schema = self.schema_json
+        schema['fields'][1][AvroMetaDataKeys.ENCODE] = encode
+        with pytest.raises(ValueError):
+            generate_redshift_ddl(schema)
+
+    def _schema_without_dist_key(self):
+        schema = self.schema_json
+        del schema['fields'][-1][AvroMetaDataKeys.DIST_KEY]
+        return schema
+
+    @pytest.mark.parametrize('diststyle, expected', [
+        ('auto', 'DISTSTYLE AUTO'),
+        ('Even', 'DISTSTYLE EVEN'),
+        ('ALL', 'DISTSTYLE ALL'),
+    ])
+    def test_known_diststyles(self, diststyle, expected):
+        schema = self._schema_without_dist_key()
+        schema[AvroMetaDataKeys.DISTSTYLE] = diststyle
+        ddl = generate_redshift_ddl(schema).split('\n')
+        assert expected in ddl
+        assert not any(line.startswith('DISTKEY') for line in ddl)
+
+    def test_dist_key_without_diststyle(self):
+        schema = self.schema_json
+        del schema[AvroMetaDataKeys.DISTSTYLE]
+        ddl = generate_redshift_ddl(schema).split('\n')
+        assert 'DISTKEY ("description")' in ddl
+        assert not any(line.startswith('DISTSTYLE') for line in ddl)
+
+    @pytest.mark.parametrize('diststyle', [
+        'random',
+        'key; DROP TABLE "business"',
+        1,
+    ])
+    def test_rejects_unknown_diststyle(self, diststyle):
+        schema = self.schema_json
+        schema[AvroMetaDataKeys.DISTSTYLE] = diststyle
+        with pytest.raises(ValueError):
+            generate_redshift_ddl(schema)
+
+    def test_rejects_diststyle_key_without_dist_key(self):
+        schema = self._schema_without_dist_key()
+        with pytest.raises(ValueError):
+            generate_redshift_ddl(schema)
+
+    @pytest.mark.parametrize('diststyle', ['all', 'EVEN', 'auto'])
+    def test_rejects_dist_key_with_other_diststyle(self, diststyle):
+        schema = self.schema_json
+        schema[AvroMetaDataKeys.DISTSTYLE] = diststyle
+        with pytest.raises(ValueError):
+            generate_redshift_ddl(schema)
+
+
+class TestRedshiftDDLGenerator(object):
+
+    @property
+    def schemas(self):
+        return [
+            build_table_schema(TableDescriptor('table_{0}'.format(i), [
+                ColumnDescriptor('id', 'int', is_nullable=False),
+                ColumnDescriptor('name', 'varchar', length=i + 1),
+            ]))
+            for i in range(20)
+        ]
+
+    @pytest.fixture
+    def generator(self):
+        return RedshiftDDLGenerator()
+
+    @pytest.yield_fixture
+    def mock_generate_redshift_ddl(self):
+        with mock.patch.object(
+            redshift_ddl_generator,
+            'generate_redshift_ddl',
+            side_effect=generate_redshift_ddl
+        ) as mock_generate:
+            yield mock_generate
+
+    def test_generate_is_memoized_by_fingerprint(
+        self,
+        generator,
+        mock_generate_redshift_ddl
+    ):
+        schema = self.schemas[0]
+        ddl = generator.generate(schema)
+        assert ddl == generate_redshift_ddl(schema)
+        # equal schemas in any form share the generated statement
+        assert generator.generate(schema) == ddl
+        assert generator.generate(json.dumps(schema)) == ddl
+        assert generator.generate(get_avro_schema_object(schema)) == ddl
+        assert mock_generate_redshift_ddl.call_count == 1
+
+        assert generator.generate(schema, 'other') != ddl
+        assert mock_generate_redshift_ddl.call_count == 2
+
+    def test_generate_many(self, generator, mock_generate_redshift_ddl):
+        schemas = self.schemas * 2
+        assert generator.generate_many(schemas) == [
+            generate_redshift_ddl(schema) for schema in schemas
+        ]
+        assert mock_generate_redshift_ddl.call_count == 20
+
+    def test_generate_many_with_table_names(self, generator):
+        schemas = self.schemas[:2]
+        ddls = generator.generate_many(schemas, table_names=['a', 'b'])
+        assert ddls == [
+            generate_redshift_ddl(schemas[0], 'a'),
+            generate_redshift_ddl(schemas[1], 'b'),
+        ]
+
+    def test_generate_many_in_pool(self, generator):
+        schemas = self.schemas
+        # strings and schema objects are generated in the pool alike
+        schemas[1] = json.dumps(schemas[1])
+        schemas[2] = get_avro_schema_object(schemas[2])
+        schemas = schemas + schemas
+        pool = ThreadPool(2)
+        try:
+            ddls = generator.generate_many(schemas, pool=pool, chunksize=3)
+        finally:
+            pool.close()
+            pool.join()
+        assert ddls == [generate_redshift_ddl(schema) for schema in schemas]
+
+        with mock.patch.object(
+            generator.schema_store,
+            'get_schema'
+        ) as mock_get_schema:
+            assert generator.generate_many(schemas) == ddls
+            # the statements generated in the pool are memoized, so the
+            # schemas are not parsed again
+            assert mock_get_schema.call_count == 0
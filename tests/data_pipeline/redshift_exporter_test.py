@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import datetime
+import gzip
+import io
+import os
+from decimal import Decimal
+
+import avro.datafile
+import avro.io
+import mock
+import pytest
+
+from data_pipeline_avro_util.avro_string_writer import AvroStringWriter
+from data_pipeline_avro_util.data_pipeline import redshift_exporter
+from data_pipeline_avro_util.data_pipeline.redshift_exporter import \
+    read_container_file_records
+from data_pipeline_avro_util.data_pipeline.redshift_exporter import \
+    RedshiftExporter
+from data_pipeline_avro_util.data_pipeline.table_schema_builder import \
+    build_table_schema
+from data_pipeline_avro_util.data_pipeline.table_schema_builder import \
+    ColumnDescriptor
+from data_pipeline_avro_util.data_pipeline.table_schema_builder import \
+    TableDescriptor
+from data_pipeline_avro_util.util import get_avro_schema_object
+
+
+class TestRedshiftExporter(object):
+
+    @property
+    def schema_json(self):
+        return build_table_schema(TableDescriptor('business', [
+            ColumnDescriptor('id', 'bigint', is_nullable=False),
+            ColumnDescriptor('name', 'varchar', length=8),
+            ColumnDescriptor('checksum', 'binary', length=2),
+            ColumnDescriptor('price', 'decimal', precision=6, scale=2),
+            ColumnDescriptor('rating', 'double'),
+            ColumnDescriptor('active', 'bit', length=1),
+            ColumnDescriptor('flags', 'bit', length=5),
+            ColumnDescriptor('is_open', 'boolean'),
+            ColumnDescriptor('opened', 'date'),
+            ColumnDescriptor('updated_at', 'timestamp', precision=3),
+            ColumnDescriptor('kind', 'enum', symbols=['A', 'B']),
+        ]))
+
+    @property
+    def record(self):
+        return {
+            'id': 1,
+            'name': 'Café "❤",\tok',
+            'checksum': b'\x00\xffX',
+            'price': 1234.5,
+            'rating': 4.25,
+            'active': 1,
+            'flags': 21,
+            'is_open': False,
+            'opened': '2016-02-29',
+            'updated_at': 1456790398123,
+            'kind': 'B',
+        }
+
+    @property
+    def null_record(self):
+        record = {name: None for name in self.record}
+        record['id'] = 2
+        return record
+
+    @property
+    def records(self):
+        return [
+            dict(self.record, id=i, name='row {0}\n'.format(i))
+            for i in range(100)
+        ]
+
+    def _exporter(self, tmpdir, **kwargs):
+        return RedshiftExporter(self.schema_json, str(tmpdir), **kwargs)
+
+    def _read(self, path):
+        open_file = gzip.open if path.endswith('.gz') else open
+        with open_file(path, 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def test_format_csv_row(self, tmpdir):
+        exporter = self._exporter(tmpdir)
+        assert exporter.format_row(self.record) == (
+            '1,"Café """,00ff,1234.50,4.25,t,21,f,"2016-02-29",'
+            '2016-02-29 23:59:58.123,"B"'
+        )
+        assert exporter.format_row(self.null_record) == (
+            '2,\\N,\\N,\\N,\\N,\\N,\\N,\\N,\\N,\\N,\\N'
+        )
+
+    def test_format_text_row(self, tmpdir):
+        exporter = self._exporter(tmpdir, csv=False, null_string='NULL')
+        assert exporter.format_row(
+            dict(self.record, name='a\\b\tc\nd')
+        ) == (
+            '1\ta\\\\b\\\tc\\\nd\t00ff\t1234.50\t4.25\tt\t21\tf\t2016-02-29\t'
+            '2016-02-29 23:59:58.123\tB'
+        )
+        assert exporter.format_row(self.null_record).split('\t')[1:] == (
+            ['NULL'] * 10
+        )
+
+    def test_format_python_values(self, tmpdir):
+        exporter = self._exporter(tmpdir)
+        row = exporter.format_row(dict(
+            self.record,
+            price=None,
+            rating=float('-inf'),
+            opened=datetime.date(2016, 2, 29),
+            updated_at=datetime.datetime(2016, 2, 29, 23, 59, 58)
+        ))
+        assert row.split(',')[4:] == [
+            '-Infinity',
+            't',
+            '21',
+            'f',
+            '2016-02-29',
+            '2016-02-29 23:59:58.000',
+            '"B"'
+        ]
+
+    def test_format_temporal_strings(self, tmpdir):
+        record = dict(
+            self.record,
+            opened='2016-02-29,\n"x"',
+            updated_at='2016-02-29 23:59:58.123'
+        )
+        assert self._exporter(tmpdir).format_row(record).split(',', 8)[8] == (
+            '"2016-02-29,\n""x""","2016-02-29 23:59:58.123","B"'
+        )
+        row = self._exporter(tmpdir, csv=False).format_row(record)
+        assert row.split('\t')[8:10] == [
+            '2016-02-29,\\\n"x"',
+            '2016-02-29 23:59:58.123'
+        ]
+
+    @pytest.mark.parametrize('price, expected', [
+        (Decimal('0.125'), '0.13'),
+        (Decimal('-0.125'), '-0.13'),
+        (Decimal('2.675'), '2.68'),
+        (0.125, '0.13'),
+        (2.675, '2.68'),
+        (-1.005, '-1.01'),
+        (7, '7.00'),
+        (Decimal('1E+3'), '1000.00'),
+        (Decimal('1E-9'), '0.00'),
+        (Decimal('12345678901234567890123456789012345.675'),
+            '12345678901234567890123456789012345.68'),
+    ])
+    def test_format_fixed_point_rounds_half_up(self, tmpdir, price, expected):
+        row = self._exporter(tmpdir).format_row(dict(self.record, price=price))
+        assert row.split(',')[3] == expected
+
+    @pytest.mark.parametrize('compress', [False, True])
+    def test_export_records_split_into_files(self, tmpdir, compress):
+        exporter = self._exporter(
+            tmpdir,
+            compress=compress,
+            max_file_size=1000,
+            buffer_size=100
+        )
+        paths = exporter.export_records(self.records)
+        assert len(paths) > 2
+        assert all(
+            path.endswith('.csv.gz' if compress else '.csv') for path in paths
+        )
+        assert sorted(os.listdir(str(tmpdir))) == [
+            os.path.basename(path) for path in paths
+        ]
+        assert ''.join(self._read(path) for path in paths) == ''.join(
+            exporter.format_row(record) + '\n' for record in self.records
+        )
+        for path in paths[:-1]:
+            # files only hold whole rows
+            assert self._read(path).endswith('\n')
+
+        more_paths = exporter.export_records(self.records[:1])
+        assert more_paths[0] not in paths
+
+    def test_export_nothing(self, tmpdir):
+        assert self._exporter(tmpdir).export_records([]) == []
+
+    def test_export_messages(self, tmpdir):
+        writer = AvroStringWriter(self.schema_json)
+        exporter = self._exporter(tmpdir)
+        records = self.records + [self.null_record]
+        paths = exporter.export_messages(
+            writer.encode(record) for record in records
+        )
+        assert self._read(paths[0]) == ''.join(
+            exporter.format_row(record) + '\n' for record in records
+        )
+
+    def _container_file(self, records, codec):
+        schema = get_avro_schema_object(self.schema_json)
+        container = io.BytesIO()
+        writer = avro.datafile.DataFileWriter(
+            container,
+            avro.io.DatumWriter(),
+            schema,
+            codec=str(codec)
+        )
+        for i, record in enumerate(records):
+            writer.append(record)
+            if i % 10 == 9:
+                # ends the block, so the file has several blocks
+                writer.sync()
+        writer.flush()
+        container.seek(0)
+        return container
+
+    @pytest.mark.parametrize('codec', ['null', 'deflate'])
+    def test_export_container_file(self, tmpdir, codec):
+        records = self.records + [self.null_record]
+        container = self._container_file(records, codec)
+
+        exporter = self._exporter(tmpdir)
+        paths = exporter.export_container_file(container)
+        assert self._read(paths[0]) == ''.join(
+            exporter.format_row(record) + '\n' for record in records
+        )
+
+    @pytest.mark.parametrize('codec', ['null', 'deflate'])
+    def test_read_container_file_without_reader_internals(self, codec):
+        records = self.records + [self.null_record]
+        expected = list(read_container_file_records(
+            self._container_file(records, codec)
+        ))
+        data_file_reader = avro.datafile.DataFileReader
+
+        class PublicDataFileReader(object):
+            # only offers the documented iteration of the records
+            def __init__(self, file_obj, datum_reader):
+                self._records = iter(data_file_reader(file_obj, datum_reader))
+
+            def __iter__(self):
+                return self._records
+
+        with mock.patch.object(
+            avro.datafile,
+            'DataFileReader',
+            PublicDataFileReader
+        ), mock.patch.object(
+            redshift_exporter,
+            'compile_decoder'
+        ) as mock_compile_decoder:
+            actual = list(read_container_file_records(
+                self._container_file(records, codec)
+            ))
+        assert mock_compile_decoder.call_count == 0
+        assert actual == expected
+
+    def test_null_value_of_required_field(self, tmpdir):
+        exporter = self._exporter(tmpdir)
+        with pytest.raises(ValueError) as excinfo:
+            exporter.format_row(dict(self.record, id=None))
+        assert 'id' in str(excinfo.value)
+        with pytest.raises(ValueError):
+            exporter.export_records([self.record, dict(self.record, id=None)])
+
+    def test_requires_record_schema(self, tmpdir):
+        with pytest.raises(ValueError):
+            RedshiftExporter('"string"', str(tmpdir))
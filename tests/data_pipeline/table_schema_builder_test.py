@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+import pytest
+
+from data_pipeline_avro_util.data_pipeline.avro_meta_data import \
+    AvroMetaDataKeys
+from data_pipeline_avro_util.data_pipeline.table_schema_builder import \
+    build_table_schema
+from data_pipeline_avro_util.data_pipeline.table_schema_builder import \
+    build_table_schemas
+from data_pipeline_avro_util.data_pipeline.table_schema_builder import \
+    ColumnDescriptor
+from data_pipeline_avro_util.data_pipeline.table_schema_builder import \
+    TableDescriptor
+from data_pipeline_avro_util.util import get_avro_schema_object
+
+
+class TestTableSchemaBuilder(object):
+
+    @property
+    def table(self):
+        return TableDescriptor(
+            'business',
+            [
+                ColumnDescriptor(
+                    'id',
+                    'BIGINT',
+                    is_nullable=False,
+                    is_unsigned=True,
+                    primary_key_position=1,
+                    sort_key_position=1,
+                    is_dist_key=True
+                ),
+                ColumnDescriptor('name', 'varchar', length=64, doc='name'),
+                ColumnDescriptor('code', 'char', is_nullable=False, length=2),
+                ColumnDescriptor('price', 'decimal', precision=10, scale=2),
+                ColumnDescriptor('opened', 'date'),
+                ColumnDescriptor('updated', 'timestamp', precision=6),
+                ColumnDescriptor('state', 'enum', symbols=['open', 'closed']),
+                ColumnDescriptor(
+                    'prev_state',
+                    'enum',
+                    is_nullable=False,
+                    symbols=['open', 'closed']
+                ),
+            ],
+            namespace='yelp'
+        )
+
+    def test_build_table_schema(self):
+        assert build_table_schema(self.table) == {
+            'type': 'record',
+            'name': 'business',
+            'namespace': 'yelp',
+            'fields': [
+                {
+                    'name': 'id',
+                    'type': 'long',
+                    AvroMetaDataKeys.UNSIGNED: True,
+                    AvroMetaDataKeys.PRIMARY_KEY: 1,
+                    AvroMetaDataKeys.SORT_KEY: 1,
+                    AvroMetaDataKeys.DIST_KEY: True
+                },
+                {
+                    'name': 'name',
+                    'type': ['null', 'string'],
+                    'default': None,
+                    'doc': 'name',
+                    AvroMetaDataKeys.MAX_LEN: 64
+                },
+                {
+                    'name': 'code',
+                    'type': 'string',
+                    AvroMetaDataKeys.FIX_LEN: 2
+                },
+                {
+                    'name': 'price',
+                    'type': ['null', 'double'],
+                    'default': None,
+                    AvroMetaDataKeys.FIXED_POINT: True,
+                    AvroMetaDataKeys.PRECISION: 10,
+                    AvroMetaDataKeys.SCALE: 2
+                },
+                {
+                    'name': 'opened',
+                    'type': ['null', 'string'],
+                    'default': None,
+                    AvroMetaDataKeys.DATE: True
+                },
+                {
+                    'name': 'updated',
+                    'type': ['null', 'long'],
+                    'default': None,
+                    AvroMetaDataKeys.TIMESTAMP: True,
+                    AvroMetaDataKeys.FSP: 6
+                },
+                {
+                    'name': 'state',
+                    'type': ['null', {
+                        'type': 'enum',
+                        'name': 'state_enum',
+                        'namespace': 'yelp',
+                        'symbols': ['open', 'closed']
+                    }],
+                    'default': None
+                },
+                {
+                    'name': 'prev_state',
+                    'type': 'yelp.state_enum'
+                },
+            ]
+        }
+
+    def test_build_table_schema_is_valid(self):
+        schema = get_avro_schema_object(build_table_schema(self.table))
+        assert schema.to_json() == build_table_schema(self.table)
+
+    def test_duplicate_column(self):
+        table = TableDescriptor('foo', [
+            ColumnDescriptor('a', 'int'),
+            ColumnDescriptor('a', 'bigint'),
+        ])
+        with pytest.raises(ValueError):
+            build_table_schema(table)
+
+    def test_unsupported_sql_type(self):
+        table = TableDescriptor('foo', [ColumnDescriptor('a', 'geometry')])
+        with pytest.raises(ValueError):
+            build_table_schema(table)
+
+    @property
+    def tables(self):
+        return [
+            self.table._replace(name='business_{0}'.format(i))
+            for i in range(20)
+        ]
+
+    def test_build_table_schemas(self):
+        expected = [build_table_schema(table) for table in self.tables]
+        assert build_table_schemas(self.tables) == expected
+
+    def test_build_table_schemas_share_named_types(self):
+        table_schemas = build_table_schemas(self.tables)
+        enum_types = [
+            table_schema['fields'][6]['type'][1]
+            for table_schema in table_schemas
+        ]
+        assert all(
+            enum_type is enum_types[0] for enum_type in enum_types
+        )
+        # an enum type of another namespace is another type
+        table_schemas = build_table_schemas([
+            self.table,
+            TableDescriptor('other', self.table.columns)
+        ])
+        other_enum_type = table_schemas[1]['fields'][6]['type'][1]
+        assert other_enum_type is not table_schemas[0]['fields'][6]['type'][1]
+        assert 'namespace' not in other_enum_type
+        assert table_schemas[1]['fields'][7]['type'] == 'state_enum'
+
+    def test_build_table_schemas_with_thread_pool(self):
+        pool = ThreadPool(2)
+        try:
+            actual = build_table_schemas(self.tables, pool=pool, chunksize=3)
+        finally:
+            pool.close()
+        assert actual == build_table_schemas(self.tables)
+
+    def test_build_table_schemas_with_process_pool(self):
+        pool = multiprocessing.Pool(2)
+        try:
+            actual = build_table_schemas(self.tables, pool=pool, chunksize=3)
+        finally:
+            pool.close()
+        assert actual == build_table_schemas(self.tables)
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import datetime
+
+import pytest
+from avro import timezones
+
+from data_pipeline_avro_util.data_pipeline.table_schema_builder import \
+    build_table_schema
+from data_pipeline_avro_util.data_pipeline.table_schema_builder import \
+    ColumnDescriptor
+from data_pipeline_avro_util.data_pipeline.table_schema_builder import \
+    TableDescriptor
+from data_pipeline_avro_util.data_pipeline.temporal_converter import \
+    TemporalConverter
+
+
+class TestTemporalConverter(object):
+
+    @property
+    def schema_json(self):
+        return build_table_schema(TableDescriptor('events', [
+            ColumnDescriptor('id', 'int', is_nullable=False),
+            ColumnDescriptor('day', 'date', is_nullable=False),
+            ColumnDescriptor('created_at', 'datetime', precision=3),
+            ColumnDescriptor('duration', 'time', precision=6),
+            ColumnDescriptor('updated_at', 'timestamp', precision=6),
+            ColumnDescriptor('deleted_at', 'timestamp', is_nullable=False),
+            ColumnDescriptor('vintage', 'year'),
+        ]))
+
+    @pytest.fixture
+    def converter(self):
+        return TemporalConverter(self.schema_json)
+
+    @property
+    def encoded_record(self):
+        return {
+            'id': 1,
+            'day': '2016-02-29',
+            'created_at': '2016-02-29 23:59:58.120',
+            'duration': '-838:59:59.000001',
+            'updated_at': 1456790398123456,
+            'deleted_at': -1,
+            'vintage': 1999,
+        }
+
+    @property
+    def record(self):
+        return {
+            'id': 1,
+            'day': datetime.date(2016, 2, 29),
+            'created_at': datetime.datetime(2016, 2, 29, 23, 59, 58, 120000),
+            'duration': -datetime.timedelta(
+                hours=838,
+                minutes=59,
+                seconds=59,
+                microseconds=1
+            ),
+            'updated_at': datetime.datetime(
+                2016, 2, 29, 23, 59, 58, 123456, tzinfo=timezones.utc
+            ),
+            'deleted_at': datetime.datetime(
+                1969, 12, 31, 23, 59, 59, tzinfo=timezones.utc
+            ),
+            'vintage': 1999,
+        }
+
+    @property
+    def null_encoded_record(self):
+        return dict(
+            self.encoded_record,
+            created_at=None,
+            duration=None,
+            updated_at=None
+        )
+
+    def test_temporal_field_names(self, converter):
+        assert converter.temporal_field_names == [
+            'day',
+            'created_at',
+            'duration',
+            'updated_at',
+            'deleted_at'
+        ]
+
+    def test_parse(self, converter):
+        assert converter.parse(self.encoded_record) == self.record
+        assert converter.parse(self.null_encoded_record) == dict(
+            self.record,
+            created_at=None,
+            duration=None,
+            updated_at=None
+        )
+
+    def test_format(self, converter):
+        assert converter.format(self.record) == self.encoded_record
+        assert converter.format(
+            converter.parse(self.null_encoded_record)
+        ) == self.null_encoded_record
+
+    def test_parse_and_format_many(self, converter):
+        encoded_records = [self.encoded_record, self.null_encoded_record]
+        records = converter.parse_many(
+            [self.encoded_record, self.null_encoded_record]
+        )
+        assert records == [
+            converter.parse(self.encoded_record),
+            converter.parse(self.null_encoded_record)
+        ]
+        assert converter.format_many(records) == encoded_records
+
+    @pytest.mark.parametrize('field_name, value, expected', [
+        ('created_at', '2016-02-29 23:59:58', '2016-02-29 23:59:58.000'),
+        ('created_at', '2016-02-29 23:59:58.1', '2016-02-29 23:59:58.100'),
+        ('created_at', '2016-02-29 23:59:58.123456', '2016-02-29 23:59:58.123'),
+        ('duration', '12:00:00', '12:00:00.000000'),
+        ('duration', '00:00:00.5', '00:00:00.500000'),
+        ('duration', '-00:00:01', '-00:00:01.000000'),
+    ])
+    def test_fsp(self, converter, field_name, value, expected):
+        record = dict(self.encoded_record, **{field_name: value})
+        assert converter.format(converter.parse(record))[field_name] == (
+            expected
+        )
+
+    def test_format_naive_timestamp(self, converter):
+        record = dict(
+            self.record,
+            updated_at=self.record['updated_at'].replace(tzinfo=None)
+        )
+        assert converter.format(record)['updated_at'] == (
+            self.encoded_record['updated_at']
+        )
+
+    @pytest.mark.parametrize('field_name, value', [
+        ('day', '2016-02-30'),
+        ('day', '2016-2-28'),
+        ('day', '0000-00-00'),
+        ('day', '2016/02/29'),
+        ('day', '2016-+2-28'),
+        ('created_at', '2016-02-29T23:59:58Z'),
+        ('created_at', '2020-01-01T00:00:00'),
+        ('created_at', '2016/02/29 23:59:58'),
+        ('created_at', '2016-02-29 23.59.58'),
+        ('created_at', '2016-02-29 23:59: 8'),
+        ('created_at', '2016-02-29 23:59:58.'),
+        ('created_at', '2016-02-29 23:59:58,123'),
+        ('created_at', '2016-02-29 23:59:58.1234567'),
+        ('duration', '12:00'),
+        ('duration', '12:0:00'),
+        ('duration', '12.00.00'),
+        ('duration', '--12:00:00'),
+        ('duration', '12:00:00.'),
+    ])
+    def test_invalid_values(self, converter, field_name, value):
+        with pytest.raises(ValueError):
+            converter.parse(dict(self.encoded_record, **{field_name: value}))
+
+    def test_requires_record_schema(self):
+        with pytest.raises(ValueError):
+            TemporalConverter('"string"')
+
+    def test_format_datetime_ignores_time_zone(self, converter):
+        for microsecond in (0, 120000):
+            created_at = datetime.datetime(
+                2016, 2, 29, 23, 59, 58, microsecond, tzinfo=timezones.utc
+            )
+            formatted = converter.format(
+                dict(self.record, created_at=created_at)
+            )['created_at']
+            assert formatted == '2016-02-29 23:59:58.{0:03d}'.format(
+                microsecond // 1000
+            )
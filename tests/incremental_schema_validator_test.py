@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from multiprocessing.pool import ThreadPool
+
+import mock
+import pytest
+from avro import schema
+
+from data_pipeline_avro_util.incremental_schema_validator import \
+    _LRUCache
+from data_pipeline_avro_util.incremental_schema_validator import \
+    IncrementalSchemaValidator
+from data_pipeline_avro_util.incremental_schema_validator import \
+    is_valid_default_value
+from data_pipeline_avro_util.util import get_avro_schema_object
+
+
+@pytest.mark.parametrize('schema_json, default_value, expected', [
+    ('"null"', None, True),
+    ('"boolean"', True, True),
+    ('"boolean"', 1, False),
+    ('"int"', 10, True),
+    ('"int"', True, False),
+    ('"int"', 1 << 31, False),
+    ('"long"', 1 << 40, True),
+    ('"double"', 1, True),
+    ('"double"', '1.0', False),
+    ('"string"', 'abc', True),
+    ('"bytes"', 'ÿ', True),
+    ('{"type": "fixed", "name": "f", "size": 2}', 'ab', True),
+    ('{"type": "fixed", "name": "f", "size": 2}', 'a', False),
+    ('{"type": "enum", "name": "e", "symbols": ["A"]}', 'A', True),
+    ('{"type": "enum", "name": "e", "symbols": ["A"]}', 'B', False),
+    ('{"type": "array", "items": "int"}', [1, 2], True),
+    ('{"type": "array", "items": "int"}', [1, 'a'], False),
+    ('{"type": "map", "values": "int"}', {'a': 1}, True),
+    ('{"type": "map", "values": "int"}', {'a': None}, False),
+    ('["null", "int"]', None, True),
+    ('["null", "int"]', 1, False),
+    ('["int", "null"]', 1, True),
+    (
+        '{"type": "record", "name": "r", "fields": ['
+        '{"name": "a", "type": "int"},'
+        '{"name": "b", "type": "int", "default": 0}]}',
+        {'a': 1},
+        True
+    ),
+    (
+        '{"type": "record", "name": "r", "fields": ['
+        '{"name": "a", "type": "int"},'
+        '{"name": "b", "type": "int", "default": 0}]}',
+        {'b': 1},
+        False
+    ),
+])
+def test_is_valid_default_value(schema_json, default_value, expected):
+    avro_schema = get_avro_schema_object(schema_json)
+    assert is_valid_default_value(avro_schema, default_value) == expected
+
+
+class TestLRUCache(object):
+
+    def test_evicts_least_recently_used(self):
+        cache = _LRUCache(max_size=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        assert cache.get('a') == 1
+        cache.put('c', 3)
+        assert len(cache) == 2
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+    def test_concurrent_use(self):
+        cache = _LRUCache(max_size=10)
+
+        def use_cache(i):
+            for j in range(200):
+                cache.put((i, j % 20), j)
+                cache.get((i, (j + 7) % 20))
+
+        pool = ThreadPool(4)
+        try:
+            pool.map(use_cache, range(8))
+        finally:
+            pool.close()
+            pool.join()
+        assert len(cache) == 10
+
+
+class TestIncrementalSchemaValidator(object):
+
+    @pytest.fixture
+    def validator(self):
+        return IncrementalSchemaValidator()
+
+    @property
+    def named_field(self):
+        return {
+            'name': 'address',
+            'type': {
+                'type': 'record',
+                'name': 'address',
+                'namespace': 'test_memo',
+                'fields': [
+                    {'name': 'street', 'type': 'string'},
+                    {'name': 'zip', 'type': {
+                        'type': 'fixed',
+                        'name': 'zip',
+                        'size': 5
+                    }},
+                ]
+            }
+        }
+
+    def test_named_schema_is_memoized(self):
+        IncrementalSchemaValidator().replace_fields([], [self.named_field], '')
+
+        validator = IncrementalSchemaValidator()
+        with mock.patch.object(
+            schema,
+            'make_avsc_object',
+            wraps=schema.make_avsc_object
+        ) as make_avsc_object:
+            validator.replace_fields([], [self.named_field], '')
+        assert not any(
+            isinstance(args[0], dict) and args[0].get('name') == 'address'
+            for args, _ in make_avsc_object.call_args_list
+        )
+        assert set(validator.names.names) == {
+            'test_memo.address',
+            'test_memo.zip'
+        }
+
+    def test_memoized_schema_name_in_use(self, validator):
+        validator.replace_fields([], [self.named_field], '')
+        with pytest.raises(schema.SchemaParseException):
+            validator.replace_fields(
+                [],
+                [dict(self.named_field, name='other')],
+                ''
+            )
+
+    def test_failed_step_leaves_validator_unchanged(self, validator):
+        field = dict(self.named_field, default='invalid')
+        with pytest.raises(schema.SchemaParseException):
+            validator.replace_fields([], [field], '')
+        assert validator.names.names == {}
@@ -17,8 +17,12 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 
 import avro
+import pytest
 
+from data_pipeline_avro_util.util import compile_utf8_length_check
+from data_pipeline_avro_util.util import get_avro_schema_fingerprint
 from data_pipeline_avro_util.util import get_avro_schema_object
+from data_pipeline_avro_util.util import get_nullable_value_schema
 
 
 def test_get_avro_schema_object(avro_schema_json):
@@ -30,3 +34,40 @@ def test_get_avro_schema_object(avro_schema_json):
     assert result1 == result2
     assert result1 == result3
     assert result2 == result3
+
+
+def test_get_avro_schema_fingerprint(avro_schema_json):
+    avro_schema_obj = avro.schema.make_avsc_object(avro_schema_json)
+    fingerprint = get_avro_schema_fingerprint(avro_schema_json)
+    assert fingerprint == get_avro_schema_fingerprint(str(avro_schema_obj))
+    assert fingerprint == get_avro_schema_fingerprint(avro_schema_obj)
+
+    avro_schema_json['fields'][0]['doc'] = 'changed'
+    assert fingerprint != get_avro_schema_fingerprint(avro_schema_json)
+
+
+@pytest.mark.parametrize('schema_json, expected', [
+    ('["null", "int"]', (True, 'int')),
+    ('["int", "null"]', (True, 'int')),
+    ('["null", "int", "string"]', (False, 'union')),
+    ('["int", "string"]', (False, 'union')),
+    ('"int"', (False, 'int')),
+])
+def test_get_nullable_value_schema(schema_json, expected):
+    null_allowed, value_schema = get_nullable_value_schema(
+        get_avro_schema_object(schema_json)
+    )
+    assert (null_allowed, value_schema.type) == expected
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('abcd', False),
+    ('abcdefgh', False),
+    ('abcdefghi', True),
+    ('Café❤', False),
+    # 6 characters but 11 UTF-8 bytes
+    ('Café❤❤', True),
+    (b'\xff' * 8, False),
+])
+def test_compile_utf8_length_check(value, expected):
+    assert compile_utf8_length_check(8)(value) == expected